@@ -1,17 +1,49 @@
 import logging
+import os
+from datetime import timedelta
+from typing import Any, Mapping, Optional
 
+import click
 from flask import Flask, redirect, jsonify
-from flasgger import Swagger
 
+from app.compression import compress_response
+from app.config import Config
+from app.container import EXTENSION_NAME, ServiceContainer, current_services
 from app.logging_config import setup_logging
 from app.routes import api
+from app.sharded_repository import ShardedLockerRepository, ShardedRentRepository
+from app.sqlite_repository import (
+    SQLiteBloqRepository,
+    SQLiteLockerRepository,
+    SQLiteRentRepository,
+)
 
 
-def create_app():
+def create_app(config: Optional[Mapping[str, Any]] = None):
+    """
+    Creates the Flask application. Repositories and services are built on first
+    use, so creating the application does not read any data file.
+
+    Parameters:
+        config (Optional[Mapping[str, Any]]): Settings overriding those of Config,
+            such as ``DATA_DIR``.
+
+    Returns:
+        Flask: The application.
+    """
+    # Imported here: flasgger pulls in a large dependency tree that importing the
+    # app package, e.g. from CLI tools and tests, does not need.
+    from flasgger import Swagger
+
     app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(config or {})
     setup_logging()
+    app.extensions[EXTENSION_NAME] = ServiceContainer(app.config)
     app.register_blueprint(api, url_prefix="/api")
     swagger = Swagger(app)
+    if app.config["COMPRESSION"]:
+        app.after_request(compress_response)
 
     @app.errorhandler(Exception)
     def handle_exception(e):
@@ -24,4 +56,49 @@ def create_app():
     def index():
         return redirect("/apidocs")
 
+    @app.cli.command("migrate-sqlite")
+    @click.option("--database", default=None, help="Target SQLite database file.")
+    def migrate_sqlite(database):
+        """Import data/*.json into the SQLite database."""
+        database = database or app.config["SQLITE_DATABASE"]
+        for repository_cls, name in (
+            (SQLiteBloqRepository, "bloqs.json"),
+            (SQLiteLockerRepository, "lockers.json"),
+            (SQLiteRentRepository, "rents.json"),
+        ):
+            json_file = os.path.join(app.config["DATA_DIR"], name)
+            imported = repository_cls(database).migrate_from_json(json_file)
+            click.echo(f"{json_file}: imported {imported} entities into {database}")
+
+    @app.cli.command("shard-json")
+    def shard_json():
+        """Split data/lockers.json and data/rents.json into one file per bloq."""
+        data_dir = app.config["DATA_DIR"]
+        lockers = ShardedLockerRepository(os.path.join(data_dir, "lockers"))
+        rents = ShardedRentRepository(os.path.join(data_dir, "rents"), lockers)
+        for repository, name in ((lockers, "lockers"), (rents, "rents")):
+            json_file = os.path.join(data_dir, f"{name}.json")
+            directory = os.path.join(data_dir, name)
+            imported = repository.import_file(json_file)
+            click.echo(f"{json_file}: imported {imported} entities into {directory}")
+
+    @app.cli.command("archive-rents")
+    @click.option(
+        "--older-than-days",
+        type=float,
+        default=None,
+        help="Only archive rents delivered at least this many days ago.",
+    )
+    def archive_rents(older_than_days):
+        """Move delivered rents from the data file to the rents archive."""
+        if app.config["STORAGE_ENGINE"] == "sqlite":
+            raise click.ClickException(
+                "Archiving is not supported by the sqlite engine"
+            )
+        older_than = (
+            timedelta(days=older_than_days) if older_than_days is not None else None
+        )
+        archived = current_services().rent_repository.archive_delivered(older_than)
+        click.echo(f"Archived {archived} delivered rents")
+
     return app
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BLOCK_RECORDS = 256
+
+
+class ArchiveSegment:
+    """
+    An append-only, compressed store of serialized entities, readable by id.
+
+    Records are appended in blocks of up to ``BLOCK_RECORDS``; each block is one
+    gzip member holding one JSON record per line, so the segment as a whole is a
+    valid gzip file. An offset index next to it, ``<segment>.idx``, holds one
+    ``id<TAB>offset<TAB>length`` line per record, locating the block that holds it.
+    Only this index is kept in memory; reading a record decompresses one block.
+
+    A block is written and synced before its index lines, so a crash mid-append
+    leaves at most unindexed bytes at the end of the segment, which later appends
+    skip over.
+
+    Attributes:
+        __path (str): The path to the segment.
+        __index_path (str): The path to the offset index.
+        __offsets (Dict[str, Tuple[int, int]]): The offset and length of the block
+            holding each record.
+        __index_size (int): The size of the offset index as of the last read.
+        __lock (threading.Lock): Serializes appends and index reloads.
+
+    Methods:
+        append(records: List[Dict[str, Any]]) -> int: Appends records.
+        get(entity_id: str) -> Optional[Dict[str, Any]]: Returns a record by id.
+        records() -> Iterator[Dict[str, Any]]: Yields every record, block by block.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes the ArchiveSegment and loads its offset index.
+
+        Parameters:
+            path (str): The path to the segment.
+        """
+        self.__path = path
+        self.__index_path = path + ".idx"
+        self.__offsets: Dict[str, Tuple[int, int]] = {}
+        self.__index_size = 0
+        self.__lock = threading.Lock()
+        self.__load_index()
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self.__offsets
+
+    def __len__(self) -> int:
+        return len(self.__offsets)
+
+    def append(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Appends records to the segment and indexes them. Records already archived
+        are skipped.
+
+        Parameters:
+            records (List[Dict[str, Any]]): The serialized entities, with an ``id``.
+
+        Returns:
+            int: The number of records appended.
+        """
+        with self.__lock:
+            self.__load_index()
+            records = [record for record in records if record["id"] not in self]
+            if not records:
+                return 0
+            lines = []
+            with open(self.__path, "ab") as f:
+                for start in range(0, len(records), BLOCK_RECORDS):
+                    block = records[start : start + BLOCK_RECORDS]
+                    offset = f.seek(0, os.SEEK_END)
+                    data = _compress(
+                        "".join(
+                            json.dumps(record, ensure_ascii=False) + "\n"
+                            for record in block
+                        ).encode("utf-8")
+                    )
+                    f.write(data)
+                    lines.extend(
+                        f"{record['id']}\t{offset}\t{len(data)}\n" for record in block
+                    )
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.__index_path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+            self.__load_index()
+        return len(records)
+
+    def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns an archived record, reading only the block that holds it.
+
+        Parameters:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            Optional[Dict[str, Any]]: The record, or None if it is not archived.
+        """
+        location = self.__offsets.get(entity_id)
+        if location is None:
+            # Another process may have archived it since the index was read.
+            with self.__lock:
+                self.__load_index()
+            location = self.__offsets.get(entity_id)
+            if location is None:
+                return None
+        offset, length = location
+        with open(self.__path, "rb") as f:
+            f.seek(offset)
+            block = zlib.decompress(f.read(length), wbits=31)
+        for line in block.decode("utf-8").splitlines():
+            record = json.loads(line)
+            if record["id"] == entity_id:
+                return record
+        return None
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields every indexed record in the order it was archived, decompressing one
+        block at a time, so memory use does not depend on the size of the segment.
+
+        Returns:
+            Iterator[Dict[str, Any]]: The records.
+        """
+        with self.__lock:
+            self.__load_index()
+            blocks = sorted(set(self.__offsets.values()))
+        if not blocks:
+            return
+        with open(self.__path, "rb") as f:
+            for offset, length in blocks:
+                f.seek(offset)
+                block = zlib.decompress(f.read(length), wbits=31)
+                for line in block.decode("utf-8").splitlines():
+                    record = json.loads(line)
+                    if record["id"] in self.__offsets:
+                        yield record
+
+    def __load_index(self):
+        # Reads the index lines appended since the last read.
+        try:
+            size = os.path.getsize(self.__index_path)
+        except FileNotFoundError:
+            return
+        if size <= self.__index_size:
+            return
+        with open(self.__index_path, "rb") as f:
+            f.seek(self.__index_size)
+            chunk = f.read(size - self.__index_size)
+        # Ignore a trailing line still being written.
+        complete = chunk[: chunk.rfind(b"\n") + 1]
+        for line in complete.decode("utf-8").splitlines():
+            entity_id, offset, length = line.split("\t")
+            self.__offsets[entity_id] = (int(offset), int(length))
+        self.__index_size += len(complete)
+
+
+def _compress(data: bytes) -> bytes:
+    # A gzip member: wbits=31 selects the gzip container.
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
@@ -0,0 +1,196 @@
+"""
+ASGI serving mode.
+
+``create_asgi_app`` builds the same Flask application as ``create_app`` and serves
+it over ASGI, e.g. with ``uvicorn --factory app.asgi:create_asgi_app``. The
+request body is received on the event loop, so a slow client holds no worker
+thread while it uploads; the application then runs in a thread pool.
+
+This is a thin adapter around the synchronous WSGI application, whose routes and
+repositories are not coroutines. A handler, the iteration of its response body
+and its ``close()`` run on one worker thread, which passes each message to the
+event loop and waits until it is sent: a streamed response, such as an NDJSON
+export reading a SQLite cursor, stays on the thread that opened it and is
+produced no faster than the client receives it. When sending fails, e.g. because
+the client disconnected, the worker stops and closes the response.
+``asgiref.wsgi.WsgiToAsgi`` is not used: it runs every request on one shared
+thread and never closes the response.
+"""
+
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from app import create_app
+from app.container import current_services
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class AsgiApplication:
+    """
+    Serves a Flask application to an ASGI server.
+
+    Attributes:
+        flask_app (Flask): The application served.
+        __executor (ThreadPoolExecutor): Runs each request, from the handler to
+            the close of its response.
+
+    Methods:
+        __call__(scope: Scope, receive: Receive, send: Send): Handles an ASGI
+            ``http`` or ``lifespan`` connection.
+    """
+
+    def __init__(self, flask_app, max_workers: Optional[int] = None):
+        """
+        Initializes an AsgiApplication.
+
+        Parameters:
+            flask_app (Flask): The application to serve.
+            max_workers (Optional[int]): The number of threads running requests;
+                defaults to that of ``ThreadPoolExecutor``.
+        """
+        self.flask_app = flask_app
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bloqit-asgi"
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        loop = asyncio.get_running_loop()
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await loop.run_in_executor(None, self.__shutdown)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+        parts = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            parts.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        environ = self.__environ(scope, b"".join(parts))
+
+        def send_from_worker(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        await loop.run_in_executor(
+            self.__executor, self.__run, environ, send_from_worker
+        )
+
+    def __shutdown(self):
+        # Once the running requests have finished, flushes the pending mutations
+        # and stops the group-commit threads.
+        self.__executor.shutdown(wait=True)
+        with self.flask_app.app_context():
+            current_services().close()
+        logging.info("ASGI application shut down")
+
+    def __run(self, environ: Dict[str, Any], send: Callable[[Dict[str, Any]], None]):
+        """
+        Calls the WSGI application and sends its response, on the calling worker
+        thread. ``send`` blocks until the event loop has sent each message and
+        raises if it could not; the response is closed either way.
+
+        Parameters:
+            environ (Dict[str, Any]): The WSGI environ of the request.
+            send (Callable[[Dict[str, Any]], None]): Sends an ASGI message.
+        """
+        start = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and start and start[0] is None:
+                raise exc_info[1].with_traceback(exc_info[2])
+            start[:] = [
+                {
+                    "type": "http.response.start",
+                    "status": int(status.split(" ", 1)[0]),
+                    "headers": [
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in headers
+                    ],
+                }
+            ]
+            return write
+
+        def write(data):
+            if start[0] is not None:
+                send(start[0])
+                start[0] = None
+            if data:
+                send({"type": "http.response.body", "body": data, "more_body": True})
+
+        result = self.flask_app.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                write(chunk)
+            write(b"")
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
+        send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    def __environ(scope: Scope, body: bytes) -> Dict[str, Any]:
+        """
+        Builds the WSGI environ of an ASGI ``http`` scope. The body has been
+        received in full, so its length is always sent as ``CONTENT_LENGTH``.
+        """
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+            "PATH_INFO": scope["path"].encode().decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for raw_name, raw_value in scope.get("headers", []):
+            name = raw_name.decode("latin-1").upper().replace("-", "_")
+            if name == "CONTENT_LENGTH":
+                continue
+            key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+            value = raw_value.decode("latin-1")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+def create_asgi_app(
+    config: Optional[Mapping[str, Any]] = None, max_workers: Optional[int] = None
+) -> AsgiApplication:
+    """
+    Creates the application served over ASGI.
+
+    Parameters:
+        config (Optional[Mapping[str, Any]]): Settings passed to ``create_app``.
+        max_workers (Optional[int]): The number of threads running requests.
+
+    Returns:
+        AsgiApplication: The ASGI application.
+    """
+    return AsgiApplication(create_app(config), max_workers)
@@ -1,50 +1,345 @@
+import atexit
 import json
-from typing import List, Type, Optional, Dict, Any
-from dataclasses import fields, asdict
-from app.utils import generate_id
+import logging
+import os
+import secrets
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from json.encoder import encode_basestring
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Type,
+    Optional,
+    Dict,
+    Any,
+    Tuple,
+    Union,
+)
+from dataclasses import fields
+from itertools import islice
+from app.file_lock import FileLock
+from app.list_snapshot import ListSnapshot
+from app.rw_lock import ReadWriteLock
+from app.snapshot import (
+    ABSENT_VALUE,
+    is_fresh,
+    read_columns,
+    snapshot_path,
+    source_stamp,
+    write_snapshot,
+)
+from app.utils import check_page_key, generate_id, iter_json_array
 from enum import Enum
 
+_encode_json = json.JSONEncoder(ensure_ascii=False).encode
+_SCALAR_ENCODERS = {
+    str: encode_basestring,
+    type(None): lambda value: "null",
+    bool: lambda value: "true" if value else "false",
+    int: int.__repr__,
+}
+
 
 class BaseRepository:
     """
     A generic base repository class for managing data access and persistence.
 
+    Entities are kept in insertion order and additionally indexed by id. Subclasses
+    may declare secondary indexes by listing field names in ``indexes``; each index
+    maps a field value to the entities holding that value. An entry may also be a
+    tuple of field names, forming a composite index keyed by a tuple of values.
+
+    In journal mode, mutations append one compact JSON record per line to a journal
+    file next to the data file instead of rewriting it. The journal is replayed on
+    load and compacted into a fresh snapshot in the background once it grows past
+    ``journal_max_bytes``.
+
+    With ``binary_snapshot`` set, every write of the JSON file also writes a compact
+    binary snapshot next to it (see ``app.snapshot``), and loading reads that
+    snapshot instead of parsing the JSON whenever it mirrors the current file.
+
+    In group-commit mode (``flush_interval_ms`` set), mutations are only marked
+    pending and a background flusher persists them together, at most every
+    ``flush_interval_ms`` milliseconds or as soon as ``flush_max_mutations`` are
+    pending. Callers that need durability before responding pass ``sync=True`` or
+    call ``flush()``.
+
+    Every mutation increments ``version``, and the version and time of the last
+    change of each entity are kept, so callers such as HTTP handlers can tell
+    whether anything changed since they last looked without comparing entities.
+
+    ``get_all()`` returns an immutable ``ListSnapshot`` published per version of the
+    list. Mutations only drop the published snapshot; the next read takes a new one
+    that shares every unchanged chunk with the previous one, so listings neither
+    copy the whole list nor hold a lock while the caller iterates it. The snapshot
+    holds the entity objects themselves: the services and repository methods change
+    an entity by passing a modified copy to ``update()``, which replaces it, so a
+    snapshot never sees a half-applied change.
+
+    The in-memory list and indexes are guarded by a reader-writer lock, so lookups
+    from many threads run concurrently while mutations are exclusive. Writers are
+    additionally serialized by ``write_lock()``, which callers also use to make a
+    read-modify-write sequence atomic.
+
+    Serialized forms are cached per entity and per serializer, and dropped when the
+    entity is created or updated, so a write only re-serializes the entities that
+    changed. The data file is assembled from the cached JSON text of each entity,
+    and list endpoints reuse their own cached forms through ``serialize_many()``.
+
+    In multi-process mode (``multi_process`` set), several processes, such as the
+    workers of a WSGI server, share the data files. Writes hold an exclusive lock
+    on a lock file next to the data file and first pick up the changes of other
+    processes, so no process overwrites what another wrote. ``refresh()`` compares
+    the inode, modification time and size of the files against the last seen ones
+    and reloads only when they differ; when only the journal has grown, just the
+    new records are replayed.
+
     Attributes:
+        indexes (Tuple[Union[str, Tuple[str, ...]], ...]): The entity fields, or
+            tuples of fields, maintained as secondary indexes.
+        load_stats (Dict[str, Any]): The entity count, load time in seconds and, if
+            measured, peak memory in bytes of the last load_data() call.
+        version (int): The number of changes made to the entities; only ever grows.
+        last_modified (float): The time of the last change, or of the last load.
         __data_file (str): The path to the JSON file storing the data.
         __cls (Type[Any]): The class type of the entity.
         __data (List[Any]): The in-memory list of entity instances.
+        __index (Dict[str, Any]): The primary index mapping entity ids to entities.
+        __secondary (Dict[Any, Dict[Any, Dict[str, Any]]]): The secondary indexes.
+        __index_keys (Dict[str, Dict[str, Any]]): The indexed values of each entity,
+            used to unlink an entity from its previous buckets on update.
+        __journal_file (Optional[str]): The path to the journal, or None if journaling is off.
+        __journal_max_bytes (int): The journal size that triggers a compaction.
+        __flush_interval (Optional[float]): The group-commit window in seconds, or None
+            if every mutation is persisted synchronously.
+        __flush_max_mutations (int): The number of pending mutations that forces a flush.
+        __pending (Dict[str, Optional[Any]]): The entities mutated since the last
+            flush, with None for deleted ones.
+        __flusher (Optional[threading.Thread]): The group-commit thread, started by
+            the first mutation.
+        __flush_holder (List[BaseRepository]): Holds the repository while it has
+            pending mutations; the flusher thread and exit hook reach it only
+            through this list, so an idle repository can be garbage collected.
+        __flusher_stop (Optional[weakref.finalize]): Stops the flusher thread and
+            unregisters the exit hook, when called by ``close()`` or once the
+            repository is collected.
+        __positions (Dict[str, int]): The position of each entity in ``__data``.
+        __rw_lock (ReadWriteLock): Guards ``__data``, ``__positions`` and the indexes.
+        __epoch (str): A random token identifying this instance, so that versions
+            counted by different instances or processes never compare equal.
+        __version (int): Counts the changes made to the entities.
+        __modified_at (float): The time of the last change, or of the last load.
+        __loaded (Tuple[int, float]): The version and time of the last load.
+        __entity_versions (Dict[str, Tuple[int, float]]): The version and time of
+            the last change of each entity changed since the last load.
+        __chunks (List[Optional[Tuple[Any, ...]]]): The chunks of ``__data`` taken
+            for snapshots, with None for chunks changed since.
+        __snapshot (Optional[ListSnapshot]): The snapshot of the current version, or
+            None until a read takes it.
+        __serialized (Dict[Callable, Dict[str, Any]]): The cached form of each clean
+            entity, per serializer.
+        __file_lock (Optional[FileLock]): The lock shared with other processes, or
+            None outside multi-process mode.
+        __seen (Tuple[Any, Any]): The stamps of the data file and journal as of the
+            last load or write, used to detect changes made by other processes.
 
     Methods:
         load_data(): Loads data from the JSON file into memory.
         map_data_keys(data: dict) -> dict: Maps JSON keys to class attributes.
-        get_all() -> List[Any]: Returns all entity instances.
+        get_all() -> ListSnapshot: Returns an immutable snapshot of all entity instances.
+        get_page(limit: int, after: Optional[Tuple[str, int]]) -> Tuple[List[Any], Optional[Tuple[str, int]]]:
+            Returns a page of entity instances in insertion order.
         get_by_id(entity_id: str) -> Optional[Any]: Returns an entity instance by its ID.
-        create(entity: Any) -> Any: Adds a new entity instance.
+        find_by(field_name: Any, value: Any) -> List[Any]: Returns the entities matching an indexed field.
+        first_by(field_name: Any, value: Any) -> Optional[Any]: Returns the first entity matching an indexed field.
+        find_where(criteria: Dict[str, Any]) -> List[Any]: Returns the entities matching several indexed fields.
+        iter_where(criteria: Optional[Dict[str, Any]]) -> Iterator[Any]: Iterates over the
+            entities matching several indexed fields, or over all of them.
+        entity_version(entity_id: str) -> Optional[Tuple[int, float]]: Returns the version of an entity.
+        version_tag(entity_id: Optional[str]) -> Optional[Tuple[str, float]]: Returns an entity
+            tag and modification time for the collection or one entity.
+        create(entity: Any, sync: bool) -> Any: Adds a new entity instance.
+        create_many(entities: List[Any], sync: bool) -> List[Any]: Adds several entity instances.
+        update(entity: Any, sync: bool) -> Any: Stores, re-indexes and persists a modified entity.
+        delete(entity_id: str, sync: bool) -> Optional[Any]: Removes an entity instance.
+        delete_many(entity_ids: Iterable[str], sync: bool) -> List[Any]: Removes several entity instances.
+        flush(): Persists the pending mutations.
+        close(): Flushes and stops the group-commit thread.
+        refresh() -> bool: Picks up changes made by other processes.
+        write_lock(): Holds the write lock, across processes in multi-process mode.
         save_data(): Saves the current state of data to the JSON file.
+        compact(): Folds the journal into a fresh snapshot of the JSON file.
         serialize_entity(entity: Any) -> Dict[str, Any]: Serializes an entity to a dictionary.
+        serialize_many(entities: Iterable[Any], serializer: Callable) -> List[Any]: Serializes
+            entities, reusing the cached forms of unmodified ones.
     """
 
-    def __init__(self, data_file: str, cls: Any):
+    indexes: Tuple[Union[str, Tuple[str, ...]], ...] = ()
+    snapshot_chunk_size = 1024
+
+    def __init__(
+        self,
+        data_file: str,
+        cls: Any,
+        journal: bool = False,
+        journal_max_bytes: int = 1024 * 1024,
+        flush_interval_ms: Optional[int] = None,
+        flush_max_mutations: int = 100,
+        measure_load_memory: bool = False,
+        binary_snapshot: bool = False,
+        multi_process: bool = False,
+    ):
         """
         Initializes the BaseRepository with the given data file and class type.
 
         Parameters:
             data_file (str): The path to the JSON file.
             cls (Type[Any]): The class type of the entity.
+            journal (bool): Whether mutations are appended to a journal.
+            journal_max_bytes (int): The journal size that triggers a compaction.
+            flush_interval_ms (Optional[int]): The group-commit window, or None to
+                persist every mutation synchronously.
+            flush_max_mutations (int): The number of pending mutations that forces
+                a flush in group-commit mode.
+            measure_load_memory (bool): Whether to trace the peak memory allocated
+                while loading, which slows the load down.
+            binary_snapshot (bool): Whether to keep a binary snapshot of the JSON
+                file and load from it when it is fresh.
+            multi_process (bool): Whether other processes share the data files.
         """
         self.__data_file = data_file
         self.__cls = cls
-        self.__data = self.load_data()
+        self.__data_keys = [
+            (field.metadata["data_key"], field.name)
+            for field in fields(cls)
+            if "data_key" in field.metadata
+        ]
+        self.__field_names = [field.name for field in fields(cls)]
+        self.__text_prefixes = [
+            (f"        {encode_basestring(name)}: ", name)
+            for name in self.__field_names
+        ]
+        self.__journal_file = (
+            os.path.splitext(data_file)[0] + ".journal" if journal else None
+        )
+        self.__journal_max_bytes = journal_max_bytes
+        self.__journal = None
+        self.__journal_size = 0
+        self.__journal_lock = threading.Lock()
+        self.__compaction_lock = threading.Lock()
+        self.__compactor: Optional[threading.Thread] = None
+        self.__flush_interval = (
+            flush_interval_ms / 1000 if flush_interval_ms is not None else None
+        )
+        self.__flush_max_mutations = flush_max_mutations
+        self.__pending: Dict[str, Optional[Any]] = {}
+        self.__pending_mutations = 0
+        self.__flush_condition = threading.Condition()
+        self.__flusher: Optional[threading.Thread] = None
+        self.__flush_holder: List["BaseRepository"] = []
+        self.__flusher_stop: Optional[weakref.finalize] = None
+        self.__measure_load_memory = measure_load_memory
+        self.__snapshot_file = snapshot_path(data_file) if binary_snapshot else None
+        self.__file_lock = (
+            FileLock(os.path.splitext(data_file)[0] + ".lock")
+            if multi_process
+            else None
+        )
+        self.__thread_lock = threading.RLock()
+        self.__rw_lock = ReadWriteLock()
+        self.__epoch = secrets.token_hex(4)
+        self.__version = 0
+        self.load_stats: Dict[str, Any] = {}
+        with self.__file_lock.shared() if self.__file_lock else nullcontext():
+            self.__seen = self.__stamp()
+            self.__reset(self.load_data())
+        if self.__journal_file and os.path.exists(self.__journal_file + ".old"):
+            # A previous compaction was interrupted; finish it now.
+            self.compact()
 
     def load_data(self) -> List[Any]:
         """
-        Loads data from the JSON file into memory.
+        Loads data from the JSON file into memory, replaying the journal on top of
+        it in journal mode.
+
+        The file is parsed one array item at a time and each item is turned into an
+        entity straight away, so the parsed document is never held in memory as a
+        whole. The load time, and the peak memory if ``measure_load_memory`` is set,
+        are recorded in ``load_stats`` and logged.
 
         Returns:
             List[Any]: A list of entity instances.
         """
-        with open(self.__data_file, "r", encoding="utf-8") as f:
-            return [self.__cls(**self.map_data_keys(item)) for item in json.load(f)]
+        tracing = tracemalloc.is_tracing()
+        if self.__measure_load_memory:
+            if tracing:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+
+        if self.__snapshot_file and is_fresh(self.__snapshot_file, self.__data_file):
+            entities = self.__entities_from_columns(*read_columns(self.__snapshot_file))
+        else:
+            with open(self.__data_file, "r", encoding="utf-8") as f:
+                entities = list(self.__build_entities(iter_json_array(f)))
+            if self.__snapshot_file:
+                write_snapshot(
+                    self.__snapshot_file,
+                    [self.serialize_entity(entity) for entity in entities],
+                    source_stamp(self.__data_file),
+                )
+        if self.__journal_file:
+            positions = {
+                entity.id: position for position, entity in enumerate(entities)
+            }
+            deleted = False
+            for path in (self.__journal_file + ".old", self.__journal_file):
+                for record in self.__read_journal(path):
+                    if record["op"] == "delete":
+                        position = positions.pop(record["id"], None)
+                        if position is not None:
+                            entities[position] = None
+                            deleted = True
+                        continue
+                    entity = self.__cls(**self.map_data_keys(record["data"]))
+                    position = positions.setdefault(entity.id, len(entities))
+                    if position == len(entities):
+                        entities.append(entity)
+                    else:
+                        entities[position] = entity
+            if deleted:
+                entities = [entity for entity in entities if entity is not None]
+
+        self.load_stats = {
+            "entities": len(entities),
+            "seconds": time.perf_counter() - started,
+            "peak_memory_bytes": None,
+        }
+        if self.__measure_load_memory:
+            self.load_stats["peak_memory_bytes"] = (
+                tracemalloc.get_traced_memory()[1] - baseline
+            )
+            if not tracing:
+                tracemalloc.stop()
+        logging.info(
+            f"Loaded {len(entities)} {self.__cls.__name__} entities from "
+            f"{self.__data_file} in {self.load_stats['seconds'] * 1000:.1f} ms"
+            + (
+                f", peak memory {self.load_stats['peak_memory_bytes'] / 1024:.1f} KiB"
+                if self.__measure_load_memory
+                else ""
+            )
+        )
+        return entities
 
     def map_data_keys(self, data: dict) -> Dict[str, Any]:
         """
@@ -56,20 +351,131 @@ class BaseRepository:
         Returns:
             dict: The dictionary with mapped keys.
         """
-        for field in fields(self.__cls):
-            data_key = field.metadata.get("data_key")
+        for data_key, name in self.__data_keys:
             if data_key in data:
-                data[field.name] = data.pop(data_key)
+                data[name] = data.pop(data_key)
         return data
 
-    def get_all(self) -> List[Any]:
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def last_modified(self) -> float:
+        return self.__modified_at
+
+    def entity_version(self, entity_id: str) -> Optional[Tuple[int, float]]:
         """
-        Returns all entity instances.
+        Returns the repository version and the time of the last change of an entity.
+        Entities unchanged since the last load share the version of that load.
+
+        Parameters:
+            entity_id (str): The ID of the entity.
 
         Returns:
-            List[Any]: A list of all entity instances.
+            Optional[Tuple[int, float]]: The version and modification time, or None
+            if the entity is not held in memory.
         """
-        return self.__data
+        version = self.__entity_versions.get(entity_id)
+        if version is None and entity_id in self.__index:
+            return self.__loaded
+        return version
+
+    def version_tag(
+        self, entity_id: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Returns a tag that changes whenever the collection, or a single entity of it,
+        changes, together with the time it last changed. Tags are unique to this
+        instance, so a tag from before a restart never matches.
+
+        Parameters:
+            entity_id (Optional[str]): The ID of an entity, or None for the whole
+                collection.
+
+        Returns:
+            Optional[Tuple[str, float]]: The tag and modification time, or None if
+            the entity is not held in memory.
+        """
+        if entity_id is None:
+            version, modified_at = self.__version, self.__modified_at
+        else:
+            entity_version = self.entity_version(entity_id)
+            if entity_version is None:
+                return None
+            version, modified_at = entity_version
+        return f"{self.__epoch}-{version}", modified_at
+
+    def get_all(self) -> ListSnapshot:
+        """
+        Returns all entity instances as an immutable snapshot, whose membership and
+        order later mutations leave untouched. Its entities stay untouched as long
+        as changes are made on copies passed to ``update()``, as the services do.
+        Reading the snapshot of an unchanged list takes no lock; after a change,
+        only the chunks that changed are copied. Readers may rebuild the snapshot
+        side by side, each in a list of its own that it publishes once complete.
+
+        Returns:
+            ListSnapshot: A snapshot of all entity instances, in insertion order.
+        """
+        snapshot = self.__snapshot
+        if snapshot is not None:
+            return snapshot
+        with self.__rw_lock.reading():
+            snapshot = self.__snapshot
+            if snapshot is None:
+                size = self.snapshot_chunk_size
+                taken = self.__chunks
+                chunks = []
+                for start in range(0, len(self.__data), size):
+                    number = start // size
+                    chunk = taken[number] if number < len(taken) else None
+                    if chunk is None:
+                        chunk = tuple(self.__data[start : start + size])
+                    chunks.append(chunk)
+                self.__chunks = chunks
+                snapshot = ListSnapshot(tuple(chunks), size, self.__version)
+                self.__snapshot = snapshot
+            return snapshot
+
+    def get_page(
+        self, limit: int, after: Optional[Tuple[str, int]] = None
+    ) -> Tuple[List[Any], Optional[Tuple[str, int]]]:
+        """
+        Returns up to ``limit`` entities in insertion order, following the entity
+        a previous page ended with.
+
+        The key of a page is the ID and position of its last entity. The page after
+        it starts behind that entity wherever it has moved to; if it was deleted
+        meanwhile, it starts at its former position, where the entities after it
+        have shifted.
+
+        Parameters:
+            limit (int): The maximum number of entities to return.
+            after (Optional[Tuple[str, int]]): The key returned with the previous
+                page, or None for the first page.
+
+        Returns:
+            Tuple[List[Any], Optional[Tuple[str, int]]]: The entities, and the key
+            of the next page, or None if this is the last one.
+
+        Raises:
+            ValueError: If ``after`` is not a key of this shape.
+        """
+        with self.__rw_lock.reading():
+            start = 0
+            if after is not None:
+                entity_id, position = check_page_key(after)
+                current = self.__positions.get(entity_id)
+                if current is not None:
+                    start = current + 1
+                else:
+                    start = min(max(position, 0), len(self.__data))
+            page = self.__data[start : start + limit]
+            end = start + len(page)
+            if not page or end >= len(self.__data):
+                return page, None
+            return page, (page[-1].id, end - 1)
 
     def get_by_id(self, entity_id: str) -> Optional[Any]:
         """
@@ -81,34 +487,317 @@ class BaseRepository:
         Returns:
             Optional[Any]: The entity instance, or None if not found.
         """
-        return next((item for item in self.__data if item.id == entity_id), None)
+        with self.__rw_lock.reading():
+            return self.__index.get(entity_id)
+
+    def find_by(self, field_name: Any, value: Any) -> List[Any]:
+        """
+        Returns the entities whose indexed field equals the given value.
+
+        Parameters:
+            field_name (Union[str, Tuple[str, ...]]): A field, or tuple of fields,
+                listed in ``indexes``.
+            value (Any): The value to look up, or a tuple of values for a composite
+                index. Enums match their raw value.
+
+        Returns:
+            List[Any]: The matching entities, in insertion order.
+
+        Raises:
+            KeyError: If the field is not declared as an index.
+        """
+        with self.__rw_lock.reading():
+            bucket = self.__bucket(field_name, value)
+            return list(bucket.values()) if bucket else []
+
+    def first_by(self, field_name: Any, value: Any) -> Optional[Any]:
+        """
+        Returns the first entity whose indexed field equals the given value, in
+        constant time. Entities are ordered by when they took that value.
+
+        Parameters:
+            field_name (Union[str, Tuple[str, ...]]): A field, or tuple of fields,
+                listed in ``indexes``.
+            value (Any): The value to look up, or a tuple of values for a composite
+                index. Enums match their raw value.
+
+        Returns:
+            Optional[Any]: The matching entity, or None if there is none.
+
+        Raises:
+            KeyError: If the field is not declared as an index.
+        """
+        with self.__rw_lock.reading():
+            bucket = self.__bucket(field_name, value)
+            return next(iter(bucket.values())) if bucket else None
 
-    def create(self, entity: Any) -> Any:
+    def find_where(self, criteria: Dict[str, Any]) -> List[Any]:
+        """
+        Returns the entities whose indexed fields equal all the given values. The
+        lookup uses a composite index covering exactly these fields when there is
+        one; otherwise it walks the smallest matching bucket and checks the other
+        fields against the indexed values of each entity.
+
+        Parameters:
+            criteria (Dict[str, Any]): The value of each field, every field being
+                listed in ``indexes``. Enums match their raw value.
+
+        Returns:
+            List[Any]: The matching entities, in insertion order.
+
+        Raises:
+            KeyError: If a field is not declared as an index.
+        """
+        with self.__rw_lock.reading():
+            for name in criteria:
+                if name not in self.__secondary:
+                    raise KeyError(name)
+            if not criteria:
+                return list(self.__data)
+            composite = next(
+                (
+                    name
+                    for name in self.__secondary
+                    if isinstance(name, tuple)
+                    and len(name) == len(criteria)
+                    and set(name) == set(criteria)
+                ),
+                None,
+            )
+            if composite is not None:
+                bucket = self.__bucket(
+                    composite, tuple(criteria[part] for part in composite)
+                )
+                matches = list(bucket.values()) if bucket else []
+            else:
+                buckets = [self.__bucket(name, criteria[name]) for name in criteria]
+                if not all(buckets):
+                    return []
+                smallest = min(buckets, key=len)
+                keys = [
+                    (name, self.index_value(value)) for name, value in criteria.items()
+                ]
+                index_keys = self.__index_keys
+                matches = [
+                    entity
+                    for entity in smallest.values()
+                    if all(index_keys[entity.id][name] == key for name, key in keys)
+                ]
+            positions = self.__positions
+            matches.sort(key=lambda entity: positions[entity.id])
+            return matches
+
+    def iter_where(self, criteria: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Iterates over the entities matching ``find_where(criteria)``, or over all
+        entities without criteria, for callers that process them one at a time.
+        Without criteria the iteration walks the published snapshot, so it copies
+        nothing and later mutations do not affect it.
+
+        Parameters:
+            criteria (Optional[Dict[str, Any]]): The value of each field, every field
+                being listed in ``indexes``.
+
+        Returns:
+            Iterator[Any]: The entities, in insertion order.
+
+        Raises:
+            KeyError: If a field is not declared as an index.
+        """
+        return iter(self.find_where(criteria) if criteria else self.get_all())
+
+    def create(self, entity: Any, sync: bool = False) -> Any:
         """
         Adds a new entity instance.
 
         Parameters:
             entity (Any): The entity instance to add.
+            sync (bool): Whether to flush before returning in group-commit mode.
 
         Returns:
             Any: The added entity instance.
         """
         entity.id = generate_id()
-        self.__data.append(entity)
-        self.save_data()
+        self.__put(entity)
+        self.__persist({entity.id: entity}, sync)
+        return entity
+
+    def create_many(self, entities: List[Any], sync: bool = False) -> List[Any]:
+        """
+        Adds several new entity instances with a single write of the data file or
+        journal.
+
+        Parameters:
+            entities (List[Any]): The entity instances to add.
+            sync (bool): Whether to flush before returning in group-commit mode.
+
+        Returns:
+            List[Any]: The added entity instances.
+        """
+        with self.__rw_lock.writing():
+            for entity in entities:
+                entity.id = generate_id()
+                self.__put(entity)
+        if entities:
+            self.__persist({entity.id: entity for entity in entities}, sync)
+        return entities
+
+    def update(self, entity: Any, sync: bool = False) -> Any:
+        """
+        Stores a modified entity, re-indexes it and persists the change. Passing a
+        modified copy, e.g. from ``dataclasses.replace``, replaces the stored
+        instance and leaves published snapshots untouched; an instance modified in
+        place is re-indexed too, but snapshots holding it see the change as it is
+        made.
+
+        Parameters:
+            entity (Any): The modified entity instance, or a modified copy of it.
+            sync (bool): Whether to flush before returning in group-commit mode.
+
+        Returns:
+            Any: The updated entity instance.
+        """
+        self.__put(entity)
+        self.__persist({entity.id: entity}, sync)
         return entity
 
+    def delete(self, entity_id: str, sync: bool = False) -> Optional[Any]:
+        """
+        Removes an entity instance and persists the removal.
+
+        Parameters:
+            entity_id (str): The ID of the entity to remove.
+            sync (bool): Whether to flush before returning in group-commit mode.
+
+        Returns:
+            Optional[Any]: The removed entity instance, or None if not found.
+        """
+        removed = self.__remove([entity_id])
+        if removed:
+            self.__persist({entity_id: None}, sync)
+        return removed[0] if removed else None
+
+    def delete_many(self, entity_ids: Iterable[str], sync: bool = False) -> List[Any]:
+        """
+        Removes several entity instances at once, in one pass over the list and one
+        write of the data file or journal.
+
+        Parameters:
+            entity_ids (Iterable[str]): The IDs of the entities to remove.
+            sync (bool): Whether to flush before returning in group-commit mode.
+
+        Returns:
+            List[Any]: The removed entity instances; unknown IDs are skipped.
+        """
+        removed = self.__remove(entity_ids)
+        if removed:
+            self.__persist({entity.id: None for entity in removed}, sync)
+        return removed
+
+    def flush(self):
+        """
+        Persists the mutations pending in group-commit mode. Does nothing when no
+        mutation is pending.
+        """
+        if not self.__pending:
+            return
+        with self.write_lock():
+            with self.__flush_condition:
+                pending = dict(self.__pending)
+                self.__pending.clear()
+                self.__pending_mutations = 0
+            if pending:
+                self.__write(pending)
+
+    def close(self):
+        """
+        Persists the pending mutations and stops the group-commit thread, if one
+        was started. Mutations made afterwards start a new one.
+        """
+        self.flush()
+        with self.__flush_condition:
+            flusher, stop = self.__flusher, self.__flusher_stop
+            self.__flusher = self.__flusher_stop = None
+            if not self.__pending:
+                self.__flush_holder.clear()
+        if stop is not None:
+            stop()
+            flusher.join()
+
+    def refresh(self) -> bool:
+        """
+        Picks up the changes that other processes made to the data files since the
+        last load or write. Does nothing outside multi-process mode.
+
+        Detecting that nothing changed costs one ``stat`` per file, so this is cheap
+        enough to call before serving every request.
+
+        Returns:
+            bool: True if changes were loaded.
+        """
+        if self.__file_lock is None or self.__stamp() == self.__seen:
+            return False
+        with self.__file_lock.shared():
+            return self.__refresh()
+
+    @contextmanager
+    def write_lock(self):
+        """
+        Holds the repository's write lock, under which reads and writes form one
+        atomic step. In multi-process mode the lock is shared with other processes
+        and the changes they made are loaded when it is acquired. The lock is
+        reentrant, and every mutation takes it.
+        """
+        if self.__file_lock is None:
+            with self.__thread_lock:
+                yield
+            return
+        with self.__file_lock.exclusive():
+            self.__refresh()
+            try:
+                yield
+            finally:
+                self.__seen = self.__stamp()
+
     def save_data(self):
         """
-        Saves the current state of data to the JSON file.
+        Saves the current state of data to the JSON file. In journal mode this
+        compacts the journal into the new snapshot.
         """
-        with open(self.__data_file, "w", encoding="utf-8") as f:
-            json.dump(
-                [self.serialize_entity(item) for item in self.__data],
-                f,
-                ensure_ascii=False,
-                indent=4,
-            )
+        if self.__journal_file:
+            self.compact()
+            return
+        with self.write_lock():
+            self.__write_data_file(*self.__data_file_rows())
+
+    def compact(self):
+        """
+        Folds the journal into a fresh snapshot of the JSON file.
+
+        The journal is rotated aside while the in-memory state is serialized, so
+        writers keep appending to a new journal while the snapshot is written. The
+        rotated journal is only removed once the snapshot is in place; replaying it
+        over the new snapshot is harmless because records are whole-entity upserts
+        and deletions, which the snapshot already reflects.
+        """
+        old_file = self.__journal_file + ".old"
+        with self.write_lock(), self.__compaction_lock:
+            with self.__journal_lock:
+                if self.__journal is not None:
+                    self.__journal.close()
+                    self.__journal = None
+                if os.path.exists(old_file) and os.path.exists(self.__journal_file):
+                    with open(self.__journal_file, "r", encoding="utf-8") as src:
+                        with open(old_file, "a", encoding="utf-8") as dst:
+                            dst.write(src.read())
+                    os.remove(self.__journal_file)
+                elif os.path.exists(self.__journal_file):
+                    os.replace(self.__journal_file, old_file)
+                self.__journal_size = 0
+                rows = self.__data_file_rows()
+            self.__write_data_file(*rows)
+            if os.path.exists(old_file):
+                os.remove(old_file)
 
     def serialize_entity(self, entity: Any) -> Dict[str, Any]:
         """
@@ -120,9 +809,418 @@ class BaseRepository:
         Returns:
             Dict[str, Any]: The serialized entity as a dictionary.
         """
-        entity_dict = asdict(entity)
-        for field in fields(self.__cls):
-            value = entity_dict.get(field.name)
-            if isinstance(value, Enum):
-                entity_dict[field.name] = value.value
+        entity_dict = {}
+        for name in self.__field_names:
+            value = getattr(entity, name)
+            entity_dict[name] = value.value if isinstance(value, Enum) else value
         return entity_dict
+
+    def serialize_many(
+        self, entities: Iterable[Any], serializer: Callable[[Any], Any]
+    ) -> List[Any]:
+        """
+        Serializes entities, reusing the form cached for each entity that was not
+        created or updated since the same serializer last saw it. Only entities held
+        by the repository are cached; detached copies are always serialized afresh.
+
+        The cached forms are shared between callers and must not be modified. The
+        read lock is taken per chunk of entities rather than for the whole call, so
+        serializing a large snapshot does not hold writers off until it is done.
+
+        Parameters:
+            entities (Iterable[Any]): The entities to serialize.
+            serializer (Callable[[Any], Any]): A deterministic function of an entity,
+                such as a schema's ``dump``. It identifies the cache, so it should be
+                created once rather than per call.
+
+        Returns:
+            List[Any]: The serialized entities, in order.
+        """
+        if isinstance(entities, ListSnapshot):
+            chunks = entities.chunks()
+        else:
+            iterator = iter(entities)
+            size = self.snapshot_chunk_size
+            chunks = iter(lambda: list(islice(iterator, size)), [])
+        result = []
+        for chunk in chunks:
+            with self.__rw_lock.reading():
+                result.extend(self.__serialize_many(chunk, serializer))
+        return result
+
+    @staticmethod
+    def index_value(value: Any) -> Any:
+        """
+        Normalizes a value for use as an index key, so that an Enum and its raw
+        value land in the same bucket.
+
+        Parameters:
+            value (Any): The field value.
+
+        Returns:
+            Any: The normalized index key.
+        """
+        return value.value if isinstance(value, Enum) else value
+
+    def __reset(self, entities: List[Any]):
+        with self.__rw_lock.writing():
+            self.__serialized: Dict[Callable, Dict[str, Any]] = {}
+            self.__data = entities
+            self.__chunks: List[Optional[Tuple[Any, ...]]] = []
+            self.__snapshot: Optional[ListSnapshot] = None
+            self.__positions: Dict[str, int] = {
+                entity.id: position for position, entity in enumerate(entities)
+            }
+            self.__index: Dict[str, Any] = {}
+            self.__secondary: Dict[Any, Dict[Any, Dict[str, Any]]] = {
+                name: {} for name in self.indexes
+            }
+            self.__index_keys: Dict[str, Dict[str, Any]] = {}
+            for entity in entities:
+                self.__add_to_indexes(entity)
+            self.__entity_versions: Dict[str, Tuple[int, float]] = {}
+            self.__modified_at = time.time()
+            self.__version += 1
+            self.__loaded = (self.__version, self.__modified_at)
+
+    def __put(self, entity: Any):
+        with self.__rw_lock.writing():
+            position = self.__positions.get(entity.id)
+            if position is None:
+                position = self.__positions[entity.id] = len(self.__data)
+                self.__data.append(entity)
+                self.__changed(position)
+            else:
+                if self.__data[position] is not entity:
+                    self.__data[position] = entity
+                    self.__changed(position)
+                self.__remove_from_indexes(entity.id)
+            self.__add_to_indexes(entity)
+            for cache in self.__serialized.values():
+                cache.pop(entity.id, None)
+            self.__touch(entity.id)
+
+    def __remove(self, entity_ids: Iterable[str]) -> List[Any]:
+        with self.__rw_lock.writing():
+            positions = sorted(
+                {self.__positions[id] for id in entity_ids if id in self.__positions}
+            )
+            if not positions:
+                return []
+            first = positions[0]
+            removed = [self.__data[position] for position in positions]
+            removed_ids = {entity.id for entity in removed}
+            kept = [e for e in self.__data[first:] if e.id not in removed_ids]
+            del self.__data[first:]
+            self.__data.extend(kept)
+            for entity in removed:
+                del self.__positions[entity.id]
+                self.__remove_from_indexes(entity.id)
+                for cache in self.__serialized.values():
+                    cache.pop(entity.id, None)
+                self.__entity_versions.pop(entity.id, None)
+            for position, entity in enumerate(kept, first):
+                self.__positions[entity.id] = position
+            # Every later entity shifted, so every later chunk changed.
+            del self.__chunks[first // self.snapshot_chunk_size :]
+            self.__changed(first)
+            self.__touch()
+            return removed
+
+    def __changed(self, position: int):
+        # Called with the write lock held, when the entity at position is replaced
+        # or added: retire the published snapshot and the chunk of that position.
+        number = position // self.snapshot_chunk_size
+        if number < len(self.__chunks):
+            self.__chunks[number] = None
+        self.__snapshot = None
+
+    def __touch(self, entity_id: Optional[str] = None):
+        # Called with the write lock held, once a change is complete, so that a
+        # reader never sees the new version before the change itself.
+        self.__modified_at = time.time()
+        self.__version += 1
+        if entity_id is not None:
+            self.__entity_versions[entity_id] = (self.__version, self.__modified_at)
+
+    def __serialize_many(
+        self, entities: Iterable[Any], serializer: Callable
+    ) -> List[Any]:
+        # Called with the read lock held, so no entity is re-indexed meanwhile.
+        cache = self.__serialized.get(serializer)
+        if cache is None:
+            cache = self.__serialized.setdefault(serializer, {})
+        index = self.__index
+        result = []
+        for entity in entities:
+            if index.get(entity.id) is not entity:
+                result.append(serializer(entity))
+                continue
+            form = cache.get(entity.id)
+            if form is None:
+                form = cache[entity.id] = serializer(entity)
+            result.append(form)
+        return result
+
+    def __data_file_rows(self) -> Tuple[List[str], Optional[List[Dict[str, Any]]]]:
+        with self.__rw_lock.reading():
+            texts = self.__serialize_many(self.__data, self.__encode_entity)
+            items = None
+            if self.__snapshot_file:
+                items = self.__serialize_many(self.__data, self.serialize_entity)
+        return texts, items
+
+    def __encode_entity(self, entity: Any) -> str:
+        # The entity as an item of the data file, formatted exactly as
+        # json.dump(items, indent=4) would. Entities only hold scalar fields.
+        parts = []
+        for prefix, name in self.__text_prefixes:
+            value = getattr(entity, name)
+            if isinstance(value, Enum):
+                value = value.value
+            parts.append(
+                prefix + _SCALAR_ENCODERS.get(type(value), _encode_json)(value)
+            )
+        return "    {\n" + ",\n".join(parts) + "\n    }"
+
+    def __stamp(self) -> Tuple[Any, Any]:
+        def stat(path):
+            try:
+                result = os.stat(path)
+            except FileNotFoundError:
+                return None
+            return result.st_ino, result.st_mtime_ns, result.st_size
+
+        journal = stat(self.__journal_file) if self.__journal_file else None
+        return stat(self.__data_file), journal
+
+    def __refresh(self) -> bool:
+        # Called with the file lock held, so the files do not change meanwhile.
+        stamp = self.__stamp()
+        if stamp == self.__seen:
+            return False
+        (data, journal), (seen_data, seen_journal) = stamp, self.__seen
+        if data == seen_data and journal is not None:
+            if seen_journal is None or seen_journal[0] != journal[0]:
+                offset = 0
+            else:
+                offset = seen_journal[2]
+            if offset <= journal[2]:
+                for record in self.__read_journal(self.__journal_file, offset):
+                    if record["op"] == "delete":
+                        self.__remove([record["id"]])
+                    else:
+                        self.__put(self.__cls(**self.map_data_keys(record["data"])))
+                self.__reapply_pending()
+                self.__journal_size = journal[2]
+                self.__seen = stamp
+                return True
+        # The data file was rewritten or the journal rotated: reload everything.
+        with self.__journal_lock:
+            if self.__journal is not None:
+                self.__journal.close()
+                self.__journal = None
+            self.__journal_size = journal[2] if journal else 0
+        self.__reset(self.load_data())
+        self.__reapply_pending()
+        self.__seen = stamp
+        return True
+
+    def __reapply_pending(self):
+        with self.__flush_condition:
+            pending = list(self.__pending.items())
+        self.__remove([entity_id for entity_id, entity in pending if entity is None])
+        for entity_id, entity in pending:
+            if entity is not None:
+                self.__put(entity)
+
+    def __write(self, changes: Dict[str, Optional[Any]]):
+        with self.write_lock():
+            # Another process may have changed the files since the entities were
+            # modified; the refresh done by write_lock() may have replaced them.
+            self.__remove([id for id, entity in changes.items() if entity is None])
+            for entity_id, entity in changes.items():
+                if entity is not None and self.__index.get(entity_id) is not entity:
+                    self.__put(entity)
+            if self.__journal_file:
+                self.__append_journal(changes)
+            else:
+                self.save_data()
+
+    def __build_entities(self, items):
+        for item in items:
+            yield self.__cls(**self.map_data_keys(item))
+
+    def __entities_from_columns(self, names: List[str], columns: List[List[Any]]):
+        if names == [field.name for field in fields(self.__cls)] and not any(
+            ABSENT_VALUE in column for column in columns
+        ):
+            # Columns in constructor order: no per-row dictionaries needed.
+            return list(map(self.__cls, *columns))
+        rows = (
+            {
+                name: value
+                for name, value in zip(names, values)
+                if value is not ABSENT_VALUE
+            }
+            for values in zip(*columns)
+        )
+        return list(self.__build_entities(rows))
+
+    def __persist(self, changes: Dict[str, Optional[Any]], sync: bool):
+        if self.__flush_interval is None:
+            self.__write(changes)
+            return
+        with self.__flush_condition:
+            self.__pending.update(changes)
+            self.__pending_mutations += len(changes)
+            if not self.__flush_holder:
+                self.__flush_holder.append(self)
+            if self.__flusher is None:
+                self.__start_flusher()
+            self.__flush_condition.notify()
+        if sync:
+            self.flush()
+
+    def __start_flusher(self):
+        # Called with the flush condition held. Neither the thread nor the exit
+        # hook references the repository, only the holder does while mutations
+        # are pending, so discarding an idle repository stops both.
+        condition, holder = self.__flush_condition, self.__flush_holder
+        stopped = threading.Event()
+        exit_hook = partial(BaseRepository.__flush_held, holder)
+        atexit.register(exit_hook)
+        self.__flusher = threading.Thread(
+            target=BaseRepository.__run_flusher,
+            args=(condition, holder, stopped, self.__flush_interval),
+            daemon=True,
+        )
+        self.__flusher_stop = weakref.finalize(
+            self, BaseRepository.__stop_flusher, condition, stopped, exit_hook
+        )
+        # At exit the hook flushes the held repositories; the finalizer must not
+        # unregister it first.
+        self.__flusher_stop.atexit = False
+        self.__flusher.start()
+
+    @staticmethod
+    def __run_flusher(
+        condition: threading.Condition,
+        holder: List["BaseRepository"],
+        stopped: threading.Event,
+        interval: float,
+    ):
+        while True:
+            with condition:
+                condition.wait_for(lambda: holder or stopped.is_set())
+                if stopped.is_set():
+                    return
+                repository = holder[0]
+                condition.wait_for(
+                    lambda: stopped.is_set()
+                    or repository.__pending_mutations
+                    >= repository.__flush_max_mutations,
+                    timeout=interval,
+                )
+            try:
+                repository.flush()
+            except Exception as e:
+                logging.error(f"Group commit flush failed: {str(e)}", exc_info=True)
+            with condition:
+                if not repository.__pending:
+                    holder.clear()
+            del repository
+
+    @staticmethod
+    def __flush_held(holder: List["BaseRepository"]):
+        for repository in list(holder):
+            repository.flush()
+
+    @staticmethod
+    def __stop_flusher(
+        condition: threading.Condition, stopped: threading.Event, exit_hook: Callable
+    ):
+        atexit.unregister(exit_hook)
+        with condition:
+            stopped.set()
+            condition.notify_all()
+
+    def __append_journal(self, changes: Dict[str, Optional[Any]]):
+        lines = "".join(
+            json.dumps(
+                (
+                    {"op": "delete", "id": entity_id}
+                    if entity is None
+                    else {"op": "put", "data": self.serialize_entity(entity)}
+                ),
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+            + "\n"
+            for entity_id, entity in changes.items()
+        )
+        with self.__journal_lock:
+            if self.__journal is None:
+                self.__journal = open(self.__journal_file, "a", encoding="utf-8")
+                self.__journal_size = self.__journal.tell()
+            self.__journal.write(lines)
+            self.__journal.flush()
+            self.__journal_size += len(lines.encode("utf-8"))
+            needs_compaction = self.__journal_size > self.__journal_max_bytes
+        if needs_compaction and not (self.__compactor and self.__compactor.is_alive()):
+            self.__compactor = threading.Thread(target=self.compact, daemon=True)
+            self.__compactor.start()
+
+    def __write_data_file(
+        self, texts: List[str], items: Optional[List[Dict[str, Any]]] = None
+    ):
+        temp_file = self.__data_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write("[\n" + ",\n".join(texts) + "\n]" if texts else "[]")
+        os.replace(temp_file, self.__data_file)
+        if self.__snapshot_file:
+            write_snapshot(self.__snapshot_file, items, source_stamp(self.__data_file))
+
+    @staticmethod
+    def __read_journal(path: str, offset: int = 0):
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Only the last record can be torn by a crash mid-append.
+                    logging.warning(f"Skipping truncated journal record in {path}")
+                    continue
+                if record.get("op") in ("put", "delete"):
+                    yield record
+
+    def __bucket(self, field_name: Any, value: Any) -> Optional[Dict[str, Any]]:
+        if isinstance(field_name, tuple):
+            key = tuple(self.index_value(item) for item in value)
+        else:
+            key = self.index_value(value)
+        return self.__secondary[field_name].get(key)
+
+    def __add_to_indexes(self, entity: Any):
+        self.__index[entity.id] = entity
+        keys = {}
+        for name, buckets in self.__secondary.items():
+            if isinstance(name, tuple):
+                key = tuple(self.index_value(getattr(entity, part)) for part in name)
+            else:
+                key = self.index_value(getattr(entity, name))
+            buckets.setdefault(key, {})[entity.id] = entity
+            keys[name] = key
+        self.__index_keys[entity.id] = keys
+
+    def __remove_from_indexes(self, entity_id: str):
+        self.__index.pop(entity_id, None)
+        for name, key in self.__index_keys.pop(entity_id, {}).items():
+            bucket = self.__secondary[name].get(key)
+            if bucket is not None:
+                bucket.pop(entity_id, None)
+                if not bucket:
+                    del self.__secondary[name][key]
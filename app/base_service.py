@@ -1,4 +1,14 @@
-from typing import List, Optional, Any
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from app.base_repository import BaseRepository
 
 
@@ -19,15 +29,58 @@ class BaseService:
         """
         self.repository = repository
 
-    def get_all(self) -> List[Any]:
+    def get_all(self) -> Sequence[Any]:
         """
         Returns all entity instances.
 
         Returns:
-            List[Any]: A list of all entity instances.
+            Sequence[Any]: All entity instances, as a stable view that later
+            mutations do not change.
         """
         return self.repository.get_all()
 
+    def get_page(
+        self, limit: int, after: Optional[Tuple[str, int]] = None
+    ) -> Tuple[List[Any], Optional[Tuple[str, int]]]:
+        """
+        Returns a page of entity instances in the repository's order.
+
+        Parameters:
+            limit (int): The maximum number of entities to return.
+            after (Optional[Tuple[str, int]]): The key returned with the previous
+                page, or None for the first page.
+
+        Returns:
+            Tuple[List[Any], Optional[Tuple[str, int]]]: The entities, and the key
+            of the next page, or None if this is the last one.
+        """
+        return self.repository.get_page(limit, after)
+
+    def find_where(self, criteria: Dict[str, Any]) -> List[Any]:
+        """
+        Returns the entities whose indexed fields equal all the given values.
+
+        Parameters:
+            criteria (Dict[str, Any]): The value of each field.
+
+        Returns:
+            List[Any]: The matching entities, in the repository's order.
+        """
+        return self.repository.find_where(criteria)
+
+    def iter_where(self, criteria: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Iterates over the entities whose indexed fields equal all the given values,
+        or over all entities, without building a list of them.
+
+        Parameters:
+            criteria (Optional[Dict[str, Any]]): The value of each field.
+
+        Returns:
+            Iterator[Any]: The matching entities, in the repository's order.
+        """
+        return self.repository.iter_where(criteria)
+
     def get_by_id(self, entity_id: str) -> Optional[Any]:
         """
         Returns an entity instance by its ID.
@@ -40,6 +93,23 @@ class BaseService:
         """
         return self.repository.get_by_id(entity_id)
 
+    def version_tag(
+        self, entity_id: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Returns a tag that changes whenever the collection, or one entity of it,
+        changes, together with the time it last changed.
+
+        Parameters:
+            entity_id (Optional[str]): The ID of an entity, or None for the whole
+                collection.
+
+        Returns:
+            Optional[Tuple[str, float]]: The tag and modification time, or None if
+            the repository holds no version for the entity.
+        """
+        return self.repository.version_tag(entity_id)
+
     def create(self, entity: Any) -> Any:
         """
         Creates a new entity instance.
@@ -51,3 +121,32 @@ class BaseService:
             Any: The created entity instance.
         """
         return self.repository.create(entity)
+
+    def create_many(self, entities: List[Any]) -> List[Any]:
+        """
+        Creates several entity instances in one repository operation.
+
+        Parameters:
+            entities (List[Any]): The entity instances to create.
+
+        Returns:
+            List[Any]: The created entity instances.
+        """
+        return self.repository.create_many(entities)
+
+    def serialize_many(
+        self, entities: Iterable[Any], serializer: Callable[[Any], Any]
+    ) -> List[Any]:
+        """
+        Serializes entities, reusing the forms the repository cached for entities
+        that have not changed since.
+
+        Parameters:
+            entities (Iterable[Any]): The entities to serialize.
+            serializer (Callable[[Any], Any]): A long-lived serializer, such as the
+                ``dump`` method of a module-level schema.
+
+        Returns:
+            List[Any]: The serialized entities, in order.
+        """
+        return self.repository.serialize_many(entities, serializer)
@@ -0,0 +1,119 @@
+"""
+Compression of response bodies, negotiated through ``Accept-Encoding``.
+
+Bodies are compressed with gzip, or with brotli when the optional ``brotli``
+package is installed and the client prefers it. Only JSON bodies of at least
+``COMPRESSION_MIN_BYTES`` are compressed: below that, the header overhead and the
+time spent compressing outweigh the bytes saved. Streamed responses, such as the
+NDJSON exports, are sent as they are.
+
+A response served by ``versioned_response`` records its response cache key and
+version tag in ``g.cached_response``, so its compressed variant is stored next to
+the cached body and compressed once per version instead of once per request.
+"""
+
+import gzip
+from typing import Optional
+
+from flask import current_app, g, request
+from werkzeug.datastructures import Accept
+
+from app.container import current_services
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = frozenset({"application/json"})
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings() -> list:
+    """
+    Returns the content codings this server can produce, preferred first.
+
+    Returns:
+        list: ``["br", "gzip"]``, or ``["gzip"]`` without the brotli package.
+    """
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encodings: Accept) -> Optional[str]:
+    """
+    Picks the content coding for a request from its ``Accept-Encoding`` header.
+
+    Parameters:
+        accept_encodings (Accept): The parsed ``Accept-Encoding`` header.
+
+    Returns:
+        Optional[str]: The coding with the highest quality the client accepts, or
+            None when the body should be sent as it is.
+    """
+    return accept_encodings.best_match(supported_encodings())
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """
+    Compresses a body with the given content coding. gzip output is written with
+    a zero timestamp, so the same body always compresses to the same bytes.
+
+    Parameters:
+        data (bytes): The body.
+        encoding (str): ``gzip`` or ``br``.
+
+    Returns:
+        bytes: The compressed body.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response):
+    """
+    Compresses a response body when the client accepts a supported coding and the
+    body is compressible JSON of at least ``COMPRESSION_MIN_BYTES``. Registered as
+    an ``after_request`` hook by ``create_app`` when ``COMPRESSION`` is enabled.
+
+    The ``ETag`` of a compressed response is made weak: the compressed and plain
+    bodies are different bytes of the same representation, so a tag received with
+    either still matches ``If-None-Match``.
+
+    Parameters:
+        response (Response): The response to send.
+
+    Returns:
+        Response: The same response, compressed when applicable.
+    """
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 304)
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    body = response.get_data()
+    if len(body) < current_app.config["COMPRESSION_MIN_BYTES"]:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    cached = g.get("cached_response")
+    cache = current_services().response_cache
+    data = cache.get_encoded(*cached, encoding) if cached else None
+    if data is None:
+        data = compress(body, encoding)
+        if cached:
+            cache.put_encoded(*cached, encoding, data)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
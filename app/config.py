@@ -0,0 +1,95 @@
+import os
+from typing import Any, Mapping, Optional
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class Config:
+    """
+    Application settings, overridable through environment variables.
+
+    Attributes:
+        STORAGE_ENGINE (str): The repository backend, ``json`` or ``sqlite``.
+        DATA_DIR (str): The directory holding the JSON data files of the ``json``
+            backend.
+        SQLITE_DATABASE (str): The database file used by the ``sqlite`` backend.
+        JOURNAL_ENABLED (bool): Whether repositories append mutations to a journal
+            instead of rewriting their JSON file.
+        JOURNAL_MAX_BYTES (int): The journal size that triggers a background compaction.
+        FLUSH_INTERVAL_MS (Optional[int]): The group-commit window; unset persists every
+            mutation synchronously.
+        FLUSH_MAX_MUTATIONS (int): The number of pending mutations that forces a flush.
+        MEASURE_LOAD_MEMORY (bool): Whether repositories trace peak memory while loading.
+        BINARY_SNAPSHOT (bool): Whether repositories keep and load binary snapshots.
+        MULTI_PROCESS (bool): Whether several processes, such as WSGI workers, share
+            the data files.
+        ARCHIVE_AFTER_DAYS (Optional[float]): The age, in days since delivery, at
+            which delivered rents are moved to the archive on startup; unset keeps
+            them in the data file. Not supported by the ``sqlite`` engine.
+        SHARD_BY_BLOQ (bool): Whether lockers and rents are stored in one data file
+            per bloq, under ``data/lockers/`` and ``data/rents/``.
+        RESPONSE_CACHE_BYTES (int): The maximum total size of the response bodies
+            cached by the GET endpoints; 0 disables the cache.
+        COMPRESSION (bool): Whether JSON responses are compressed for clients that
+            accept gzip, or brotli when installed.
+        COMPRESSION_MIN_BYTES (int): The body size below which responses are sent
+            uncompressed.
+    """
+
+    STORAGE_ENGINE = os.environ.get("BLOQIT_STORAGE", "json")
+    DATA_DIR = os.environ.get("BLOQIT_DATA_DIR", "data")
+    SQLITE_DATABASE = os.environ.get("BLOQIT_SQLITE_DATABASE", "data/bloqit.db")
+    JOURNAL_ENABLED = env_flag("BLOQIT_JOURNAL")
+    JOURNAL_MAX_BYTES = int(os.environ.get("BLOQIT_JOURNAL_MAX_BYTES", 1024 * 1024))
+    FLUSH_INTERVAL_MS = (
+        int(os.environ["BLOQIT_FLUSH_INTERVAL_MS"])
+        if os.environ.get("BLOQIT_FLUSH_INTERVAL_MS")
+        else None
+    )
+    FLUSH_MAX_MUTATIONS = int(os.environ.get("BLOQIT_FLUSH_MAX_MUTATIONS", 100))
+    MEASURE_LOAD_MEMORY = env_flag("BLOQIT_MEASURE_LOAD_MEMORY")
+    BINARY_SNAPSHOT = env_flag("BLOQIT_BINARY_SNAPSHOT")
+    MULTI_PROCESS = env_flag("BLOQIT_MULTI_PROCESS")
+    SHARD_BY_BLOQ = env_flag("BLOQIT_SHARD_BY_BLOQ")
+    ARCHIVE_AFTER_DAYS = (
+        float(os.environ["BLOQIT_ARCHIVE_AFTER_DAYS"])
+        if os.environ.get("BLOQIT_ARCHIVE_AFTER_DAYS")
+        else None
+    )
+    RESPONSE_CACHE_BYTES = int(
+        os.environ.get("BLOQIT_RESPONSE_CACHE_BYTES", 32 * 1024 * 1024)
+    )
+    COMPRESSION = env_flag("BLOQIT_COMPRESSION")
+    COMPRESSION_MIN_BYTES = int(os.environ.get("BLOQIT_COMPRESSION_MIN_BYTES", 1024))
+
+    @classmethod
+    def repository_options(cls, settings: Optional[Mapping[str, Any]] = None) -> dict:
+        """
+        Returns the keyword arguments used to construct the repositories.
+
+        Parameters:
+            settings (Optional[Mapping[str, Any]]): An application config overriding
+                the class attributes.
+
+        Returns:
+            dict: The repository options.
+        """
+        settings = settings or {}
+
+        def setting(name):
+            return settings.get(name, getattr(cls, name))
+
+        return {
+            "journal": setting("JOURNAL_ENABLED"),
+            "journal_max_bytes": setting("JOURNAL_MAX_BYTES"),
+            "flush_interval_ms": setting("FLUSH_INTERVAL_MS"),
+            "flush_max_mutations": setting("FLUSH_MAX_MUTATIONS"),
+            "measure_load_memory": setting("MEASURE_LOAD_MEMORY"),
+            "binary_snapshot": setting("BINARY_SNAPSHOT"),
+            "multi_process": setting("MULTI_PROCESS"),
+        }
@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping
+
+from flask import current_app
+
+from app.config import Config
+from app.repositories import BloqRepository, LockerRepository, RentRepository
+from app.response_cache import ResponseCache
+from app.services import BloqService, LockerService, RentService
+from app.sharded_repository import ShardedLockerRepository, ShardedRentRepository
+from app.sqlite_repository import (
+    SQLiteBloqRepository,
+    SQLiteLockerRepository,
+    SQLiteRentRepository,
+)
+
+EXTENSION_NAME = "bloqit"
+
+
+class ServiceContainer:
+    """
+    Builds the repositories, services and response cache of an application on
+    first use.
+
+    Nothing is loaded when the container is created: each repository reads its data
+    the first time it, or a service depending on it, is requested. The settings are
+    read from the application config, so tests and tools can point an application
+    at other data files.
+
+    Attributes:
+        __settings (Mapping[str, Any]): The application config.
+        __instances (Dict[str, Any]): The repositories and services built so far.
+        __lock (threading.RLock): Ensures every instance is built only once.
+
+    Methods:
+        bloq_repository: The Bloq repository.
+        locker_repository: The Locker repository.
+        rent_repository: The Rent repository.
+        bloq_service: The Bloq service.
+        locker_service: The Locker service.
+        rent_service: The Rent service.
+        response_cache: The cache of serialized GET responses.
+        loaded_repositories() -> List[Any]: Returns the repositories built so far.
+        close(): Flushes the loaded repositories and stops their background threads.
+    """
+
+    def __init__(self, settings: Mapping[str, Any]):
+        """
+        Initializes an empty ServiceContainer.
+
+        Parameters:
+            settings (Mapping[str, Any]): The application config.
+        """
+        self.__settings = settings
+        self.__instances: Dict[str, Any] = {}
+        self.__lock = threading.RLock()
+
+    @property
+    def bloq_repository(self):
+        """
+        The Bloq repository, built on first access.
+        """
+        return self.__get("bloq_repository", self.__build_bloq_repository)
+
+    @property
+    def locker_repository(self):
+        """
+        The Locker repository, built on first access.
+        """
+        return self.__get("locker_repository", self.__build_locker_repository)
+
+    @property
+    def rent_repository(self):
+        """
+        The Rent repository, built on first access.
+        """
+        return self.__get("rent_repository", self.__build_rent_repository)
+
+    @property
+    def bloq_service(self) -> BloqService:
+        """
+        The Bloq service, built on first access.
+        """
+        return self.__get("bloq_service", lambda: BloqService(self.bloq_repository))
+
+    @property
+    def locker_service(self) -> LockerService:
+        """
+        The Locker service, built on first access.
+        """
+        return self.__get(
+            "locker_service", lambda: LockerService(self.locker_repository)
+        )
+
+    @property
+    def rent_service(self) -> RentService:
+        """
+        The Rent service, built on first access.
+        """
+        return self.__get(
+            "rent_service",
+            lambda: RentService(self.rent_repository, self.locker_service),
+        )
+
+    @property
+    def response_cache(self) -> ResponseCache:
+        """
+        The cache of serialized GET responses, built on first access.
+        """
+        return self.__get(
+            "response_cache",
+            lambda: ResponseCache(self.__settings["RESPONSE_CACHE_BYTES"]),
+        )
+
+    def loaded_repositories(self) -> List[Any]:
+        """
+        Returns the repositories built so far, without building the others.
+
+        Returns:
+            List[Any]: The loaded repositories.
+        """
+        names = ("bloq_repository", "locker_repository", "rent_repository")
+        return [self.__instances[name] for name in names if name in self.__instances]
+
+    def close(self):
+        """
+        Flushes the loaded repositories and stops their group-commit threads. The
+        repositories stay usable; a later mutation starts a new thread.
+        """
+        for repository in self.loaded_repositories():
+            repository.close()
+
+    def __get(self, name: str, build: Callable[[], Any]) -> Any:
+        instance = self.__instances.get(name)
+        if instance is None:
+            with self.__lock:
+                instance = self.__instances.get(name)
+                if instance is None:
+                    started = time.perf_counter()
+                    instance = build()
+                    elapsed = (time.perf_counter() - started) * 1000
+                    logging.info(f"Built {name} in {elapsed:.1f} ms")
+                    self.__instances[name] = instance
+        return instance
+
+    def __sqlite(self) -> bool:
+        return self.__settings["STORAGE_ENGINE"] == "sqlite"
+
+    def __data_path(self, name: str) -> str:
+        return os.path.join(self.__settings["DATA_DIR"], name)
+
+    def __build_bloq_repository(self):
+        if self.__sqlite():
+            return SQLiteBloqRepository(self.__settings["SQLITE_DATABASE"])
+        return BloqRepository(
+            self.__data_path("bloqs.json"),
+            **Config.repository_options(self.__settings),
+        )
+
+    def __build_locker_repository(self):
+        if self.__sqlite():
+            return SQLiteLockerRepository(self.__settings["SQLITE_DATABASE"])
+        options = Config.repository_options(self.__settings)
+        if self.__settings["SHARD_BY_BLOQ"]:
+            return ShardedLockerRepository(self.__data_path("lockers"), **options)
+        return LockerRepository(self.__data_path("lockers.json"), **options)
+
+    def __build_rent_repository(self):
+        if self.__sqlite():
+            if self.__settings["ARCHIVE_AFTER_DAYS"] is not None:
+                logging.warning(
+                    "ARCHIVE_AFTER_DAYS is ignored: archiving is not supported by "
+                    "the sqlite engine"
+                )
+            return SQLiteRentRepository(self.__settings["SQLITE_DATABASE"])
+        options = Config.repository_options(self.__settings)
+        options["archive_after_days"] = self.__settings["ARCHIVE_AFTER_DAYS"]
+        if self.__settings["SHARD_BY_BLOQ"]:
+            return ShardedRentRepository(
+                self.__data_path("rents"), self.locker_repository, **options
+            )
+        return RentRepository(self.__data_path("rents.json"), **options)
+
+
+def current_services() -> ServiceContainer:
+    """
+    Returns the service container of the current application.
+
+    Returns:
+        ServiceContainer: The container registered by ``create_app``.
+    """
+    return current_app.extensions[EXTENSION_NAME]
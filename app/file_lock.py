@@ -0,0 +1,88 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+class FileLock:
+    """
+    An advisory lock on a file, shared by every process that opens the same path,
+    such as the workers of a pre-forking WSGI server.
+
+    The lock is reentrant within a process: a thread that already holds it may
+    acquire it again, and the file lock is only released by the outermost release.
+    Nested acquisitions keep the mode of the outermost one. Other threads of the
+    process wait for the holder, whatever the mode, so the lock also serializes
+    the threads of a worker.
+
+    The lock file is opened once per process, so that children forked after the
+    lock was first used do not share its open file description with their parent.
+
+    Attributes:
+        __path (str): The path to the lock file.
+        __lock (threading.RLock): Serializes the threads of this process.
+        __depth (int): The number of nested acquisitions held by the owning thread.
+        __file (Optional[IO]): The open lock file of this process.
+        __pid (Optional[int]): The process that opened ``__file``.
+
+    Methods:
+        exclusive(): Holds the lock exclusively, for writers.
+        shared(): Holds the lock shared with other readers.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes the FileLock for the given lock file.
+
+        Parameters:
+            path (str): The path to the lock file, created on first use.
+
+        Raises:
+            RuntimeError: If the platform has no POSIX file locks.
+        """
+        if fcntl is None:
+            raise RuntimeError("File locking requires fcntl, a POSIX-only module")
+        self.__path = path
+        self.__lock = threading.RLock()
+        self.__depth = 0
+        self.__file = None
+        self.__pid = None
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Holds the lock exclusively, for writers.
+        """
+        with self.__hold(fcntl.LOCK_EX):
+            yield
+
+    @contextmanager
+    def shared(self):
+        """
+        Holds the lock shared with the readers of other processes.
+        """
+        with self.__hold(fcntl.LOCK_SH):
+            yield
+
+    @contextmanager
+    def __hold(self, mode: int):
+        with self.__lock:
+            if self.__depth == 0:
+                fcntl.flock(self.__descriptor(), mode)
+            self.__depth += 1
+            try:
+                yield
+            finally:
+                self.__depth -= 1
+                if self.__depth == 0:
+                    fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+
+    def __descriptor(self) -> int:
+        if self.__pid != os.getpid():
+            self.__file = open(self.__path, "a+b")
+            self.__pid = os.getpid()
+        return self.__file.fileno()
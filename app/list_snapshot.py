@@ -0,0 +1,76 @@
+from collections.abc import Sequence
+from itertools import chain
+from typing import Any, Iterator, Tuple
+
+
+class ListSnapshot(Sequence):
+    """
+    An immutable, versioned view of a list, stored as a tuple of fixed-size chunks.
+
+    A repository publishes a new snapshot after its entities change. Chunks are
+    plain tuples, so successive snapshots share every chunk that did not change:
+    appending an entity copies only the last chunk, and replacing one copies only
+    the chunk holding it.
+
+    Attributes:
+        version (int): The version of the list the snapshot was taken from.
+        __chunks (Tuple[Tuple[Any, ...], ...]): The items, in chunks of
+            ``chunk_size`` items; only the last chunk may be shorter.
+        __chunk_size (int): The number of items per chunk.
+        __length (int): The total number of items.
+
+    Methods:
+        chunks() -> Tuple[Tuple[Any, ...], ...]: Returns the chunks of the snapshot.
+    """
+
+    __slots__ = ("version", "__chunks", "__chunk_size", "__length")
+
+    def __init__(
+        self, chunks: Tuple[Tuple[Any, ...], ...], chunk_size: int, version: int
+    ):
+        """
+        Initializes a ListSnapshot over the given chunks.
+
+        Parameters:
+            chunks (Tuple[Tuple[Any, ...], ...]): The items, in chunks of
+                ``chunk_size`` items.
+            chunk_size (int): The number of items per chunk.
+            version (int): The version of the list the snapshot was taken from.
+        """
+        self.version = version
+        self.__chunks = chunks
+        self.__chunk_size = chunk_size
+        self.__length = sum(len(chunk) for chunk in chunks)
+
+    def chunks(self) -> Tuple[Tuple[Any, ...], ...]:
+        """
+        Returns the chunks of the snapshot, for callers that process it in batches.
+
+        Returns:
+            Tuple[Tuple[Any, ...], ...]: The chunks, in order.
+        """
+        return self.__chunks
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(self.__length))]
+        if position < 0:
+            position += self.__length
+        if not 0 <= position < self.__length:
+            raise IndexError("snapshot index out of range")
+        chunk, offset = divmod(position, self.__chunk_size)
+        return self.__chunks[chunk][offset]
+
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(self.__chunks)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, (ListSnapshot, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"ListSnapshot(version={self.version}, items={list(self)!r})"
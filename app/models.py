@@ -1,8 +1,9 @@
 from enum import Enum
 from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from typing import Optional
 
-from app.utils import generate_id
+from app.utils import generate_id, intern_value
 
 
 class RentStatus(Enum):
@@ -25,34 +26,52 @@ class LockerStatus(Enum):
     CLOSED = "CLOSED"
 
 
-@dataclass
+@dataclass(slots=True)
 class Rent:
     id: str = field(default_factory=generate_id)
     locker_id: Optional[str] = field(default=None, metadata={"data_key": "lockerId"})
     weight: float = 0.0
     size: RentSize = ""
     status: RentStatus = "CREATED"
+    delivered_at: Optional[str] = field(
+        default=None, metadata={"data_key": "deliveredAt"}
+    )
+
+    def __post_init__(self):
+        # Lockers, sizes and statuses repeat across rents; share one string each.
+        self.locker_id = intern_value(self.locker_id)
+        self.size = intern_value(self.size)
+        self.status = intern_value(self.status)
 
     def update_status(self, new_status: str):
-        self.status = new_status
+        self.status = intern_value(new_status)
+        if self.delivered_at is None and self.status in (
+            RentStatus.DELIVERED,
+            RentStatus.DELIVERED.value,
+        ):
+            self.delivered_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
 
     def update_locker_id(self, new_locker_id: str):
-        self.locker_id = new_locker_id
+        self.locker_id = intern_value(new_locker_id)
 
 
-@dataclass
+@dataclass(slots=True)
 class Locker:
     id: str = field(default_factory=generate_id)
     bloq_id: Optional[str] = field(default=None, metadata={"data_key": "bloqId"})
     status: LockerStatus = LockerStatus.OPEN
     is_occupied: bool = field(default=False, metadata={"data_key": "isOccupied"})
 
+    def __post_init__(self):
+        self.bloq_id = intern_value(self.bloq_id)
+        self.status = intern_value(self.status)
+
     def update_status(self, new_status: LockerStatus, occupied: bool):
-        self.status = new_status
+        self.status = intern_value(new_status)
         self.is_occupied = occupied
 
 
-@dataclass
+@dataclass(slots=True)
 class Bloq:
     id: str = field(default_factory=generate_id)
     title: str = ""
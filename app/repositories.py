@@ -1,7 +1,12 @@
+import logging
+import os
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+
+from app.archive import ArchiveSegment
 from app.base_repository import BaseRepository
-from app.models import Bloq, Locker, Rent
-from app.utils import select_unoccupied_locker
-from typing import Optional
+from app.models import Bloq, Locker, LockerStatus, Rent, RentStatus
+from typing import Any, Dict, Iterator, List, Optional
 
 
 class BloqRepository(BaseRepository):
@@ -11,57 +16,296 @@ class BloqRepository(BaseRepository):
     Inherits from BaseRepository.
     """
 
-    def __init__(self, data_file: str):
+    def __init__(self, data_file: str, **options):
         """
         Initializes the BloqRepository with the given data file.
 
         Parameters:
             data_file (str): The path to the JSON file.
+            **options: Persistence options forwarded to BaseRepository.
         """
-        super().__init__(data_file, Bloq)
+        super().__init__(data_file, Bloq, **options)
 
 
 class LockerRepository(BaseRepository):
     """
     A repository class for managing Locker entities.
 
-    Inherits from BaseRepository.
+    Inherits from BaseRepository. Lockers are indexed by bloq, occupancy and status,
+    and by bloq and occupancy combined: the ``(bloq_id, False)`` bucket of that
+    composite index is the free-locker pool of a bloq, so selecting a free locker
+    takes constant time.
 
     Methods:
-        select_unoccupied(): Selects an unoccupied locker.
+        select_unoccupied(bloq_id: Optional[str]): Selects an unoccupied locker.
+        claim_unoccupied(bloq_id: Optional[str]): Atomically selects and occupies a locker.
+        compare_and_set_occupied(locker_id: str, expected: bool, occupied: bool, status: LockerStatus):
+            Atomically changes the occupancy of a locker if it has the expected one.
+        get_by_bloq(bloq_id: str): Returns the lockers of a bloq.
+        get_by_occupied(occupied: bool): Returns the lockers with the given occupancy.
     """
 
-    def __init__(self, data_file: str):
+    indexes = ("bloq_id", "is_occupied", "status", ("bloq_id", "is_occupied"))
+
+    def __init__(self, data_file: str, **options):
         """
         Initializes the LockerRepository with the given data file.
 
         Parameters:
             data_file (str): The path to the JSON file.
+            **options: Persistence options forwarded to BaseRepository.
         """
-        super().__init__(data_file, Locker)
+        super().__init__(data_file, Locker, **options)
 
-    def select_unoccupied(self) -> Optional[Locker]:
+    def select_unoccupied(self, bloq_id: Optional[str] = None) -> Optional[Locker]:
         """
         Selects an unoccupied locker.
 
+        Parameters:
+            bloq_id (Optional[str]): The bloq to pick from, or None for any bloq.
+
         Returns:
             Optional[Locker]: An unoccupied locker, or None if none are available.
         """
-        return select_unoccupied_locker(self.__data)
+        if bloq_id is None:
+            return self.first_by("is_occupied", False)
+        return self.first_by(("bloq_id", "is_occupied"), (bloq_id, False))
+
+    def claim_unoccupied(self, bloq_id: Optional[str] = None) -> Optional[Locker]:
+        """
+        Selects an unoccupied locker and marks it closed and occupied under the
+        write lock, so concurrent callers, in any process, never get the same one.
+        The change is flushed before returning.
+
+        Parameters:
+            bloq_id (Optional[str]): The bloq to pick from, or None for any bloq.
+
+        Returns:
+            Optional[Locker]: The claimed locker, or None if none are available.
+        """
+        with self.write_lock():
+            locker = self.select_unoccupied(bloq_id)
+            if locker:
+                # Replaced rather than modified, so published snapshots keep the
+                # previous state.
+                locker = replace(locker)
+                locker.update_status(LockerStatus.CLOSED, True)
+                self.update(locker, sync=True)
+        return locker
+
+    def compare_and_set_occupied(
+        self, locker_id: str, expected: bool, occupied: bool, status: LockerStatus
+    ) -> Optional[Locker]:
+        """
+        Sets the occupancy and status of a locker only if its occupancy is still the
+        expected one, as one atomic step. The change is flushed before returning.
+
+        Parameters:
+            locker_id (str): The ID of the locker.
+            expected (bool): The occupancy the locker must have.
+            occupied (bool): The new occupancy.
+            status (LockerStatus): The new status.
+
+        Returns:
+            Optional[Locker]: The updated locker, or None if the locker does not exist
+            or its occupancy differs from the expected one.
+        """
+        with self.write_lock():
+            locker = self.get_by_id(locker_id)
+            if locker is None or locker.is_occupied != expected:
+                return None
+            locker = replace(locker)
+            locker.update_status(status, occupied)
+            self.update(locker, sync=True)
+        return locker
+
+    def get_by_bloq(self, bloq_id: str) -> List[Locker]:
+        """
+        Returns the lockers of a bloq.
+
+        Parameters:
+            bloq_id (str): The ID of the bloq.
+
+        Returns:
+            List[Locker]: The lockers belonging to the bloq.
+        """
+        return self.find_by("bloq_id", bloq_id)
+
+    def get_by_occupied(self, occupied: bool) -> List[Locker]:
+        """
+        Returns the lockers with the given occupancy.
+
+        Parameters:
+            occupied (bool): Whether the lockers are occupied.
+
+        Returns:
+            List[Locker]: The matching lockers.
+        """
+        return self.find_by("is_occupied", occupied)
 
 
 class RentRepository(BaseRepository):
     """
     A repository class for managing Rent entities.
 
-    Inherits from BaseRepository.
+    Inherits from BaseRepository. Rents are indexed by locker, status and size.
+
+    Delivered rents are never modified again, so they can be moved out of the data
+    file into a compressed, append-only archive segment next to it
+    (``<data>.archive.gz``), keeping the hot set that is loaded, scanned and
+    rewritten small. Archived rents remain readable through ``get_by_id()``, as
+    detached copies, via the segment's offset index.
+
+    Attributes:
+        __archive (ArchiveSegment): The archive segment of delivered rents.
+        __archive_after (Optional[timedelta]): How long after delivery rents are
+            archived when the repository is loaded, or None to only archive on demand.
+
+    Methods:
+        get_by_locker(locker_id: str): Returns the rents assigned to a locker.
+        get_by_status(status: RentStatus): Returns the rents with the given status.
+        archive_delivered(older_than: Optional[timedelta]) -> int: Archives delivered rents.
+        is_archived(rent_id: str) -> bool: Tells whether a rent is archived.
+        iter_archived(criteria: Optional[Dict[str, Any]]) -> Iterator[Rent]: Iterates over
+            the archived rents.
     """
 
-    def __init__(self, data_file: str):
+    indexes = ("locker_id", "status", "size")
+
+    def __init__(
+        self, data_file: str, archive_after_days: Optional[float] = None, **options
+    ):
         """
         Initializes the RentRepository with the given data file.
 
         Parameters:
             data_file (str): The path to the JSON file.
+            archive_after_days (Optional[float]): The age, in days since delivery, at
+                which delivered rents are archived on load, or None to disable it.
+            **options: Persistence options forwarded to BaseRepository.
+        """
+        super().__init__(data_file, Rent, **options)
+        self.__archive = ArchiveSegment(os.path.splitext(data_file)[0] + ".archive.gz")
+        self.__archive_after = (
+            timedelta(days=archive_after_days)
+            if archive_after_days is not None
+            else None
+        )
+        if self.__archive_after is not None:
+            self.archive_delivered(self.__archive_after)
+
+    def get_by_id(self, entity_id: str) -> Optional[Rent]:
+        """
+        Returns a rent by its ID, looking it up in the archive if it is not in the
+        hot set. Archived rents are detached copies and must not be passed to
+        ``update()``, which would add them back to the hot set; RentService rejects
+        changes to them.
+
+        Parameters:
+            entity_id (str): The ID of the rent.
+
+        Returns:
+            Optional[Rent]: The rent, or None if not found.
+        """
+        rent = super().get_by_id(entity_id)
+        if rent is None:
+            record = self.__archive.get(entity_id)
+            if record is not None:
+                rent = Rent(**self.map_data_keys(record))
+        return rent
+
+    def is_archived(self, rent_id: str) -> bool:
+        """
+        Tells whether a rent is archived, i.e. found in the archive segment but not
+        in the hot set.
+
+        Parameters:
+            rent_id (str): The ID of the rent.
+
+        Returns:
+            bool: True if the rent is archived.
+        """
+        if super().get_by_id(rent_id) is not None:
+            return False
+        return self.__archive.get(rent_id) is not None
+
+    def archive_delivered(self, older_than: Optional[timedelta] = None) -> int:
+        """
+        Moves delivered rents out of the hot set into the archive segment. With
+        ``older_than``, rents without a delivery time, such as those delivered
+        before delivery times were recorded, are kept: their age is unknown.
+
+        The rents are written to the archive before they are deleted, so a crash in
+        between leaves them in both places and the next run only deletes them.
+
+        Parameters:
+            older_than (Optional[timedelta]): The minimum time since delivery, or
+                None to archive every delivered rent, with or without a delivery
+                time.
+
+        Returns:
+            int: The number of rents archived.
+        """
+        cutoff = (
+            datetime.now(timezone.utc) - older_than if older_than is not None else None
+        )
+        with self.write_lock():
+            rents = [
+                rent
+                for rent in self.get_by_status(RentStatus.DELIVERED)
+                if cutoff is None
+                or rent.delivered_at is not None
+                and datetime.fromisoformat(rent.delivered_at) <= cutoff
+            ]
+            if not rents:
+                return 0
+            self.__archive.append([self.serialize_entity(rent) for rent in rents])
+            self.delete_many([rent.id for rent in rents], sync=True)
+        logging.info(f"Archived {len(rents)} delivered rents")
+        return len(rents)
+
+    def iter_archived(
+        self, criteria: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Rent]:
+        """
+        Iterates over the archived rents in the order they were archived, reading
+        the archive one block at a time.
+
+        Parameters:
+            criteria (Optional[Dict[str, Any]]): The value of each field the rents
+                must have. Enums match their raw value.
+
+        Returns:
+            Iterator[Rent]: The archived rents, as detached copies.
+        """
+        keys = [
+            (name, self.index_value(value)) for name, value in (criteria or {}).items()
+        ]
+        for record in self.__archive.records():
+            rent = Rent(**self.map_data_keys(record))
+            if all(self.index_value(getattr(rent, name)) == key for name, key in keys):
+                yield rent
+
+    def get_by_locker(self, locker_id: str) -> List[Rent]:
+        """
+        Returns the rents assigned to a locker.
+
+        Parameters:
+            locker_id (str): The ID of the locker.
+
+        Returns:
+            List[Rent]: The rents assigned to the locker.
+        """
+        return self.find_by("locker_id", locker_id)
+
+    def get_by_status(self, status: RentStatus) -> List[Rent]:
+        """
+        Returns the rents with the given status.
+
+        Parameters:
+            status (RentStatus): The rent status, as an enum or its raw value.
+
+        Returns:
+            List[Rent]: The matching rents.
         """
-        super().__init__(data_file, Rent)
+        return self.find_by("status", status)
@@ -0,0 +1,174 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class ResponseCache:
+    """
+    A bounded cache of serialized response bodies, each stored with the version tag
+    of the data it was built from.
+
+    An entry is only returned for the tag it was stored with, so it stops being
+    served as soon as the repository it was built from changes, and is replaced by
+    the next response built for its key. Compressed variants of a body are stored
+    on its entry, so they are dropped along with it. The cache holds at most
+    ``max_bytes`` of bodies and variants and evicts the least recently used entries
+    beyond that.
+
+    Attributes:
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that found no entry for the tag.
+        __max_bytes (int): The maximum total size of the cached bodies.
+        __entries (OrderedDict[Hashable, Tuple[str, bytes, str, Dict[str, bytes]]]):
+            The tag, body, mimetype and encoded variants of each key, least
+            recently used first.
+        __size (int): The total size of the cached bodies and variants.
+        __lock (threading.Lock): Guards the entries and counters.
+
+    Methods:
+        get(key: Hashable, tag: str) -> Optional[Tuple[bytes, str]]: Returns a cached body.
+        put(key: Hashable, tag: str, body: bytes, mimetype: str): Caches a body.
+        get_encoded(key: Hashable, tag: str, encoding: str) -> Optional[bytes]:
+            Returns a cached encoded variant of a body.
+        put_encoded(key: Hashable, tag: str, encoding: str, data: bytes): Caches an
+            encoded variant of a cached body.
+        clear(): Drops every entry.
+        stats() -> Dict[str, int]: Returns the counters and the cache size.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initializes an empty ResponseCache.
+
+        Parameters:
+            max_bytes (int): The maximum total size of the cached bodies; 0 disables
+                the cache.
+        """
+        self.__max_bytes = max_bytes
+        self.__entries: (
+            "OrderedDict[Hashable, Tuple[str, bytes, str, Dict[str, bytes]]]"
+        ) = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, tag: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Returns the body cached for a key, if it was built from the given version.
+
+        Parameters:
+            key (Hashable): The key of the response, such as its path and query.
+            tag (str): The current version tag of the data behind the response.
+
+        Returns:
+            Optional[Tuple[bytes, str]]: The body and its mimetype, or None.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[0] != tag:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, tag: str, body: bytes, mimetype: str):
+        """
+        Caches a body built from the given version, replacing the previous entry of
+        the key. Bodies larger than the whole cache are not stored.
+
+        Parameters:
+            key (Hashable): The key of the response.
+            tag (str): The version tag read before the body was built.
+            body (bytes): The response body.
+            mimetype (str): The mimetype of the body.
+        """
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__size -= self.__entry_size(previous)
+            if len(body) > self.__max_bytes:
+                return
+            self.__entries[key] = (tag, body, mimetype, {})
+            self.__size += len(body)
+            self.__evict()
+
+    def get_encoded(self, key: Hashable, tag: str, encoding: str) -> Optional[bytes]:
+        """
+        Returns an encoded variant of the body cached for a key, if the body was
+        built from the given version. The hit and miss counters are not updated.
+
+        Parameters:
+            key (Hashable): The key of the response.
+            tag (str): The current version tag of the data behind the response.
+            encoding (str): The content coding, such as ``gzip``.
+
+        Returns:
+            Optional[bytes]: The encoded body, or None.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[0] != tag:
+                return None
+            return entry[3].get(encoding)
+
+    def put_encoded(self, key: Hashable, tag: str, encoding: str, data: bytes):
+        """
+        Caches an encoded variant of the body cached for a key. Nothing is stored
+        unless that body is cached and was built from the given version.
+
+        Parameters:
+            key (Hashable): The key of the response.
+            tag (str): The version tag the body was built from.
+            encoding (str): The content coding, such as ``gzip``.
+            data (bytes): The encoded body.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[0] != tag or encoding in entry[3]:
+                return
+            if self.__entry_size(entry) + len(data) > self.__max_bytes:
+                return
+            entry[3][encoding] = data
+            self.__size += len(data)
+            self.__entries.move_to_end(key)
+            self.__evict()
+
+    def __evict(self):
+        """
+        Drops the least recently used entries until the cache fits its bound.
+        """
+        while self.__size > self.__max_bytes:
+            _, evicted = self.__entries.popitem(last=False)
+            self.__size -= self.__entry_size(evicted)
+
+    @staticmethod
+    def __entry_size(entry: Tuple[str, bytes, str, Dict[str, bytes]]) -> int:
+        """
+        Returns the size of the body and encoded variants of an entry.
+        """
+        return len(entry[1]) + sum(len(data) for data in entry[3].values())
+
+    def clear(self):
+        """
+        Drops every entry. The counters are kept.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters and the current size of the cache.
+
+        Returns:
+            Dict[str, int]: The ``hits``, ``misses``, ``entries`` and ``bytes``.
+        """
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.__entries),
+                "bytes": self.__size,
+            }
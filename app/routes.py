@@ -1,31 +1,227 @@
 import logging
+from datetime import datetime, timezone
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, g, jsonify, make_response, request
+from flask.json.provider import DefaultJSONProvider
 from marshmallow import ValidationError
-from app.services import BloqService, LockerService, RentService
-from app.repositories import BloqRepository, LockerRepository, RentRepository
+from werkzeug.local import LocalProxy
+from app.container import current_services
+from app.services import LockerUnavailableError, RentArchivedError
 from app.models import Bloq, Locker, Rent, RentStatus, RentSize
+from app.utils import decode_cursor, encode_cursor, paginate
 from app.schemas import (
     BloqSchema,
+    LockerFilterSchema,
     LockerSchema,
+    PageQuerySchema,
+    RentExportSchema,
+    RentFilterSchema,
     RentSchema,
     RentCreateSchema,
     RentSchemaPatch,
     LockerSchemaPatch,
     RentAssignLocker,
+    compile_json_serializer,
+    compile_loader,
+    compile_serializer,
+    encode_compact_json,
 )
 
-bloq_repository = BloqRepository("data/bloqs.json")
-locker_repository = LockerRepository("data/lockers.json")
-rent_repository = RentRepository("data/rents.json")
+# The services of the current application, built with their repositories on
+# first use by its ServiceContainer.
+bloq_service = LocalProxy(lambda: current_services().bloq_service)
+locker_service = LocalProxy(lambda: current_services().locker_service)
+rent_service = LocalProxy(lambda: current_services().rent_service)
 
-bloq_service = BloqService(bloq_repository)
-locker_service = LockerService(locker_repository)
-rent_service = RentService(rent_repository, locker_service)
+# Long-lived schema instances and the serializers compiled from them. List and
+# detail endpoints reuse the JSON text the repositories cache per serializer.
+bloq_schema = BloqSchema()
+locker_schema = LockerSchema()
+rent_schema = RentSchema()
+dump_bloq = compile_serializer(bloq_schema)
+dump_locker = compile_serializer(locker_schema)
+dump_rent = compile_serializer(rent_schema)
+bloq_json = compile_json_serializer(bloq_schema)
+locker_json = compile_json_serializer(locker_schema)
+rent_json = compile_json_serializer(rent_schema)
+# Loaders and serializers compiled once from the write schemas. Input the
+# compiled loaders do not accept outright is validated by marshmallow, which
+# reports the usual errors.
+load_bloq = compile_loader(BloqSchema())
+load_locker = compile_loader(LockerSchema())
+load_locker_patch = compile_loader(LockerSchemaPatch())
+load_rent = compile_loader(RentCreateSchema())
+load_rent_patch = compile_loader(RentSchemaPatch())
+load_rent_assign = compile_loader(RentAssignLocker())
+dump_locker_patch = compile_serializer(LockerSchemaPatch())
+dump_rent_patch = compile_serializer(RentSchemaPatch())
+dump_rent_assign = compile_serializer(RentAssignLocker())
+page_query_schema = PageQuerySchema()
+locker_filter_schema = LockerFilterSchema()
+rent_filter_schema = RentFilterSchema()
+rent_export_schema = RentExportSchema()
+
+DEFAULT_PAGE_SIZE = 100
+MAX_BULK_ITEMS = 1000
+EXPORT_CHUNK_LINES = 500
 
 api = Blueprint("api", __name__)
 
 
+def compact_json() -> bool:
+    """
+    Tells whether the application renders JSON responses with Flask's default
+    compact settings, which the JSON text of the compiled serializers reproduces
+    byte for byte. Otherwise, such as in debug mode, responses go through
+    ``jsonify``.
+    """
+    provider = current_app.json
+    return (
+        type(provider) is DefaultJSONProvider
+        and provider.sort_keys
+        and provider.ensure_ascii
+        and provider.compact is not False
+        and not (provider.compact is None and current_app.debug)
+    )
+
+
+def json_text_response(text):
+    """Responds with JSON text, terminated by a newline as ``jsonify`` does."""
+    return current_app.response_class(text + "\n", mimetype=current_app.json.mimetype)
+
+
+def entity_response(service, entity, serialize, serialize_json):
+    """
+    Responds with one entity, serialized with ``serialize`` for ``jsonify`` or,
+    with compact JSON, from the JSON text ``serialize_json`` gives it, which the
+    repository caches.
+    """
+    if not compact_json():
+        return jsonify(serialize(entity))
+    return json_text_response(service.serialize_many([entity], serialize_json)[0])
+
+
+def list_response(service, serialize, serialize_json, filter_schema=None):
+    """
+    Responds with the entities of a service, restricted to those matching the
+    query parameters that ``filter_schema`` declares, which are looked up in the
+    repository's indexes. Without ``limit`` and ``cursor`` query parameters, the
+    entities are returned as an array. Otherwise a page is returned as
+    ``{"items": [...], "next_cursor": ...}``, where ``next_cursor`` is None on the
+    last page.
+
+    With compact JSON, the body is assembled from the JSON text of each entity,
+    which the repository caches, producing the same bytes as ``jsonify``.
+    """
+    try:
+        criteria = filter_schema.load(request.args) if filter_schema else {}
+        paginated = "limit" in request.args or "cursor" in request.args
+        query = page_query_schema.load(request.args) if paginated else {}
+    except ValidationError as err:
+        logging.error(f"Validation error: {err.messages}")
+        return jsonify(err.messages), 400
+    if not paginated:
+        entities = service.find_where(criteria) if criteria else service.get_all()
+        next_cursor = None
+    else:
+        limit = query.get("limit", DEFAULT_PAGE_SIZE)
+        after = decode_cursor(query["cursor"]) if "cursor" in query else None
+        try:
+            if criteria:
+                entities, next_key = paginate(
+                    service.find_where(criteria), limit, after
+                )
+            else:
+                entities, next_key = service.get_page(limit, after)
+        except ValueError as e:
+            # A well-formed cursor of another listing, e.g. of a sharded one.
+            logging.error(f"Validation error: {str(e)}")
+            return jsonify({"cursor": [str(e)]}), 400
+        next_cursor = encode_cursor(next_key) if next_key else None
+    if not compact_json():
+        items = service.serialize_many(entities, serialize)
+        return jsonify(
+            {"items": items, "next_cursor": next_cursor} if paginated else items
+        )
+    items = "[" + ",".join(service.serialize_many(entities, serialize_json)) + "]"
+    if paginated:
+        # Keys in sorted order, as jsonify writes them.
+        items = f'{{"items":{items},"next_cursor":{encode_compact_json(next_cursor)}}}'
+    return json_text_response(items)
+
+
+def ndjson_response(entities, serializer):
+    """
+    Streams entities as newline-delimited JSON, one serialized entity per line,
+    sent in chunks of ``EXPORT_CHUNK_LINES`` lines. Entities are pulled from the
+    iterator and serialized only as the client reads the response, and their
+    serialized forms are not cached, so memory use does not grow with their count.
+    """
+    dumps = current_app.json.dumps
+
+    def generate():
+        lines = []
+        for entity in entities:
+            lines.append(dumps(serializer(entity)) + "\n")
+            if len(lines) == EXPORT_CHUNK_LINES:
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
+
+    return current_app.response_class(generate(), mimetype="application/x-ndjson")
+
+
+def versioned_response(service, respond, entity_id=None):
+    """
+    Responds with ``respond()``, tagged with the version of the service's
+    collection, or of one of its entities, as ``ETag`` and ``Last-Modified``. A
+    request whose ``If-None-Match`` holds the current tag is answered with 304
+    without calling ``respond``, so nothing is looked up or serialized.
+
+    Successful bodies are kept in the application's response cache, keyed by path
+    and query and stored with the tag, and served from there until the tag
+    changes. The ``X-Cache`` header tells whether the body came from the cache. The
+    key and tag are left in ``g.cached_response`` for ``compress_response`` to cache
+    the compressed body alongside.
+
+    The tag is read before the body is built, so a change made meanwhile can only
+    make the tag older than the body, and the next request then gets a 200 built
+    afresh.
+    """
+    tag = service.version_tag(entity_id)
+    if tag is None:
+        return respond()
+    etag, modified_at = tag
+    last_modified = datetime.fromtimestamp(int(modified_at), timezone.utc)
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+    else:
+        cache = current_services().response_cache
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        cached = cache.get(key, etag)
+        if cached is not None:
+            body, mimetype = cached
+            response = current_app.response_class(body, mimetype=mimetype)
+            response.headers["X-Cache"] = "HIT"
+        else:
+            response = make_response(respond())
+            if response.status_code != 200:
+                return response
+            cache.put(key, etag, response.get_data(), response.mimetype)
+            response.headers["X-Cache"] = "MISS"
+        g.cached_response = (key, etag)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+
+@api.before_request
+def refresh_repositories():
+    for repository in current_services().loaded_repositories():
+        repository.refresh()
+
+
 @api.before_request
 def log_request_info():
     logging.info(f"Request: {request.method} {request.url}")
@@ -40,14 +236,64 @@ def log_response_info(response):
     return response
 
 
+def bulk_create_response(schema, build, create, dump):
+    """
+    Creates the entities of a JSON array request body. The array is validated
+    with ``schema`` (a ``many=True`` schema), the valid items are built with
+    ``build`` and passed to ``create`` together, so they are persisted in one
+    write, and the response reports a result for every item in request order,
+    each created entity serialized with the compiled serializer ``dump``.
+    """
+    data = request.json
+    if isinstance(data, list) and len(data) > MAX_BULK_ITEMS:
+        return jsonify({"error": f"At most {MAX_BULK_ITEMS} items per request"}), 400
+    try:
+        items, errors = schema.load(data), {}
+    except ValidationError as err:
+        if not isinstance(data, list):
+            logging.error(f"Validation error: {err.messages}")
+            return jsonify(err.messages), 400
+        items, errors = err.valid_data, err.messages
+        logging.warning(f"Bulk validation errors: {errors}")
+    valid = [position for position in range(len(items)) if position not in errors]
+    created = create([build(items[position]) for position in valid])
+    results = [None] * len(items)
+    for position, entity in zip(valid, created):
+        results[position] = {"status": 201, "data": dump(entity)}
+    for position, messages in errors.items():
+        results[position] = {"status": 400, "errors": messages}
+    body = {"created": len(created), "failed": len(errors), "results": results}
+    return jsonify(body), 207 if errors else 201
+
+
 @api.route("/bloqs", methods=["GET"])
 def get_bloqs():
     """
-    Retrieve a list of all Bloqs.
+    Retrieve a list of all Bloqs, or one page of them.
     ---
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        minimum: 1
+        maximum: 1000
+        required: false
+        description: >
+          The maximum number of bloqs per page (default 100). When limit or
+          cursor is given, the response is an object with the page in "items" and
+          the cursor of the next page in "next_cursor", null on the last page.
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: The next_cursor returned with the previous page.
     responses:
+      304:
+        description: Unchanged since the ETag passed in If-None-Match
       200:
-        description: A list of bloqs
+        description: >
+          A list of bloqs, or {"items": [...], "next_cursor": "..."} when
+          paginating
         schema:
           type: array
           items:
@@ -59,10 +305,12 @@ def get_bloqs():
                 type: string
               address:
                 type: string
+      400:
+        description: Invalid limit or cursor
     """
-    bloqs = bloq_service.get_all()
-    result = BloqSchema(many=True).dump(bloqs)
-    return jsonify(result)
+    return versioned_response(
+        bloq_service, lambda: list_response(bloq_service, dump_bloq, bloq_json)
+    )
 
 
 @api.route("/bloqs/<bloq_id>", methods=["GET"])
@@ -77,6 +325,8 @@ def get_bloq(bloq_id):
         required: true
         description: The ID of the Bloq to retrieve
     responses:
+      304:
+        description: Unchanged since the ETag passed in If-None-Match
       200:
         description: A Bloq object
         schema:
@@ -91,12 +341,18 @@ def get_bloq(bloq_id):
       404:
         description: Bloq not found
     """
+    return versioned_response(
+        bloq_service, lambda: bloq_response(bloq_id), entity_id=bloq_id
+    )
+
+
+def bloq_response(bloq_id):
+    """Responds with the Bloq of the given ID, or with 404."""
     bloq = bloq_service.get_by_id(bloq_id)
     if not bloq:
         logging.warning(f"Bloq not found: {bloq_id}")
         return jsonify({"error": "Bloq not found"}), 404
-    result = BloqSchema().dump(bloq)
-    return jsonify(result)
+    return entity_response(bloq_service, bloq, dump_bloq, bloq_json)
 
 
 @api.route("/bloqs", methods=["POST"])
@@ -133,24 +389,102 @@ def create_bloq():
     """
     data = request.json
     try:
-        validated_data = BloqSchema().load(data)
+        validated_data = load_bloq(data)
     except ValidationError as err:
         logging.error(f"Validation error: {err.messages}")
         return jsonify(err.messages), 400
     new_bloq = Bloq(**validated_data)
     created_bloq = bloq_service.create(new_bloq)
-    result = BloqSchema().dump(created_bloq)
+    result = dump_bloq(created_bloq)
     return jsonify(result), 201
 
 
+@api.route("/bloqs/bulk", methods=["POST"])
+def create_bloqs():
+    """
+    Create several Bloqs in one request and one write.
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          maxItems: 1000
+          items:
+            type: object
+            required:
+                - title
+                - address
+            properties:
+              title:
+                type: string
+              address:
+                type: string
+    responses:
+      201:
+        description: >
+          Every bloq was created. The body holds "created", "failed" and
+          "results", one per item in request order, each with the item's
+          "status" and either the created Bloq as "data" or its validation
+          "errors"
+      207:
+        description: Some bloqs were invalid; the valid ones were created
+      400:
+        description: The body is not an array or holds more than 1000 items
+    """
+    return bulk_create_response(
+        BloqSchema(many=True),
+        lambda item: Bloq(**item),
+        bloq_service.create_many,
+        dump_bloq,
+    )
+
+
 @api.route("/lockers", methods=["GET"])
 def get_lockers():
     """
-    Retrieve a list of all Lockers.
+    Retrieve a list of Lockers, optionally filtered, or one page of them.
     ---
+    parameters:
+      - name: bloq_id
+        in: query
+        type: string
+        required: false
+        description: Only return the lockers of this bloq
+      - name: is_occupied
+        in: query
+        type: boolean
+        required: false
+        description: Only return lockers with this occupancy
+      - name: status
+        in: query
+        type: string
+        enum: [OPEN, CLOSED]
+        required: false
+        description: Only return lockers with this status
+      - name: limit
+        in: query
+        type: integer
+        minimum: 1
+        maximum: 1000
+        required: false
+        description: >
+          The maximum number of lockers per page (default 100). When limit or
+          cursor is given, the response is an object with the page in "items" and
+          the cursor of the next page in "next_cursor", null on the last page.
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: The next_cursor returned with the previous page.
     responses:
+      304:
+        description: Unchanged since the ETag passed in If-None-Match
       200:
-        description: A list of lockers
+        description: >
+          A list of lockers, or {"items": [...], "next_cursor": "..."} when
+          paginating
         schema:
           type: array
           items:
@@ -164,10 +498,54 @@ def get_lockers():
                 type: string
               is_occupied:
                 type: boolean
+      400:
+        description: Invalid filter, limit or cursor
     """
-    lockers = locker_service.get_all()
-    result = LockerSchema(many=True).dump(lockers)
-    return jsonify(result)
+    return versioned_response(
+        locker_service,
+        lambda: list_response(
+            locker_service, dump_locker, locker_json, locker_filter_schema
+        ),
+    )
+
+
+@api.route("/lockers/export", methods=["GET"])
+def export_lockers():
+    """
+    Export Lockers, optionally filtered, as newline-delimited JSON, streamed
+    without building the whole list.
+    ---
+    produces:
+      - application/x-ndjson
+    parameters:
+      - name: bloq_id
+        in: query
+        type: string
+        required: false
+        description: Only export the lockers of this bloq
+      - name: is_occupied
+        in: query
+        type: boolean
+        required: false
+        description: Only export lockers with this occupancy
+      - name: status
+        in: query
+        type: string
+        enum: [OPEN, CLOSED]
+        required: false
+        description: Only export lockers with this status
+    responses:
+      200:
+        description: One Locker object per line
+      400:
+        description: Invalid filter
+    """
+    try:
+        criteria = locker_filter_schema.load(request.args)
+    except ValidationError as err:
+        logging.error(f"Validation error: {err.messages}")
+        return jsonify(err.messages), 400
+    return ndjson_response(locker_service.iter_where(criteria), dump_locker)
 
 
 @api.route("/lockers/<locker_id>", methods=["GET"])
@@ -182,6 +560,8 @@ def get_locker(locker_id):
         required: true
         description: The ID of the Locker to retrieve
     responses:
+      304:
+        description: Unchanged since the ETag passed in If-None-Match
       200:
         description: A Locker object
         schema:
@@ -198,12 +578,18 @@ def get_locker(locker_id):
       404:
         description: Locker not found
     """
+    return versioned_response(
+        locker_service, lambda: locker_response(locker_id), entity_id=locker_id
+    )
+
+
+def locker_response(locker_id):
+    """Responds with the Locker of the given ID, or with 404."""
     locker = locker_service.get_by_id(locker_id)
     if not locker:
         logging.warning(f"Locker not found: {locker_id}")
         return jsonify({"error": "Locker not found"}), 404
-    result = LockerSchema().dump(locker)
-    return jsonify(result)
+    return entity_response(locker_service, locker, dump_locker, locker_json)
 
 
 @api.route("/lockers", methods=["POST"])
@@ -245,16 +631,61 @@ def create_locker():
     """
     data = request.json
     try:
-        validated_data = LockerSchema().load(data)
+        validated_data = load_locker(data)
     except ValidationError as err:
         logging.error(f"Validation error: {err.messages}")
         return jsonify(err.messages), 400
     new_locker = Locker(**validated_data)
     created_locker = locker_service.create(new_locker)
-    result = LockerSchema().dump(created_locker)
+    result = dump_locker(created_locker)
     return jsonify(result), 201
 
 
+@api.route("/lockers/bulk", methods=["POST"])
+def create_lockers():
+    """
+    Create several Lockers in one request and one write.
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          maxItems: 1000
+          items:
+            type: object
+            required:
+                - bloq_id
+                - status
+                - is_occupied
+            properties:
+              bloq_id:
+                type: string
+              status:
+                type: string
+              is_occupied:
+                type: boolean
+    responses:
+      201:
+        description: >
+          Every locker was created. The body holds "created", "failed" and
+          "results", one per item in request order, each with the item's
+          "status" and either the created Locker as "data" or its validation
+          "errors"
+      207:
+        description: Some lockers were invalid; the valid ones were created
+      400:
+        description: The body is not an array or holds more than 1000 items
+    """
+    return bulk_create_response(
+        LockerSchema(many=True),
+        lambda item: Locker(**item),
+        locker_service.create_many,
+        dump_locker,
+    )
+
+
 @api.route("/lockers/<locker_id>/status", methods=["PATCH"])
 def update_locker_status(locker_id):
     """
@@ -298,7 +729,7 @@ def update_locker_status(locker_id):
     """
     data = request.json
     try:
-        validated_data = LockerSchemaPatch().load(data)
+        validated_data = load_locker_patch(data)
     except ValidationError as err:
         logging.error(f"Validation error: {err.messages}")
         return jsonify(err.messages), 400
@@ -308,18 +739,55 @@ def update_locker_status(locker_id):
     if not updated_locker:
         logging.warning(f"Locker not found: {locker_id}")
         return jsonify({"error": "Locker not found"}), 404
-    result = LockerSchemaPatch().dump(updated_locker)
+    result = dump_locker_patch(updated_locker)
     return jsonify(result)
 
 
 @api.route("/rents", methods=["GET"])
 def get_rents():
     """
-    Retrieve a list of all Rents.
+    Retrieve a list of Rents, optionally filtered, or one page of them.
     ---
+    parameters:
+      - name: locker_id
+        in: query
+        type: string
+        required: false
+        description: Only return the rents assigned to this locker
+      - name: status
+        in: query
+        type: string
+        enum: [CREATED, WAITING_DROPOFF, WAITING_PICKUP, DELIVERED]
+        required: false
+        description: Only return rents with this status
+      - name: size
+        in: query
+        type: string
+        enum: [XS, S, M, L, XL]
+        required: false
+        description: Only return rents of this size
+      - name: limit
+        in: query
+        type: integer
+        minimum: 1
+        maximum: 1000
+        required: false
+        description: >
+          The maximum number of rents per page (default 100). When limit or
+          cursor is given, the response is an object with the page in "items" and
+          the cursor of the next page in "next_cursor", null on the last page.
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: The next_cursor returned with the previous page.
     responses:
+      304:
+        description: Unchanged since the ETag passed in If-None-Match
       200:
-        description: A list of rents
+        description: >
+          A list of rents, or {"items": [...], "next_cursor": "..."} when
+          paginating
         schema:
           type: array
           items:
@@ -335,10 +803,63 @@ def get_rents():
                 type: string
               status:
                 type: string
+      400:
+        description: Invalid filter, limit or cursor
     """
-    rents = rent_service.get_all()
-    result = RentSchema(many=True).dump(rents)
-    return jsonify(result)
+    return versioned_response(
+        rent_service,
+        lambda: list_response(rent_service, dump_rent, rent_json, rent_filter_schema),
+    )
+
+
+@api.route("/rents/export", methods=["GET"])
+def export_rents():
+    """
+    Export Rents, optionally filtered, as newline-delimited JSON, streamed
+    without building the whole list.
+    ---
+    produces:
+      - application/x-ndjson
+    parameters:
+      - name: locker_id
+        in: query
+        type: string
+        required: false
+        description: Only export the rents assigned to this locker
+      - name: status
+        in: query
+        type: string
+        enum: [CREATED, WAITING_DROPOFF, WAITING_PICKUP, DELIVERED]
+        required: false
+        description: Only export rents with this status
+      - name: size
+        in: query
+        type: string
+        enum: [XS, S, M, L, XL]
+        required: false
+        description: Only export rents of this size
+      - name: archived
+        in: query
+        type: boolean
+        required: false
+        description: >
+          Also export the archived rents, after the others, for the full rent
+          history (default false)
+    responses:
+      200:
+        description: One Rent object per line
+      400:
+        description: Invalid filter
+    """
+    try:
+        criteria = rent_export_schema.load(request.args)
+    except ValidationError as err:
+        logging.error(f"Validation error: {err.messages}")
+        return jsonify(err.messages), 400
+    include_archived = criteria.pop("archived")
+    return ndjson_response(
+        rent_service.iter_rents(criteria, include_archived), dump_rent
+    )
 
 
 @api.route("/rents/<rent_id>", methods=["GET"])
@@ -353,6 +874,8 @@ def get_rent(rent_id):
         required: true
         description: The ID of the Rent to retrieve
     responses:
+      304:
+        description: Unchanged since the ETag passed in If-None-Match
       200:
         description: A Rent object
         schema:
@@ -371,12 +894,18 @@ def get_rent(rent_id):
       404:
         description: Rent not found
     """
+    return versioned_response(
+        rent_service, lambda: rent_response(rent_id), entity_id=rent_id
+    )
+
+
+def rent_response(rent_id):
+    """Responds with the Rent of the given ID, or with 404."""
     rent = rent_service.get_by_id(rent_id)
     if not rent:
         logging.warning(f"Rent not found: {rent_id}")
         return jsonify({"error": "Rent not found"}), 404
-    result = RentSchema().dump(rent)
-    return jsonify(result)
+    return entity_response(rent_service, rent, dump_rent, rent_json)
 
 
 @api.route("/rents/rent", methods=["POST"])
@@ -419,7 +948,7 @@ def create_rent():
     """
     data = request.json
     try:
-        validated_data = RentCreateSchema().load(data)
+        validated_data = load_rent(data)
     except ValidationError as err:
         logging.error(f"Validation error: {err.messages}")
         return jsonify(err.messages), 400
@@ -428,13 +957,55 @@ def create_rent():
     )
     created_rent = rent_service.create_rent(new_rent)
     if created_rent:
-        result = RentSchema().dump(created_rent)
+        result = dump_rent(created_rent)
         return jsonify(result), 201
     else:
         logging.warning("Locker not found or is already occupied")
         return jsonify({"error": "Locker not found or is already occupied"}), 404
 
 
+@api.route("/rents/bulk", methods=["POST"])
+def create_rents():
+    """
+    Create several Rents in one request and one write.
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          maxItems: 1000
+          items:
+            type: object
+            required:
+                - weight
+                - size
+            properties:
+              weight:
+                type: number
+              size:
+                type: string
+    responses:
+      201:
+        description: >
+          Every rent was created. The body holds "created", "failed" and
+          "results", one per item in request order, each with the item's
+          "status" and either the created Rent as "data" or its validation
+          "errors"
+      207:
+        description: Some rents were invalid; the valid ones were created
+      400:
+        description: The body is not an array or holds more than 1000 items
+    """
+    return bulk_create_response(
+        RentCreateSchema(many=True),
+        lambda item: Rent(weight=item["weight"], size=RentSize[item["size"]]),
+        rent_service.create_rents,
+        dump_rent,
+    )
+
+
 @api.route("/rents/<rent_id>/status", methods=["PATCH"])
 def update_rent_status(rent_id):
     """
@@ -474,19 +1045,25 @@ def update_rent_status(rent_id):
               type: string
       404:
         description: Rent not found
+      409:
+        description: Rent is archived
     """
     data = request.json
     try:
-        validated_data = RentSchemaPatch().load(data)
+        validated_data = load_rent_patch(data)
     except ValidationError as err:
         logging.error(f"Validation error: {err.messages}")
         return jsonify(err.messages), 400
     status = RentStatus[validated_data["status"]]
-    updated_rent = rent_service.update_rent_status(rent_id, status)
+    try:
+        updated_rent = rent_service.update_rent_status(rent_id, status)
+    except RentArchivedError:
+        logging.warning(f"Rent is archived: {rent_id}")
+        return jsonify({"error": "Rent is archived"}), 409
     if not updated_rent:
         logging.warning(f"Rent not found: {rent_id}")
         return jsonify({"error": "Rent not found"}), 404
-    result = RentSchemaPatch().dump(updated_rent)
+    result = dump_rent_patch(updated_rent)
     return jsonify(result)
 
 
@@ -529,18 +1106,27 @@ def assign_locker_to_rent(rent_id):
               type: string
       404:
         description: Rent not found
+      409:
+        description: Locker not found or is already occupied, or Rent is archived
     """
     data = request.json
     try:
-        validated_data = RentAssignLocker().load(data)
+        validated_data = load_rent_assign(data)
     except ValidationError as err:
         logging.error(f"Validation error: {err.messages}")
         return jsonify(err.messages), 400
 
     locker_id = validated_data["locker_id"]
-    updated_rent = rent_service.assign_locker_to_rent(rent_id, locker_id)
+    try:
+        updated_rent = rent_service.assign_locker_to_rent(rent_id, locker_id)
+    except LockerUnavailableError:
+        logging.warning(f"Locker not found or is already occupied: {locker_id}")
+        return jsonify({"error": "Locker not found or is already occupied"}), 409
+    except RentArchivedError:
+        logging.warning(f"Rent is archived: {rent_id}")
+        return jsonify({"error": "Rent is archived"}), 409
     if not updated_rent:
         logging.warning(f"Rent not found: {rent_id}")
         return jsonify({"error": "Rent not found"}), 404
-    result = RentAssignLocker().dump(updated_rent)
+    result = dump_rent_assign(updated_rent)
     return jsonify(result)
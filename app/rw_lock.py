@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    A lock held either by any number of readers or by a single writer.
+
+    Writers are preferred: once a writer waits, new readers wait behind it, so a
+    steady stream of reads cannot starve writes. The writing thread may acquire
+    either side again while it holds the lock; readers must not nest.
+
+    Attributes:
+        __condition (threading.Condition): Guards the counters below.
+        __readers (int): The number of threads holding the read side.
+        __writer (Optional[int]): The identity of the thread holding the write side.
+        __depth (int): The number of nested acquisitions held by the writer.
+        __waiting_writers (int): The number of threads waiting for the write side.
+
+    Methods:
+        reading(): Holds the read side.
+        writing(): Holds the write side.
+    """
+
+    def __init__(self):
+        """
+        Initializes an unlocked ReadWriteLock.
+        """
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writer = None
+        self.__depth = 0
+        self.__waiting_writers = 0
+
+    @contextmanager
+    def reading(self):
+        """
+        Holds the read side, shared with other readers.
+        """
+        with self.__condition:
+            nested = self.__writer == threading.get_ident()
+            if not nested:
+                self.__condition.wait_for(
+                    lambda: self.__writer is None and not self.__waiting_writers
+                )
+                self.__readers += 1
+        try:
+            yield
+        finally:
+            if not nested:
+                with self.__condition:
+                    self.__readers -= 1
+                    if not self.__readers:
+                        self.__condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        """
+        Holds the write side, excluding every other reader and writer.
+        """
+        ident = threading.get_ident()
+        with self.__condition:
+            if self.__writer != ident:
+                self.__waiting_writers += 1
+                try:
+                    self.__condition.wait_for(
+                        lambda: self.__writer is None and not self.__readers
+                    )
+                finally:
+                    self.__waiting_writers -= 1
+                self.__writer = ident
+            self.__depth += 1
+        try:
+            yield
+        finally:
+            with self.__condition:
+                self.__depth -= 1
+                if not self.__depth:
+                    self.__writer = None
+                    self.__condition.notify_all()
@@ -1,5 +1,60 @@
-from marshmallow import Schema, fields, ValidationError
+import json
+import keyword
+import math
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, Optional
+
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import (
+    EXCLUDE,
+    RAISE,
+    Schema,
+    fields,
+    missing,
+    validate,
+    ValidationError,
+)
 from app.models import RentSize, RentStatus, LockerStatus
+from app.utils import decode_cursor
+
+MAX_PAGE_SIZE = 1000
+
+# Fields whose values of exactly this type serialize to themselves.
+_PASSTHROUGH_TYPES = {
+    fields.String: str,
+    fields.Boolean: bool,
+    fields.Float: float,
+    fields.Integer: int,
+}
+
+# The input types each field accepts unchanged, or after float(), on the fast path
+# of compiled loaders.
+_LOAD_TYPES = {
+    fields.String: (str,),
+    fields.Boolean: (bool,),
+    fields.Float: (float, int),
+    fields.Integer: (int,),
+}
+
+# The encoder behind Flask's default compact responses: ``jsonify`` sorts keys,
+# escapes non-ASCII characters and leaves out whitespace outside debug mode.
+encode_compact_json = json.JSONEncoder(
+    sort_keys=True, separators=(",", ":"), default=DefaultJSONProvider.default
+).encode
+
+
+def _encode_json_value(value: Any) -> str:
+    # Encodes a serialized value as encode_compact_json does, skipping the
+    # encoder's dispatch for the common scalar types.
+    if value.__class__ is str:
+        return encode_basestring_ascii(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    return encode_compact_json(value)
 
 
 def validate_rent_size(value):
@@ -17,6 +72,52 @@ def validate_locker_status(value):
         raise ValidationError("Invalid LockerStatus.")
 
 
+# The allowed values of the enum validators above, which compiled loaders check
+# with a set lookup instead of calling the validator.
+_MEMBERSHIP_VALIDATORS = {
+    validate_rent_size: frozenset(RentSize._value2member_map_),
+    validate_rent_status: frozenset(RentStatus._value2member_map_),
+    validate_locker_status: frozenset(LockerStatus._value2member_map_),
+}
+
+
+def validate_cursor(value):
+    try:
+        decode_cursor(value)
+    except ValueError as e:
+        raise ValidationError(str(e))
+
+
+class PageQuerySchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    limit = fields.Int(validate=validate.Range(min=1, max=MAX_PAGE_SIZE))
+    cursor = fields.Str(validate=validate_cursor)
+
+
+class LockerFilterSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    bloq_id = fields.Str()
+    is_occupied = fields.Bool()
+    status = fields.Str(validate=validate_locker_status)
+
+
+class RentFilterSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    locker_id = fields.Str()
+    status = fields.Str(validate=validate_rent_status)
+    size = fields.Str(validate=validate_rent_size)
+
+
+class RentExportSchema(RentFilterSchema):
+    archived = fields.Bool(load_default=False)
+
+
 class BloqSchema(Schema):
     id = fields.Str(dump_only=True)
     title = fields.Str(required=True)
@@ -43,6 +144,7 @@ class RentSchema(Schema):
     weight = fields.Float(required=True)
     size = fields.Str(required=True, validate=validate_rent_size)
     status = fields.Str(required=True, validate=validate_rent_status)
+    delivered_at = fields.Str(dump_only=True, allow_none=True)
 
 
 class RentSchemaPatch(Schema):
@@ -61,3 +163,225 @@ class RentCreateSchema(Schema):
     size = fields.Str(required=True, validate=validate_rent_size)
     locker_id = fields.Str(dump_only=True)
     status = fields.Str(dump_only=True, validate=validate_rent_status)
+
+
+def compile_serializer(schema: Schema) -> Callable[[Any], Dict[str, Any]]:
+    """
+    Compiles ``schema.dump`` for single objects into a plain function that reads
+    each attribute once and builds the result dict directly, instead of walking
+    the schema's fields for every object. The result equals ``schema.dump(obj)``:
+    values whose type the field would return unchanged, such as a ``str`` for a
+    String field, are passed through, and any other value goes through the field's
+    own ``_serialize``.
+
+    Objects that lack an attribute or support item access are handed to
+    ``schema.dump``, and so are all objects of schemas that cannot be compiled:
+    ``many`` schemas, schemas with dump hooks or a custom ``get_attribute``, and
+    schemas with other field types or dotted attributes.
+
+    Parameters:
+        schema (Schema): The schema instance; it must not be modified afterwards.
+
+    Returns:
+        Callable[[Any], Dict[str, Any]]: The compiled serializer.
+    """
+    compiled = _compile(schema, json_text=False)
+    return compiled if compiled is not None else schema.dump
+
+
+def compile_json_serializer(schema: Schema) -> Callable[[Any], str]:
+    """
+    Compiles ``schema.dump`` into a function returning the compact JSON text that
+    ``jsonify`` would produce for ``schema.dump(obj)``, so that response bodies
+    can be assembled from the cached text of each entity. Keys are written in
+    sorted order and values are converted as by ``compile_serializer``, then
+    encoded one by one; the object is never built as a dict.
+
+    Parameters:
+        schema (Schema): The schema instance; it must not be modified afterwards.
+
+    Returns:
+        Callable[[Any], str]: The compiled serializer.
+    """
+    compiled = _compile(schema, json_text=True)
+    if compiled is None:
+        return lambda obj: encode_compact_json(schema.dump(obj))
+    return compiled
+
+
+def _compile(schema: Schema, json_text: bool) -> Optional[Callable[[Any], Any]]:
+    # Generates the source of a serializer, or returns None if the schema cannot
+    # be compiled.
+    if (
+        schema.many
+        or any(hooks and "dump" in tag[0] for tag, hooks in schema._hooks.items())
+        or type(schema).get_attribute is not Schema.get_attribute
+    ):
+        return None
+    namespace = {
+        "dump": schema.dump,
+        "encode": encode_compact_json,
+        "encode_value": _encode_json_value,
+    }
+    reads, values = [], {}
+    for number, (name, field) in enumerate(schema.dump_fields.items()):
+        attribute = field.attribute or name
+        passthrough = _PASSTHROUGH_TYPES.get(type(field))
+        if (
+            passthrough is None
+            or getattr(field, "as_string", False)
+            or not attribute.isidentifier()
+            or keyword.iskeyword(attribute)
+        ):
+            return None
+        namespace[f"type{number}"] = passthrough
+        namespace[f"serialize{number}"] = field._serialize
+        value = f"value{number}"
+        reads.append(f"        {value} = obj.{attribute}")
+        key = field.data_key if field.data_key is not None else name
+        values[key] = (
+            f"({value} if {value} is None or {value}.__class__ is type{number} "
+            f"else serialize{number}({value}, {name!r}, obj))"
+        )
+    fallback = "encode(dump(obj))" if json_text else "dump(obj)"
+    if json_text:
+        # The text of each key and its separators is a constant of the source.
+        parts = [
+            repr(("{" if position == 0 else ",") + encode_compact_json(key) + ":")
+            + f" + encode_value({values[key]})"
+            for position, key in enumerate(sorted(values))
+        ]
+        result = ["    return (", *(f"        {part} +" for part in parts)]
+        result.append("        '}'" if parts else "        '{}'")
+        result.append("    )")
+    else:
+        result = [
+            "    return {",
+            *(f"        {key!r}: {text}," for key, text in values.items()),
+            "    }",
+        ]
+    source = "\n".join(
+        [
+            "def serialize(obj):",
+            "    if hasattr(obj.__class__, '__getitem__'):",
+            f"        return {fallback}",
+            "    try:",
+            *reads,
+            "    except AttributeError:",
+            f"        return {fallback}",
+            *result,
+        ]
+    )
+    kind = "JSON serializer" if json_text else "serializer"
+    exec(compile(source, f"<{type(schema).__name__} {kind}>", "exec"), namespace)
+    return namespace["serialize"]
+
+
+def compile_loader(schema: Schema) -> Callable[[Any], Dict[str, Any]]:
+    """
+    Compiles ``schema.load`` for single objects into a function that validates
+    the common case, a dict of well-typed values, without marshmallow's generic
+    machinery. The fields, accepted input keys and validators are worked out once
+    here; for each input, the function checks the keys, checks each value's exact
+    type and validates it, and returns the same dict ``schema.load`` would. The
+    enum validators, such as ``validate_rent_size``, become a membership test on
+    a frozenset of the allowed values; other validators are called.
+
+    Any input the fast path does not accept outright, such as a missing field,
+    an unknown key, a string for a number or a value a validator rejects, is
+    handed to ``schema.load``, which returns it or raises its usual
+    ``ValidationError``, so error messages are unchanged. Schemas that cannot be
+    compiled, with load hooks, schema validators, ``many`` or ``unknown=INCLUDE``,
+    or fields of other types, always use ``schema.load``.
+
+    Parameters:
+        schema (Schema): The schema instance; it must not be modified afterwards.
+
+    Returns:
+        Callable[[Any], Dict[str, Any]]: The compiled loader.
+    """
+    if (
+        schema.many
+        or schema.unknown not in (RAISE, EXCLUDE)
+        or any(hooks and "dump" not in tag[0] for tag, hooks in schema._hooks.items())
+        or any(
+            getattr(type(schema), name) is not getattr(Schema, name)
+            for name in ("load", "_do_load", "_deserialize")
+        )
+    ):
+        return schema.load
+    plan = []
+    for name, field in schema.load_fields.items():
+        types = _LOAD_TYPES.get(type(field))
+        if (
+            types is None
+            or getattr(field, "strict", False)
+            or isinstance(field, fields.Boolean)
+            and field.truthy
+            and (True not in field.truthy or False not in field.falsy)
+        ):
+            return schema.load
+        key = field.data_key if field.data_key is not None else name
+        allowed = None
+        validators = []
+        for validator in field.validators:
+            choices = _MEMBERSHIP_VALIDATORS.get(validator)
+            if choices is None:
+                validators.append(validator)
+            else:
+                allowed = choices if allowed is None else allowed & choices
+        plan.append(
+            (
+                key,
+                field.attribute or name,
+                types,
+                isinstance(field, fields.Float),
+                field.required,
+                field.load_default,
+                allowed,
+                tuple(validators),
+            )
+        )
+    keys = frozenset(key for key, *_ in plan)
+    check_keys = schema.unknown == RAISE
+    fallback = schema.load
+
+    def load(data):
+        if data.__class__ is not dict or check_keys and not keys.issuperset(data):
+            return fallback(data)
+        result = {}
+        for (
+            key,
+            attribute,
+            types,
+            is_float,
+            required,
+            default,
+            allowed,
+            validators,
+        ) in plan:
+            value = data.get(key, missing)
+            if value is missing:
+                if required:
+                    return fallback(data)
+                if default is not missing:
+                    result[attribute] = default() if callable(default) else default
+                continue
+            if value.__class__ not in types:
+                return fallback(data)
+            if allowed is not None and value not in allowed:
+                return fallback(data)
+            try:
+                if is_float:
+                    value = float(value)
+                    if not math.isfinite(value):
+                        return fallback(data)
+                for validator in validators:
+                    if validator(value) is False:
+                        return fallback(data)
+            except (OverflowError, ValidationError):
+                return fallback(data)
+            result[attribute] = value
+        return result
+
+    return load
@@ -1,9 +1,23 @@
-from typing import Optional
+from dataclasses import replace
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional
 from app.models import Locker, Rent, RentStatus, LockerStatus
 from app.repositories import BloqRepository, LockerRepository, RentRepository
 from app.base_service import BaseService
 
 
+class LockerUnavailableError(Exception):
+    """
+    Raised when a locker to be occupied does not exist or is already occupied.
+    """
+
+
+class RentArchivedError(Exception):
+    """
+    Raised when changing a rent that has been moved to the archive.
+    """
+
+
 class BloqService(BaseService):
     """
     A service class for handling business logic related to Bloq entities.
@@ -28,8 +42,11 @@ class LockerService(BaseService):
     Inherits from BaseService.
 
     Methods:
-        select_unoccupied_locker(): Selects an unoccupied locker.
+        select_unoccupied_locker(bloq_id: Optional[str]): Selects an unoccupied locker.
+        claim_unoccupied_locker(bloq_id: Optional[str]): Selects and occupies an unoccupied locker.
+        get_lockers_by_bloq(bloq_id: str): Returns the lockers of a bloq.
         update_locker_status(locker_id: str, status: LockerStatus, occupied: bool): Updates the status of a locker.
+        occupy_locker(locker_id: str): Occupies a locker if it is still free.
     """
 
     def __init__(self, repository: LockerRepository):
@@ -42,14 +59,46 @@ class LockerService(BaseService):
         super().__init__(repository)
         self.repository: LockerRepository = repository
 
-    def select_unoccupied_locker(self) -> Optional[Locker]:
+    def select_unoccupied_locker(
+        self, bloq_id: Optional[str] = None
+    ) -> Optional[Locker]:
         """
         Selects an unoccupied locker.
 
+        Parameters:
+            bloq_id (Optional[str]): The bloq to pick from, or None for any bloq.
+
         Returns:
             Optional[Locker]: An unoccupied locker, or None if none are available.
         """
-        return self.repository.select_unoccupied()
+        return self.repository.select_unoccupied(bloq_id)
+
+    def claim_unoccupied_locker(
+        self, bloq_id: Optional[str] = None
+    ) -> Optional[Locker]:
+        """
+        Selects an unoccupied locker and marks it closed and occupied. Concurrent
+        callers never receive the same locker.
+
+        Parameters:
+            bloq_id (Optional[str]): The bloq to pick from, or None for any bloq.
+
+        Returns:
+            Optional[Locker]: The claimed locker, or None if none are available.
+        """
+        return self.repository.claim_unoccupied(bloq_id)
+
+    def get_lockers_by_bloq(self, bloq_id: str) -> List[Locker]:
+        """
+        Returns the lockers of a bloq.
+
+        Parameters:
+            bloq_id (str): The ID of the bloq.
+
+        Returns:
+            List[Locker]: The lockers belonging to the bloq.
+        """
+        return self.repository.get_by_bloq(bloq_id)
 
     def update_locker_status(
         self, locker_id: str, status: LockerStatus, occupied: bool
@@ -65,12 +114,32 @@ class LockerService(BaseService):
         Returns:
             Optional[Locker]: The updated locker, or None if not found.
         """
-        locker = self.get_by_id(locker_id)
-        if locker:
-            locker.update_status(status, occupied)
-            self.repository.save_data()
+        with self.repository.write_lock():
+            locker = self.get_by_id(locker_id)
+            if locker:
+                # Replaced rather than modified, so published snapshots keep the
+                # previous state.
+                locker = replace(locker)
+                locker.update_status(status, occupied)
+                self.repository.update(locker)
         return locker
 
+    def occupy_locker(self, locker_id: str) -> Optional[Locker]:
+        """
+        Marks a locker closed and occupied if it is still free. Concurrent callers
+        never both succeed for the same locker.
+
+        Parameters:
+            locker_id (str): The ID of the locker to occupy.
+
+        Returns:
+            Optional[Locker]: The occupied locker, or None if it does not exist or is
+            already occupied.
+        """
+        return self.repository.compare_and_set_occupied(
+            locker_id, False, True, LockerStatus.CLOSED
+        )
+
 
 class RentService(BaseService):
     """
@@ -83,8 +152,13 @@ class RentService(BaseService):
 
     Methods:
         create_rent(rent: Rent): Creates a new rent with no specified locker.
+        create_rents(rents: List[Rent]): Creates several rents with no specified locker.
         update_rent_status(rent_id: str, status: RentStatus): Updates the status of a rent.
         assign_locker_to_rent(rent_id: str, locker_id: str): Assigns a locker to a rent.
+        get_rents_by_locker(locker_id: str): Returns the rents assigned to a locker.
+        get_rents_by_status(status: RentStatus): Returns the rents with the given status.
+        iter_rents(criteria: Dict[str, Any], include_archived: bool): Iterates over the
+            matching rents, optionally followed by the archived ones.
     """
 
     def __init__(self, repository: RentRepository, locker_service: LockerService):
@@ -96,6 +170,7 @@ class RentService(BaseService):
             locker_service (LockerService): The locker service instance.
         """
         super().__init__(repository)
+        self.repository: RentRepository = repository
         self.locker_service = locker_service
 
     def create_rent(self, rent: Rent) -> Optional[Rent]:
@@ -109,9 +184,22 @@ class RentService(BaseService):
             Optional[Rent]: The created rent instance.
         """
         rent.size = rent.size.name
-        self.locker_service.repository.save_data()
         return self.repository.create(rent)
 
+    def create_rents(self, rents: List[Rent]) -> List[Rent]:
+        """
+        Creates several rents with no specified locker in one repository operation.
+
+        Parameters:
+            rents (List[Rent]): The rent instances to create.
+
+        Returns:
+            List[Rent]: The created rent instances.
+        """
+        for rent in rents:
+            rent.size = rent.size.name
+        return self.repository.create_many(rents)
+
     def update_rent_status(self, rent_id: str, status: RentStatus) -> Optional[Rent]:
         """
         Updates the status of a rent.
@@ -122,16 +210,22 @@ class RentService(BaseService):
 
         Returns:
             Optional[Rent]: The updated rent, or None if not found.
+
+        Raises:
+            RentArchivedError: If the rent is archived.
         """
-        rent = self.get_by_id(rent_id)
-        if rent:
-            rent.update_status(status.name)
-            self.repository.save_data()
+        with self.repository.write_lock():
+            rent = self.__get_active(rent_id)
+            if rent:
+                rent = replace(rent)
+                rent.update_status(status.name)
+                self.repository.update(rent)
         return rent
 
     def assign_locker_to_rent(self, rent_id: str, locker_id: str) -> Optional[Rent]:
         """
-        Assigns a locker to a rent.
+        Assigns a locker to a rent. The locker is occupied with a compare-and-set,
+        so a locker is never assigned to two rents.
 
         Parameters:
             rent_id (str): The ID of the rent to update.
@@ -139,15 +233,67 @@ class RentService(BaseService):
 
         Returns:
             Optional[Rent]: The updated rent, or None if not found.
+
+        Raises:
+            LockerUnavailableError: If the locker does not exist or is occupied.
+            RentArchivedError: If the rent is archived.
+        """
+        with self.repository.write_lock():
+            rent = self.__get_active(rent_id)
+            if rent:
+                if not self.locker_service.occupy_locker(locker_id):
+                    raise LockerUnavailableError(locker_id)
+                rent = replace(rent)
+                rent.update_locker_id(locker_id)
+                rent.update_status(RentStatus.WAITING_DROPOFF.name)
+                self.repository.update(rent)
+        return rent
+
+    def get_rents_by_locker(self, locker_id: str) -> List[Rent]:
         """
+        Returns the rents assigned to a locker.
+
+        Parameters:
+            locker_id (str): The ID of the locker.
+
+        Returns:
+            List[Rent]: The rents assigned to the locker.
+        """
+        return self.repository.get_by_locker(locker_id)
+
+    def get_rents_by_status(self, status: RentStatus) -> List[Rent]:
+        """
+        Returns the rents with the given status.
+
+        Parameters:
+            status (RentStatus): The rent status.
+
+        Returns:
+            List[Rent]: The matching rents.
+        """
+        return self.repository.get_by_status(status)
+
+    def iter_rents(
+        self, criteria: Dict[str, Any], include_archived: bool = False
+    ) -> Iterator[Rent]:
+        """
+        Iterates over the rents matching the criteria, followed by the matching
+        archived rents if requested.
+
+        Parameters:
+            criteria (Dict[str, Any]): The value of each indexed field.
+            include_archived (bool): Whether to include archived rents.
+
+        Returns:
+            Iterator[Rent]: The matching rents.
+        """
+        rents = self.repository.iter_where(criteria)
+        if include_archived:
+            return chain(rents, self.repository.iter_archived(criteria))
+        return rents
+
+    def __get_active(self, rent_id: str) -> Optional[Rent]:
         rent = self.get_by_id(rent_id)
-        if rent:
-            locker = self.locker_service.get_by_id(locker_id)
-
-            if locker and not locker.is_occupied:
-                locker.update_status(LockerStatus.CLOSED, True)
-                self.locker_service.repository.save_data()
-            rent.update_locker_id(locker_id)
-            rent.update_status(RentStatus.WAITING_DROPOFF.name)
-            self.repository.save_data()
+        if rent is not None and self.repository.is_archived(rent_id):
+            raise RentArchivedError(rent_id)
         return rent
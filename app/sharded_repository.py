@@ -0,0 +1,942 @@
+import json
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import timedelta
+from itertools import groupby
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+from urllib.parse import quote, unquote
+
+from app.base_repository import BaseRepository
+from app.file_lock import FileLock
+from app.models import Locker, LockerStatus, Rent, RentStatus
+from app.repositories import LockerRepository, RentRepository
+from app.utils import check_page_key
+
+UNASSIGNED_SHARD = "_unassigned"
+
+
+class ShardedRepository:
+    """
+    A repository that splits its entities across one JSON data file per shard, with
+    the same contract as BaseRepository.
+
+    Each shard is a ``repository_cls`` over ``<directory>/<shard>.json`` and is only
+    loaded when first used, so an operation that concerns a single shard never
+    reads or writes the files of the others. Entities without a shard key live in
+    the ``_unassigned`` shard.
+
+    A routing index maps every entity id to its shard. It is held in memory and
+    persisted as an append-only log, ``<directory>/routes.log``, with one line per
+    placement and the last line for an id winning; ``save_data()`` rewrites it
+    compactly. An entity whose shard key changes is written to its new shard,
+    routed there, then deleted from the old one. Entities that a shard holds but
+    the index routes elsewhere, left behind by a move interrupted by a crash, are
+    ignored.
+
+    The version of the repository is the sum of the versions of its loaded shards.
+    Shards are never unloaded and their versions only grow, so the sum grows with
+    every change to any of them.
+
+    Attributes:
+        version (int): The sum of the versions of the loaded shards.
+        last_modified (float): The time of the last change to a loaded shard.
+        __epoch (str): A random token identifying this instance.
+        __created_at (float): The time the instance was created.
+        __directory (str): The directory holding the shard files.
+        __repository_cls (Type[BaseRepository]): The repository class of a shard.
+        __shard_key (Callable[[Any], Optional[str]]): Returns the shard of an entity.
+        __options (dict): The persistence options forwarded to every shard.
+        __shards (Dict[str, BaseRepository]): The shards loaded so far.
+        __routes (Dict[str, str]): The shard of each entity id.
+        __routes_file (str): The path to the routing log.
+        __routes_seen (Tuple[int, int]): The inode and size of the routing log as
+            of the last read or write.
+        __lock: The write lock, shared with other processes in multi-process mode.
+
+    Methods:
+        shard(key: Optional[str], create: bool) -> Optional[BaseRepository]: Returns a shard.
+        shard_keys() -> List[str]: Returns the keys of all shards.
+        shard_of(entity_id: str) -> Optional[BaseRepository]: Returns the shard of an entity.
+        get_all() -> List[Any]: Returns all entity instances.
+        get_page(limit: int, after: Optional[Tuple[str, str, int]]) -> Tuple[List[Any], Optional[Tuple[str, str, int]]]:
+            Returns a page of entity instances in ``get_all()`` order.
+        get_by_id(entity_id: str) -> Optional[Any]: Returns an entity instance by its ID.
+        find_by(field_name: Any, value: Any, shard: Optional[str]) -> List[Any]: Returns
+            the entities matching an indexed field.
+        first_by(field_name: Any, value: Any, shard: Optional[str]) -> Optional[Any]: Returns
+            the first entity matching an indexed field.
+        find_where(criteria: Dict[str, Any], shard: Optional[str]) -> List[Any]: Returns
+            the entities matching several indexed fields.
+        iter_where(criteria: Optional[Dict[str, Any]]) -> Iterator[Any]: Iterates over the
+            entities matching several indexed fields, or over all of them.
+        version_tag(entity_id: Optional[str]) -> Optional[Tuple[str, float]]: Returns an entity
+            tag and modification time for the collection or one entity.
+        create(entity: Any, sync: bool) -> Any: Adds a new entity instance.
+        create_many(entities: List[Any], sync: bool) -> List[Any]: Adds several entity instances.
+        update(entity: Any, sync: bool) -> Any: Persists an entity modified in place.
+        delete(entity_id: str, sync: bool) -> Optional[Any]: Removes an entity instance.
+        flush(): Persists the pending mutations of every loaded shard.
+        close(): Flushes every loaded shard and stops its group-commit thread.
+        refresh() -> bool: Picks up changes made by other processes.
+        write_lock(): Holds the write lock, across processes in multi-process mode.
+        save_data(): Saves every loaded shard and compacts the routing log.
+        serialize_many(entities: Iterable[Any], serializer: Callable) -> List[Any]: Serializes
+            entities, reusing the cached forms of unmodified ones.
+        import_file(data_file: str) -> int: Splits an unsharded data file into shards.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        repository_cls: Type[BaseRepository],
+        shard_key: Callable[[Any], Optional[str]],
+        **options,
+    ):
+        """
+        Initializes the ShardedRepository over the given directory, creating it if
+        needed, and loads the routing index. Shards are loaded on first use.
+
+        Parameters:
+            directory (str): The directory holding the shard files.
+            repository_cls (Type[BaseRepository]): The repository class of a shard,
+                constructed with a data file and the options.
+            shard_key (Callable[[Any], Optional[str]]): Returns the shard of an entity.
+            **options: Persistence options forwarded to every shard.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.__epoch = secrets.token_hex(4)
+        self.__created_at = time.time()
+        self.__directory = directory
+        self.__repository_cls = repository_cls
+        self.__shard_key = shard_key
+        self.__options = options
+        self.__shards: Dict[str, BaseRepository] = {}
+        self.__shards_lock = threading.Lock()
+        self.__routes: Dict[str, str] = {}
+        self.__routes_file = os.path.join(directory, "routes.log")
+        self.__routes_seen = (None, 0)
+        self.__lock = (
+            FileLock(os.path.join(directory, "routes.lock"))
+            if options.get("multi_process")
+            else None
+        )
+        self.__thread_lock = threading.RLock()
+        with self.write_lock():
+            if os.path.exists(self.__routes_file):
+                self.__refresh_routes()
+            else:
+                self.__rebuild_routes()
+
+    def shard(
+        self, key: Optional[str], create: bool = False
+    ) -> Optional[BaseRepository]:
+        """
+        Returns the repository of a shard, loading it on first use.
+
+        Parameters:
+            key (Optional[str]): The shard key; None stands for the unassigned shard.
+            create (bool): Whether to create the shard if it does not exist yet.
+
+        Returns:
+            Optional[BaseRepository]: The shard, or None if it does not exist and
+            ``create`` is not set.
+        """
+        key = UNASSIGNED_SHARD if key is None else key
+        with self.__shards_lock:
+            shard = self.__shards.get(key)
+            if shard is None:
+                path = self.__shard_path(key)
+                if not os.path.exists(path):
+                    if not create:
+                        return None
+                    try:
+                        with open(path, "x", encoding="utf-8") as f:
+                            f.write("[]")
+                    except FileExistsError:
+                        pass  # Created meanwhile by another process.
+                shard = self.__repository_cls(path, **self.__options)
+                self.__shards[key] = shard
+            return shard
+
+    def shard_keys(self) -> List[str]:
+        """
+        Returns the keys of all shards, loaded or not, in sorted order.
+
+        Returns:
+            List[str]: The shard keys.
+        """
+        keys = {
+            unquote(name[: -len(".json")])
+            for name in os.listdir(self.__directory)
+            if name.endswith(".json")
+        }
+        return sorted(keys.union(self.__shards))
+
+    def shard_of(self, entity_id: str) -> Optional[BaseRepository]:
+        """
+        Returns the shard an entity is routed to, loading it on first use.
+
+        Parameters:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            Optional[BaseRepository]: The shard, or None if the entity is unknown.
+        """
+        key = self.__routes.get(entity_id)
+        return self.shard(key) if key is not None else None
+
+    def get_all(self) -> List[Any]:
+        """
+        Returns all entity instances, loading every shard. Entities are grouped by
+        shard, in shard key order, and in insertion order within a shard.
+
+        Returns:
+            List[Any]: A list of all entity instances.
+        """
+        entities = []
+        for key in self.shard_keys():
+            entities.extend(self.__routed(key, self.shard(key).get_all()))
+        return entities
+
+    def get_page(
+        self, limit: int, after: Optional[Tuple[str, str, int]] = None
+    ) -> Tuple[List[Any], Optional[Tuple[str, str, int]]]:
+        """
+        Returns up to ``limit`` entities in ``get_all()`` order, following the
+        entity a previous page ended with. Shards are paged one after the other,
+        and only those holding the entities of the page are loaded.
+
+        A key is the shard key followed by the key of the shard's own
+        ``get_page()``: the ID and position of the last entity. A page that ends a
+        shard returns the key of the next shard with an empty ID and position -1,
+        so when the shards left hold no entities, the last page is empty.
+
+        Parameters:
+            limit (int): The maximum number of entities to return.
+            after (Optional[Tuple[str, str, int]]): The key returned with the
+                previous page, or None for the first page.
+
+        Returns:
+            Tuple[List[Any], Optional[Tuple[str, str, int]]]: The entities, and the
+            key of the next page, or None if this is the last one.
+
+        Raises:
+            ValueError: If ``after`` is not a key of this shape.
+        """
+        keys = self.shard_keys()
+        first, inner = 0, None
+        if after is not None:
+            key, entity_id, position = check_page_key(after, 3)
+            first = bisect_left(keys, key)
+            if first < len(keys) and keys[first] == key and position >= 0:
+                inner = (entity_id, position)
+        page = []
+        for number in range(first, len(keys)):
+            key = keys[number]
+            shard = self.shard(key)
+            while shard is not None:
+                entities, inner = shard.get_page(limit - len(page), inner)
+                page.extend(self.__routed(key, entities))
+                if inner is None or len(page) == limit:
+                    break
+            if inner is not None:
+                return page, (key, *inner)
+            if len(page) == limit:
+                if number + 1 < len(keys):
+                    return page, (keys[number + 1], "", -1)
+                break
+        return page, None
+
+    def get_by_id(self, entity_id: str) -> Optional[Any]:
+        """
+        Returns an entity instance by its ID, loading only its shard.
+
+        Parameters:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            Optional[Any]: The entity instance, or None if not found.
+        """
+        shard = self.shard_of(entity_id)
+        return shard.get_by_id(entity_id) if shard else None
+
+    def find_by(
+        self, field_name: Any, value: Any, shard: Optional[str] = None
+    ) -> List[Any]:
+        """
+        Returns the entities whose indexed field equals the given value.
+
+        Parameters:
+            field_name (Any): A field, or tuple of fields, indexed by the shards.
+            value (Any): The value to look up.
+            shard (Optional[str]): The only shard to search, or None for all shards.
+
+        Returns:
+            List[Any]: The matching entities.
+
+        Raises:
+            KeyError: If the field is not declared as an index.
+        """
+        entities = []
+        for key in [shard] if shard is not None else self.shard_keys():
+            repository = self.shard(key)
+            if repository:
+                matches = repository.find_by(field_name, value)
+                entities.extend(self.__routed(key, matches))
+        return entities
+
+    def first_by(
+        self, field_name: Any, value: Any, shard: Optional[str] = None
+    ) -> Optional[Any]:
+        """
+        Returns the first entity whose indexed field equals the given value.
+
+        Parameters:
+            field_name (Any): A field, or tuple of fields, indexed by the shards.
+            value (Any): The value to look up.
+            shard (Optional[str]): The only shard to search, or None for all shards.
+
+        Returns:
+            Optional[Any]: The first matching entity, or None if there is none.
+
+        Raises:
+            KeyError: If the field is not declared as an index.
+        """
+        for key in [shard] if shard is not None else self.shard_keys():
+            repository = self.shard(key)
+            if repository is None:
+                continue
+            entity = repository.first_by(field_name, value)
+            if entity is not None and self.__routes.get(entity.id) != key:
+                # The head of the bucket was moved away; look further.
+                matches = self.__routed(key, repository.find_by(field_name, value))
+                entity = matches[0] if matches else None
+            if entity is not None:
+                return entity
+        return None
+
+    def find_where(
+        self, criteria: Dict[str, Any], shard: Optional[str] = None
+    ) -> List[Any]:
+        """
+        Returns the entities whose indexed fields equal all the given values.
+
+        Parameters:
+            criteria (Dict[str, Any]): The value of each field, every field being
+                indexed by the shards.
+            shard (Optional[str]): The only shard to search, or None for all shards.
+
+        Returns:
+            List[Any]: The matching entities, in ``get_all()`` order.
+
+        Raises:
+            KeyError: If a field is not declared as an index.
+        """
+        entities = []
+        for key in [shard] if shard is not None else self.shard_keys():
+            repository = self.shard(key)
+            if repository:
+                entities.extend(self.__routed(key, repository.find_where(criteria)))
+        return entities
+
+    def iter_where(self, criteria: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Iterates over the entities matching ``find_where(criteria)``, or over all
+        entities without criteria, walking one shard snapshot at a time.
+
+        Parameters:
+            criteria (Optional[Dict[str, Any]]): The value of each field, every field
+                being indexed by the shards.
+
+        Returns:
+            Iterator[Any]: The entities, in ``get_all()`` order.
+
+        Raises:
+            KeyError: If a field is not declared as an index.
+        """
+        if criteria:
+            return iter(self.find_where(criteria))
+        return self.__iter_all()
+
+    @property
+    def version(self) -> int:
+        return sum(shard.version for shard in list(self.__shards.values()))
+
+    @property
+    def last_modified(self) -> float:
+        return max(
+            [shard.last_modified for shard in list(self.__shards.values())],
+            default=self.__created_at,
+        )
+
+    def version_tag(
+        self, entity_id: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Returns a tag that changes whenever the collection, or a single entity of it,
+        changes, together with the time it last changed. The tag of an entity is
+        the one its shard gives it.
+
+        Parameters:
+            entity_id (Optional[str]): The ID of an entity, or None for the whole
+                collection.
+
+        Returns:
+            Optional[Tuple[str, float]]: The tag and modification time, or None if
+            the entity is not found.
+        """
+        if entity_id is None:
+            return f"{self.__epoch}-{self.version}", self.last_modified
+        key = self.__routes.get(entity_id)
+        shard = self.shard(key) if key is not None else None
+        return shard.version_tag(entity_id) if shard else None
+
+    def create(self, entity: Any, sync: bool = False) -> Any:
+        """
+        Adds a new entity instance to its shard.
+
+        Parameters:
+            entity (Any): The entity instance to add.
+            sync (bool): Whether to flush before returning in group-commit mode.
+
+        Returns:
+            Any: The added entity instance.
+        """
+        key = self.__key(entity)
+        with self.write_lock():
+            self.shard(key, create=True).create(entity, sync)
+            self.__route(entity.id, key)
+        return entity
+
+    def create_many(self, entities: List[Any], sync: bool = False) -> List[Any]:
+        """
+        Adds several new entity instances, with one write per shard they fall in.
+
+        Parameters:
+            entities (List[Any]): The entity instances to add.
+            sync (bool): Whether to flush before returning in group-commit mode.
+
+        Returns:
+            List[Any]: The added entity instances.
+        """
+        groups: Dict[str, List[Any]] = {}
+        for entity in entities:
+            groups.setdefault(self.__key(entity), []).append(entity)
+        with self.write_lock():
+            for key, group in groups.items():
+                self.shard(key, create=True).create_many(group, sync)
+            self.__append_routes(
+                (entity.id, key) for key, group in groups.items() for entity in group
+            )
+        return entities
+
+    def update(self, entity: Any, sync: bool = False) -> Any:
+        """
+        Persists an entity that was modified in place, moving it to another shard
+        if its shard key changed.
+
+        Parameters:
+            entity (Any): The modified entity instance.
+            sync (bool): Whether to flush before returning in group-commit mode.
+
+        Returns:
+            Any: The updated entity instance.
+        """
+        key = self.__key(entity)
+        with self.write_lock():
+            previous = self.__routes.get(entity.id)
+            self.shard(key, create=True).update(entity, sync)
+            if previous != key:
+                self.__route(entity.id, key)
+                if previous is not None:
+                    self.shard(previous, create=True).delete(entity.id, sync)
+        return entity
+
+    def delete(self, entity_id: str, sync: bool = False) -> Optional[Any]:
+        """
+        Removes an entity instance from its shard.
+
+        Parameters:
+            entity_id (str): The ID of the entity to remove.
+            sync (bool): Whether to flush before returning in group-commit mode.
+
+        Returns:
+            Optional[Any]: The removed entity instance, or None if not found.
+        """
+        with self.write_lock():
+            key = self.__routes.get(entity_id)
+            if key is None:
+                return None
+            self.__route(entity_id, None)
+            return self.shard(key, create=True).delete(entity_id, sync)
+
+    def flush(self):
+        """
+        Persists the mutations pending in every loaded shard.
+        """
+        for shard in list(self.__shards.values()):
+            shard.flush()
+
+    def close(self):
+        """
+        Flushes every loaded shard and stops its group-commit thread.
+        """
+        for shard in list(self.__shards.values()):
+            shard.close()
+
+    def refresh(self) -> bool:
+        """
+        Picks up the routes and the shard changes written by other processes. Only
+        the shards already loaded are refreshed. Does nothing outside multi-process
+        mode.
+
+        Returns:
+            bool: True if changes were loaded.
+        """
+        if self.__lock is None:
+            return False
+        with self.__lock.shared():
+            changed = self.__refresh_routes()
+        for shard in list(self.__shards.values()):
+            changed = shard.refresh() or changed
+        return changed
+
+    @contextmanager
+    def write_lock(self):
+        """
+        Holds the write lock of the sharded repository, under which reads and
+        writes form one atomic step. In multi-process mode the lock is shared with
+        other processes and the routes they wrote are loaded when it is acquired.
+        """
+        if self.__lock is None:
+            with self.__thread_lock:
+                yield
+            return
+        with self.__lock.exclusive():
+            self.__refresh_routes()
+            yield
+
+    def save_data(self):
+        """
+        Saves every loaded shard and rewrites the routing log with one line per
+        entity.
+        """
+        with self.write_lock():
+            for shard in list(self.__shards.values()):
+                shard.save_data()
+            temp_file = self.__routes_file + ".tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                f.writelines(
+                    f"{entity_id}\t{key}\n" for entity_id, key in self.__routes.items()
+                )
+            os.replace(temp_file, self.__routes_file)
+            self.__routes_seen = self.__routes_stamp()
+
+    def serialize_many(
+        self, entities: Iterable[Any], serializer: Callable[[Any], Any]
+    ) -> List[Any]:
+        """
+        Serializes entities, reusing the forms their shards cached for entities that
+        have not changed since.
+
+        Parameters:
+            entities (Iterable[Any]): The entities to serialize.
+            serializer (Callable[[Any], Any]): A long-lived serializer.
+
+        Returns:
+            List[Any]: The serialized entities, in order.
+        """
+        result = []
+        for key, group in groupby(entities, lambda e: self.__routes.get(e.id)):
+            shard = self.__shards.get(key)
+            if shard is None:
+                result.extend(serializer(entity) for entity in group)
+            else:
+                result.extend(shard.serialize_many(group, serializer))
+        return result
+
+    def import_file(self, data_file: str) -> int:
+        """
+        Splits an unsharded JSON data file into shard files, writing each shard
+        once, and routes the imported entities.
+
+        Parameters:
+            data_file (str): The path to the JSON data file.
+
+        Returns:
+            int: The number of imported entities.
+
+        Raises:
+            ValueError: If the directory already holds shards.
+        """
+        with self.write_lock():
+            if self.shard_keys():
+                raise ValueError(f"{self.__directory} already holds shards")
+            source = self.__repository_cls(data_file)
+            groups: Dict[str, List[Any]] = {}
+            for entity in source.get_all():
+                groups.setdefault(self.__key(entity), []).append(entity)
+            for key, entities in groups.items():
+                with open(self.__shard_path(key), "w", encoding="utf-8") as f:
+                    json.dump(
+                        [source.serialize_entity(entity) for entity in entities],
+                        f,
+                        ensure_ascii=False,
+                        indent=4,
+                    )
+            self.__append_routes(
+                (entity.id, key)
+                for key, entities in groups.items()
+                for entity in entities
+            )
+        return sum(len(entities) for entities in groups.values())
+
+    def __iter_all(self) -> Iterator[Any]:
+        for key in self.shard_keys():
+            for entity in self.shard(key).get_all():
+                if self.__routes.get(entity.id) == key:
+                    yield entity
+
+    def __key(self, entity: Any) -> str:
+        key = self.__shard_key(entity)
+        return UNASSIGNED_SHARD if key is None else key
+
+    def __shard_path(self, key: str) -> str:
+        return os.path.join(self.__directory, quote(key, safe="") + ".json")
+
+    def __routed(self, key: str, entities: List[Any]) -> List[Any]:
+        routes = self.__routes
+        return [entity for entity in entities if routes.get(entity.id) == key]
+
+    def __route(self, entity_id: str, key: Optional[str]):
+        self.__append_routes([(entity_id, key)])
+
+    def __append_routes(self, placements: Iterable[Any]):
+        lines = []
+        for entity_id, key in placements:
+            if key is None:
+                self.__routes.pop(entity_id, None)
+            else:
+                self.__routes[entity_id] = key
+            lines.append(f"{entity_id}\t{key or ''}\n")
+        with open(self.__routes_file, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+        self.__routes_seen = self.__routes_stamp()
+
+    def __rebuild_routes(self):
+        # The routing log is missing: route every entity to the shard holding it.
+        self.__routes.clear()
+        placements = []
+        for key in self.shard_keys():
+            for entity in self.shard(key).get_all():
+                placements.append((entity.id, key))
+        self.__append_routes(placements)
+
+    def __routes_stamp(self):
+        try:
+            stat = os.stat(self.__routes_file)
+        except FileNotFoundError:
+            return None, 0
+        return stat.st_ino, stat.st_size
+
+    def __refresh_routes(self) -> bool:
+        stamp = self.__routes_stamp()
+        if stamp == self.__routes_seen:
+            return False
+        if stamp[0] != self.__routes_seen[0] or stamp[1] < self.__routes_seen[1]:
+            self.__routes.clear()
+            offset = 0
+        else:
+            offset = self.__routes_seen[1]
+        with open(self.__routes_file, "rb") as f:
+            f.seek(offset)
+            for line in f.read(stamp[1] - offset).decode("utf-8").splitlines():
+                entity_id, _, key = line.partition("\t")
+                if key:
+                    self.__routes[entity_id] = key
+                else:
+                    self.__routes.pop(entity_id, None)
+        self.__routes_seen = stamp
+        return True
+
+
+class ShardedLockerRepository(ShardedRepository):
+    """
+    A sharded repository class for managing Locker entities, with one shard per
+    bloq.
+
+    Inherits from ShardedRepository. Each shard is a LockerRepository, so the
+    lockers of a bloq, and its free-locker pool, are served by its shard alone.
+
+    Methods:
+        select_unoccupied(bloq_id: Optional[str]): Selects an unoccupied locker.
+        claim_unoccupied(bloq_id: Optional[str]): Atomically selects and occupies a locker.
+        compare_and_set_occupied(locker_id: str, expected: bool, occupied: bool, status: LockerStatus):
+            Atomically changes the occupancy of a locker if it has the expected one.
+        get_by_bloq(bloq_id: str): Returns the lockers of a bloq.
+        get_by_occupied(occupied: bool): Returns the lockers with the given occupancy.
+        find_where(criteria: Dict[str, Any], shard: Optional[str]) -> List[Locker]: Returns
+            the lockers matching several indexed fields, from one shard if
+            ``bloq_id`` is among them.
+    """
+
+    def __init__(self, directory: str, **options):
+        """
+        Initializes the ShardedLockerRepository over the given directory.
+
+        Parameters:
+            directory (str): The directory holding one data file per bloq.
+            **options: Persistence options forwarded to every shard.
+        """
+        super().__init__(
+            directory, LockerRepository, lambda locker: locker.bloq_id, **options
+        )
+
+    def select_unoccupied(self, bloq_id: Optional[str] = None) -> Optional[Locker]:
+        """
+        Selects an unoccupied locker.
+
+        Parameters:
+            bloq_id (Optional[str]): The bloq to pick from, or None for any bloq.
+
+        Returns:
+            Optional[Locker]: An unoccupied locker, or None if none are available.
+        """
+        if bloq_id is None:
+            return self.first_by("is_occupied", False)
+        return self.first_by(
+            ("bloq_id", "is_occupied"), (bloq_id, False), shard=bloq_id
+        )
+
+    def claim_unoccupied(self, bloq_id: Optional[str] = None) -> Optional[Locker]:
+        """
+        Selects an unoccupied locker and marks it closed and occupied under the
+        write lock, so concurrent callers never get the same one. The change is
+        flushed before returning.
+
+        Parameters:
+            bloq_id (Optional[str]): The bloq to pick from, or None for any bloq.
+
+        Returns:
+            Optional[Locker]: The claimed locker, or None if none are available.
+        """
+        with self.write_lock():
+            locker = self.select_unoccupied(bloq_id)
+            if locker:
+                # Replaced rather than modified, so published snapshots keep the
+                # previous state.
+                locker = replace(locker)
+                locker.update_status(LockerStatus.CLOSED, True)
+                self.update(locker, sync=True)
+        return locker
+
+    def compare_and_set_occupied(
+        self, locker_id: str, expected: bool, occupied: bool, status: LockerStatus
+    ) -> Optional[Locker]:
+        """
+        Sets the occupancy and status of a locker only if its occupancy is still the
+        expected one, as one atomic step. The change is flushed before returning.
+
+        Parameters:
+            locker_id (str): The ID of the locker.
+            expected (bool): The occupancy the locker must have.
+            occupied (bool): The new occupancy.
+            status (LockerStatus): The new status.
+
+        Returns:
+            Optional[Locker]: The updated locker, or None if the locker does not exist
+            or its occupancy differs from the expected one.
+        """
+        with self.write_lock():
+            locker = self.get_by_id(locker_id)
+            if locker is None or locker.is_occupied != expected:
+                return None
+            locker = replace(locker)
+            locker.update_status(status, occupied)
+            self.update(locker, sync=True)
+        return locker
+
+    def get_by_bloq(self, bloq_id: str) -> List[Locker]:
+        """
+        Returns the lockers of a bloq, loading only its shard.
+
+        Parameters:
+            bloq_id (str): The ID of the bloq.
+
+        Returns:
+            List[Locker]: The lockers belonging to the bloq.
+        """
+        return self.find_by("bloq_id", bloq_id, shard=bloq_id)
+
+    def get_by_occupied(self, occupied: bool) -> List[Locker]:
+        """
+        Returns the lockers with the given occupancy.
+
+        Parameters:
+            occupied (bool): Whether the lockers are occupied.
+
+        Returns:
+            List[Locker]: The matching lockers.
+        """
+        return self.find_by("is_occupied", occupied)
+
+    def find_where(
+        self, criteria: Dict[str, Any], shard: Optional[str] = None
+    ) -> List[Locker]:
+        """
+        Returns the lockers whose indexed fields equal all the given values,
+        searching only the bloq's shard when ``bloq_id`` is given.
+
+        Parameters:
+            criteria (Dict[str, Any]): The value of each field.
+            shard (Optional[str]): The only shard to search, or None to pick it
+                from the criteria.
+
+        Returns:
+            List[Locker]: The matching lockers.
+        """
+        if shard is None and criteria.get("bloq_id") is not None:
+            shard = criteria["bloq_id"]
+        return super().find_where(criteria, shard)
+
+
+class ShardedRentRepository(ShardedRepository):
+    """
+    A sharded repository class for managing Rent entities, with one shard per bloq.
+
+    Inherits from ShardedRepository. A rent belongs to the bloq of its locker;
+    rents without a locker are kept in the unassigned shard and move to their
+    bloq's shard when a locker is assigned.
+
+    Attributes:
+        __locker_repository: The repository used to find the bloq of a locker.
+
+    Methods:
+        get_by_locker(locker_id: str): Returns the rents assigned to a locker.
+        get_by_status(status: RentStatus): Returns the rents with the given status.
+        find_where(criteria: Dict[str, Any], shard: Optional[str]) -> List[Rent]: Returns
+            the rents matching several indexed fields, from one shard if
+            ``locker_id`` is among them.
+        archive_delivered(older_than: Optional[timedelta]) -> int: Archives delivered rents.
+        is_archived(rent_id: str) -> bool: Tells whether a rent is archived.
+        iter_archived(criteria: Optional[Dict[str, Any]]) -> Iterator[Rent]: Iterates over
+            the archived rents of every shard.
+    """
+
+    def __init__(self, directory: str, locker_repository: Any, **options):
+        """
+        Initializes the ShardedRentRepository over the given directory.
+
+        Parameters:
+            directory (str): The directory holding one data file per bloq.
+            locker_repository (Any): The repository of the lockers rents refer to.
+            **options: Persistence options forwarded to every shard.
+        """
+        self.__locker_repository = locker_repository
+        super().__init__(
+            directory,
+            RentRepository,
+            lambda rent: self.__bloq_of(rent.locker_id),
+            **options,
+        )
+
+    def get_by_locker(self, locker_id: Optional[str]) -> List[Rent]:
+        """
+        Returns the rents assigned to a locker, loading only the shard of its bloq.
+
+        Parameters:
+            locker_id (Optional[str]): The ID of the locker, or None for the rents
+                without a locker.
+
+        Returns:
+            List[Rent]: The rents assigned to the locker.
+        """
+        shard = self.__bloq_of(locker_id) or UNASSIGNED_SHARD
+        return self.find_by("locker_id", locker_id, shard=shard)
+
+    def get_by_status(self, status: RentStatus) -> List[Rent]:
+        """
+        Returns the rents with the given status.
+
+        Parameters:
+            status (RentStatus): The rent status, as an enum or its raw value.
+
+        Returns:
+            List[Rent]: The matching rents.
+        """
+        return self.find_by("status", status)
+
+    def find_where(
+        self, criteria: Dict[str, Any], shard: Optional[str] = None
+    ) -> List[Rent]:
+        """
+        Returns the rents whose indexed fields equal all the given values,
+        searching only the shard of the locker's bloq when ``locker_id`` is given.
+
+        Parameters:
+            criteria (Dict[str, Any]): The value of each field.
+            shard (Optional[str]): The only shard to search, or None to pick it
+                from the criteria.
+
+        Returns:
+            List[Rent]: The matching rents.
+        """
+        if shard is None and "locker_id" in criteria:
+            shard = self.__bloq_of(criteria["locker_id"]) or UNASSIGNED_SHARD
+        return super().find_where(criteria, shard)
+
+    def archive_delivered(self, older_than: Optional[timedelta] = None) -> int:
+        """
+        Moves delivered rents into the archive segment of their shard. Archived
+        rents stay routed to their shard, which finds them in its archive.
+
+        Parameters:
+            older_than (Optional[timedelta]): The minimum time since delivery, or
+                None to archive every delivered rent.
+
+        Returns:
+            int: The number of rents archived.
+        """
+        return sum(
+            self.shard(key).archive_delivered(older_than) for key in self.shard_keys()
+        )
+
+    def is_archived(self, rent_id: str) -> bool:
+        """
+        Tells whether a rent is archived in its shard.
+
+        Parameters:
+            rent_id (str): The ID of the rent.
+
+        Returns:
+            bool: True if the rent is only found in its shard's archive.
+        """
+        shard = self.shard_of(rent_id)
+        return shard.is_archived(rent_id) if shard else False
+
+    def iter_archived(
+        self, criteria: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Rent]:
+        """
+        Iterates over the archived rents of every shard, one shard after the other.
+
+        Parameters:
+            criteria (Optional[Dict[str, Any]]): The value of each field the rents
+                must have.
+
+        Returns:
+            Iterator[Rent]: The archived rents, as detached copies.
+        """
+        for key in self.shard_keys():
+            yield from self.shard(key).iter_archived(criteria)
+
+    def __bloq_of(self, locker_id: Optional[str]) -> Optional[str]:
+        if locker_id is None:
+            return None
+        locker = self.__locker_repository.get_by_id(locker_id)
+        return locker.bloq_id if locker else None
@@ -0,0 +1,327 @@
+"""
+Compact binary snapshots of repository data files.
+
+A snapshot holds the same rows as a JSON data file in a columnar layout, with
+every string stored once in a shared string table. Repeated values such as
+``bloqId``, ``lockerId`` and status names therefore cost four bytes per row, and
+whole columns decode through ``array`` and ``map`` without per-value parsing.
+
+Layout (little-endian)::
+
+    header        magic "BLQS", version u8, source mtime_ns i64, source size u64,
+                  row count u32, field count u16, string count u32
+    string table  u32 character length per string, u32 byte length of the
+                  concatenated strings, then the concatenated UTF-8 bytes
+    per field     name (u32 string index), one type tag byte per row, then the
+                  int (i64), float (f64) and string (u32 index) payloads, each
+                  preceded by its u32 element count
+
+The source mtime and size identify the JSON file the snapshot mirrors, so a
+snapshot is only used while that file is unchanged.
+
+Usage::
+
+    python -m app.snapshot to-snapshot data/rents.json [data/rents.snap]
+    python -m app.snapshot to-json data/rents.snap [data/rents.json]
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate, chain, count, filterfalse, repeat
+from operator import methodcaller
+from typing import Any, Dict, List, Optional, Tuple
+
+MAGIC = b"BLQS"
+VERSION = 1
+HEADER = struct.Struct("<4sBqQIHI")
+COUNT = struct.Struct("<I")
+
+NONE, FALSE, TRUE, INT, FLOAT, STRING, ABSENT = range(7)
+ABSENT_VALUE = object()
+TYPE_TAGS = {type(None): NONE, int: INT, float: FLOAT, str: STRING}
+
+
+def snapshot_path(data_file: str) -> str:
+    """
+    Returns the snapshot file kept alongside a JSON data file.
+
+    Parameters:
+        data_file (str): The path to the JSON data file.
+
+    Returns:
+        str: The path to the snapshot file.
+    """
+    return os.path.splitext(data_file)[0] + ".snap"
+
+
+def source_stamp(data_file: str) -> Tuple[int, int]:
+    """
+    Returns the modification time and size identifying a JSON data file.
+
+    Parameters:
+        data_file (str): The path to the JSON data file.
+
+    Returns:
+        Tuple[int, int]: The file's mtime in nanoseconds and its size in bytes.
+    """
+    stat = os.stat(data_file)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def is_fresh(path: str, data_file: str) -> bool:
+    """
+    Checks whether a snapshot mirrors the current content of its JSON data file.
+
+    Parameters:
+        path (str): The path to the snapshot file.
+        data_file (str): The path to the JSON data file.
+
+    Returns:
+        bool: True if the snapshot exists and was written for the file as it is now.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return False
+    if len(header) < HEADER.size:
+        return False
+    magic, version, mtime_ns, size = HEADER.unpack(header)[:4]
+    return (
+        magic == MAGIC
+        and version == VERSION
+        and (mtime_ns, size) == source_stamp(data_file)
+    )
+
+
+def write_snapshot(
+    path: str, rows: List[Dict[str, Any]], stamp: Tuple[int, int] = (0, 0)
+):
+    """
+    Writes rows to a snapshot file, atomically replacing any previous snapshot.
+
+    Parameters:
+        path (str): The path to the snapshot file.
+        rows (List[Dict[str, Any]]): The rows, as found in a JSON data file.
+        stamp (Tuple[int, int]): The mtime and size of the JSON file the rows mirror.
+
+    Raises:
+        TypeError: If a value is not None, a bool, an int, a float or a string.
+    """
+    names = list(dict.fromkeys(chain.from_iterable(rows)))
+    strings: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    columns = []
+    for name in names:
+        values = list(map(methodcaller("get", name, ABSENT_VALUE), rows))
+        ints, floats, refs = array("q"), array("d"), array("I")
+        kinds = set(map(type, values))
+        # Columns of plain scalars, the common case, are encoded without a
+        # per-value Python loop.
+        if kinds == {bool}:
+            tags = bytes(map(FALSE.__add__, values))
+        elif kinds <= TYPE_TAGS.keys():
+            tags = bytes(map(TYPE_TAGS.__getitem__, map(type, values)))
+            if str in kinds:
+                present = _of_type(values, str, kinds)
+                new = filterfalse(strings.__contains__, dict.fromkeys(present))
+                strings.update(zip(new, count(len(strings))))
+                refs = array("I", map(strings.__getitem__, present))
+            if int in kinds:
+                ints = array("q", _of_type(values, int, kinds))
+            if float in kinds:
+                floats = array("d", _of_type(values, float, kinds))
+        else:
+            tags = _encode_mixed(name, values, intern, ints, floats, refs)
+        columns.append((intern(name), tags, ints, floats, refs))
+
+    lengths = array("I", map(len, strings))
+    blob = "".join(strings).encode("utf-8")
+    parts = [
+        HEADER.pack(
+            MAGIC, VERSION, stamp[0], stamp[1], len(rows), len(names), len(strings)
+        ),
+        _to_bytes(lengths),
+        COUNT.pack(len(blob)),
+        blob,
+    ]
+    for name_ref, tags, ints, floats, refs in columns:
+        parts.append(COUNT.pack(name_ref))
+        parts.append(tags)
+        for payload in (ints, floats, refs):
+            parts.append(COUNT.pack(len(payload)))
+            parts.append(_to_bytes(payload))
+
+    # Processes sharing the data files may write the same snapshot concurrently.
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(temp_path, path)
+
+
+def _of_type(values: List[Any], kind: type, kinds: set) -> List[Any]:
+    return values if kinds == {kind} else [v for v in values if type(v) is kind]
+
+
+def _encode_mixed(name, values, intern, ints, floats, refs) -> bytes:
+    tags = bytearray()
+    for value in values:
+        if value is ABSENT_VALUE:
+            tags.append(ABSENT)
+        elif value is None:
+            tags.append(NONE)
+        elif value is True or value is False:
+            tags.append(TRUE if value else FALSE)
+        elif isinstance(value, int):
+            tags.append(INT)
+            ints.append(value)
+        elif isinstance(value, float):
+            tags.append(FLOAT)
+            floats.append(value)
+        elif isinstance(value, str):
+            tags.append(STRING)
+            refs.append(intern(value))
+        else:
+            raise TypeError(f"Unsupported snapshot value for {name!r}: {value!r}")
+    return bytes(tags)
+
+
+def read_snapshot(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads the rows of a snapshot file.
+
+    Parameters:
+        path (str): The path to the snapshot file.
+
+    Returns:
+        List[Dict[str, Any]]: The rows, as found in the JSON data file.
+
+    Raises:
+        ValueError: If the file is not a snapshot of a supported version.
+    """
+    names, columns = read_columns(path)
+    if any(ABSENT_VALUE in column for column in columns):
+        return [
+            {
+                name: value
+                for name, value in zip(names, values)
+                if value is not ABSENT_VALUE
+            }
+            for values in zip(*columns)
+        ]
+    return list(map(dict, map(zip, repeat(names), zip(*columns))))
+
+
+def read_columns(path: str) -> Tuple[List[str], List[List[Any]]]:
+    """
+    Reads a snapshot file column by column, which avoids building a dictionary
+    per row when the caller can consume columns directly.
+
+    Parameters:
+        path (str): The path to the snapshot file.
+
+    Returns:
+        Tuple[List[str], List[List[Any]]]: The field names and one list of values
+        per field. Values missing from a row are ``ABSENT_VALUE``.
+
+    Raises:
+        ValueError: If the file is not a snapshot of a supported version.
+    """
+    with open(path, "rb") as f:
+        data = memoryview(f.read())
+    magic, version, _, _, row_count, field_count, string_count = HEADER.unpack_from(
+        data
+    )
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} snapshot")
+    offset = HEADER.size
+
+    lengths, offset = _read_array("I", data, offset, string_count)
+    (blob_size,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    blob = str(data[offset : offset + blob_size], "utf-8")
+    offset += blob_size
+    ends = list(accumulate(lengths))
+    strings = list(map(blob.__getitem__, map(slice, [0] + ends[:-1], ends)))
+
+    names, columns = [], []
+    for _ in range(field_count):
+        (name_ref,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        tags = bytes(data[offset : offset + row_count])
+        offset += row_count
+        payloads = []
+        for typecode in ("q", "d", "I"):
+            (count,) = COUNT.unpack_from(data, offset)
+            payload, offset = _read_array(typecode, data, offset + COUNT.size, count)
+            payloads.append(payload)
+        ints, floats, refs = payloads
+        # One source per tag; map(next, ...) pulls each value from its tag's source.
+        sources = (
+            repeat(None),
+            repeat(False),
+            repeat(True),
+            iter(ints),
+            iter(floats),
+            map(strings.__getitem__, refs),
+            repeat(ABSENT_VALUE),
+        )
+        names.append(strings[name_ref])
+        columns.append(list(map(next, map(sources.__getitem__, tags))))
+    return names, columns
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_array(
+    typecode: str, data: memoryview, offset: int, count: int
+) -> Tuple[array, int]:
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.snapshot",
+        description="Convert repository data files between JSON and binary snapshots.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    to_snapshot = commands.add_parser("to-snapshot", help="JSON data file to snapshot")
+    to_snapshot.add_argument("source")
+    to_snapshot.add_argument("target", nargs="?")
+    to_json = commands.add_parser("to-json", help="snapshot to JSON data file")
+    to_json.add_argument("source")
+    to_json.add_argument("target", nargs="?")
+    args = parser.parse_args(argv)
+
+    if args.command == "to-snapshot":
+        target = args.target or snapshot_path(args.source)
+        with open(args.source, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        write_snapshot(target, rows, source_stamp(args.source))
+    else:
+        target = args.target or os.path.splitext(args.source)[0] + ".json"
+        rows = read_snapshot(args.source)
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=4)
+    print(f"Wrote {len(rows)} rows to {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,834 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from dataclasses import fields
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from app.models import Bloq, Locker, LockerStatus, Rent, RentStatus
+from app.utils import check_page_key, generate_id
+
+
+class SQLiteDatabase:
+    """
+    The per-thread connections to one SQLite database file, shared by every
+    repository on that file.
+
+    Sharing the connection lets a write transaction span several repositories:
+    a locker compare-and-set nested in a rent's write transaction joins it
+    instead of waiting on a second ``BEGIN IMMEDIATE`` from its own connection,
+    which would deadlock until the busy timeout.
+
+    Attributes:
+        __db_file (str): The path to the SQLite database.
+        __local (threading.local): The connection and transaction depth of each
+            thread.
+
+    Methods:
+        open(db_file: str) -> SQLiteDatabase: Returns the shared instance for a file.
+        connection() -> sqlite3.Connection: Returns the calling thread's connection.
+        transaction(): Runs the enclosed statements in one write transaction.
+    """
+
+    __instances: "weakref.WeakValueDictionary[str, SQLiteDatabase]" = (
+        weakref.WeakValueDictionary()
+    )
+    __instances_lock = threading.Lock()
+
+    def __init__(self, db_file: str):
+        """
+        Initializes a SQLiteDatabase without opening any connection.
+
+        Parameters:
+            db_file (str): The path to the SQLite database.
+        """
+        self.__db_file = db_file
+        self.__local = threading.local()
+
+    @classmethod
+    def open(cls, db_file: str) -> "SQLiteDatabase":
+        """
+        Returns the instance shared by the repositories of a database file, kept
+        while any of them is alive.
+
+        Parameters:
+            db_file (str): The path to the SQLite database.
+
+        Returns:
+            SQLiteDatabase: The shared instance.
+        """
+        key = db_file if db_file == ":memory:" else os.path.realpath(db_file)
+        with cls.__instances_lock:
+            database = cls.__instances.get(key)
+            if database is None:
+                database = cls(db_file)
+                cls.__instances[key] = database
+            return database
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the calling thread, opened on first use.
+
+        Returns:
+            sqlite3.Connection: The connection, in autocommit mode.
+        """
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.__db_file, timeout=30, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+            self.__local.depth = 0
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the enclosed statements in one immediate write transaction, which
+        excludes the writers of every other thread and process until it ends. The
+        transaction is reentrant across all repositories of the database; nested
+        uses join the outer one.
+        """
+        connection = self.connection()
+        if self.__local.depth:
+            self.__local.depth += 1
+            try:
+                yield
+            finally:
+                self.__local.depth -= 1
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        self.__local.depth = 1
+        try:
+            with connection:
+                yield
+        finally:
+            self.__local.depth = 0
+
+
+class SQLiteRepository:
+    """
+    A repository backed by a SQLite database in WAL mode, with the same contract
+    as BaseRepository.
+
+    Each entity class maps to one table. Columns are named after the field's
+    ``data_key`` metadata when present (e.g. ``bloqId``), matching the JSON files,
+    and the fields listed in ``indexes`` get a SQL index; a tuple of fields gets a
+    multi-column index. Entities returned by the
+    repository are detached copies: modify them and pass them to ``update()``.
+
+    Triggers count the rows each statement inserts, updates or deletes in a
+    ``versions`` table, so the version of a table reflects the writes of every
+    process. No version is kept per row; the tag of an entity is that of its table.
+
+    Attributes:
+        indexes (Tuple[Union[str, Tuple[str, ...]], ...]): The entity fields, or
+            tuples of fields, backed by a SQL index.
+        version (int): The number of rows written to the table; only ever grows.
+        last_modified (float): The time of the last write to the table.
+        __db_file (str): The path to the SQLite database.
+        __cls (Type[Any]): The class type of the entity.
+        __table (str): The table holding the entities.
+        __columns (Dict[str, str]): The column name of each entity field.
+        __database (SQLiteDatabase): The per-thread connections, shared with the
+            other repositories of the database file.
+
+    Methods:
+        get_all() -> List[Any]: Returns all entity instances.
+        get_page(limit: int, after: Optional[Tuple[str, int]]) -> Tuple[List[Any], Optional[Tuple[str, int]]]:
+            Returns a page of entity instances in insertion order.
+        get_by_id(entity_id: str) -> Optional[Any]: Returns an entity instance by its ID.
+        find_by(field_name: Any, value: Any) -> List[Any]: Returns the entities matching an indexed field.
+        first_by(field_name: Any, value: Any) -> Optional[Any]: Returns the first entity matching an indexed field.
+        find_where(criteria: Dict[str, Any]) -> List[Any]: Returns the entities matching several indexed fields.
+        iter_where(criteria: Optional[Dict[str, Any]]) -> Iterator[Any]: Iterates over the
+            entities matching several indexed fields, or over all of them.
+        version_tag(entity_id: Optional[str]) -> Optional[Tuple[str, float]]: Returns an entity
+            tag and modification time for the table.
+        create(entity: Any, sync: bool) -> Any: Adds a new entity instance.
+        create_many(entities: List[Any], sync: bool) -> List[Any]: Adds several entity instances.
+        update(entity: Any, sync: bool) -> Any: Persists an entity modified in place.
+        delete(entity_id: str, sync: bool) -> Optional[Any]: Removes an entity instance.
+        flush(): Kept for interface compatibility; every write is already committed.
+        close(): Kept for interface compatibility; there is nothing to stop.
+        refresh() -> bool: Kept for interface compatibility; reads are always current.
+        serialize_many(entities: Iterable[Any], serializer: Callable) -> List[Any]: Serializes entities.
+        write_lock(): Runs the enclosed statements in one write transaction.
+        save_data(): Checkpoints the write-ahead log into the database file.
+        migrate_from_json(json_file: str) -> int: Imports the entities of a JSON data file.
+    """
+
+    indexes: Tuple[Union[str, Tuple[str, ...]], ...] = ()
+
+    def __init__(self, db_file: str, cls: Any, table: str):
+        """
+        Initializes the SQLiteRepository and creates its table and indexes if needed.
+
+        Parameters:
+            db_file (str): The path to the SQLite database.
+            cls (Type[Any]): The class type of the entity.
+            table (str): The name of the table holding the entities.
+        """
+        self.__db_file = db_file
+        self.__cls = cls
+        self.__table = table
+        self.__columns: Dict[str, str] = {
+            field.name: field.metadata.get("data_key", field.name)
+            for field in fields(cls)
+        }
+        self.__bool_fields = {field.name for field in fields(cls) if field.type is bool}
+        self.__database = SQLiteDatabase.open(db_file)
+        self.__create_schema()
+
+    def get_all(self) -> List[Any]:
+        """
+        Returns all entity instances, in insertion order.
+
+        Returns:
+            List[Any]: A list of all entity instances.
+        """
+        return self.__select("ORDER BY rowid")
+
+    def get_page(
+        self, limit: int, after: Optional[Tuple[str, int]] = None
+    ) -> Tuple[List[Any], Optional[Tuple[str, int]]]:
+        """
+        Returns up to ``limit`` entities in insertion order, following the entity
+        a previous page ended with. The key of a page is the ID and rowid of its
+        last entity; rowids never change, so pages stay exact across deletions.
+
+        Parameters:
+            limit (int): The maximum number of entities to return.
+            after (Optional[Tuple[str, int]]): The key returned with the previous
+                page, or None for the first page.
+
+        Returns:
+            Tuple[List[Any], Optional[Tuple[str, int]]]: The entities, and the key
+            of the next page, or None if this is the last one.
+
+        Raises:
+            ValueError: If ``after`` is not a key of this shape.
+        """
+        if after is not None:
+            check_page_key(after)
+        columns = ", ".join(f'"{column}"' for column in self.__columns.values())
+        rows = (
+            self.__connection()
+            .execute(
+                f'SELECT rowid, {columns} FROM "{self.__table}" '
+                "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (after[1] if after else -1, limit + 1),
+            )
+            .fetchall()
+        )
+        page = [self.__from_row(row[1:]) for row in rows[:limit]]
+        if len(rows) <= limit:
+            return page, None
+        return page, (page[-1].id, rows[limit - 1][0])
+
+    def get_by_id(self, entity_id: str) -> Optional[Any]:
+        """
+        Returns an entity instance by its ID.
+
+        Parameters:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            Optional[Any]: The entity instance, or None if not found.
+        """
+        rows = self.__select('WHERE "id" = ?', (entity_id,))
+        return rows[0] if rows else None
+
+    def find_by(self, field_name: Any, value: Any) -> List[Any]:
+        """
+        Returns the entities whose indexed field equals the given value.
+
+        Parameters:
+            field_name (Any): A field, or tuple of fields, listed in ``indexes``.
+            value (Any): The value to look up, a tuple for a composite index.
+                Enums match their raw value.
+
+        Returns:
+            List[Any]: The matching entities, in insertion order.
+
+        Raises:
+            KeyError: If the field is not declared as an index.
+        """
+        where, parameters = self.__where(field_name, value)
+        return self.__select(f"WHERE {where} ORDER BY rowid", parameters)
+
+    def first_by(self, field_name: Any, value: Any) -> Optional[Any]:
+        """
+        Returns the earliest entity whose indexed field equals the given value.
+
+        Parameters:
+            field_name (Any): A field, or tuple of fields, listed in ``indexes``.
+            value (Any): The value to look up, a tuple for a composite index.
+
+        Returns:
+            Optional[Any]: The first matching entity, or None if there is none.
+
+        Raises:
+            KeyError: If the field is not declared as an index.
+        """
+        where, parameters = self.__where(field_name, value)
+        rows = self.__select(f"WHERE {where} ORDER BY rowid LIMIT 1", parameters)
+        return rows[0] if rows else None
+
+    def find_where(self, criteria: Dict[str, Any]) -> List[Any]:
+        """
+        Returns the entities whose indexed fields equal all the given values.
+
+        Parameters:
+            criteria (Dict[str, Any]): The value of each field, every field being
+                listed in ``indexes``. Enums match their raw value.
+
+        Returns:
+            List[Any]: The matching entities, in insertion order.
+
+        Raises:
+            KeyError: If a field is not declared as an index.
+        """
+        if not criteria:
+            return self.get_all()
+        return list(self.iter_where(criteria))
+
+    def iter_where(self, criteria: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Iterates over the entities matching ``find_where(criteria)``, or over all
+        entities without criteria. Rows are fetched from the cursor in batches as
+        the iteration advances, so the result set is never held in memory.
+
+        Parameters:
+            criteria (Optional[Dict[str, Any]]): The value of each field, every field
+                being listed in ``indexes``.
+
+        Returns:
+            Iterator[Any]: The entities, in insertion order.
+
+        Raises:
+            KeyError: If a field is not declared as an index.
+        """
+        clauses, parameters = [], ()
+        for name, value in (criteria or {}).items():
+            where, values = self.__where(name, value)
+            clauses.append(where)
+            parameters += values
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        columns = ", ".join(f'"{column}"' for column in self.__columns.values())
+        cursor = self.__connection().execute(
+            f'SELECT {columns} FROM "{self.__table}" {where}ORDER BY rowid', parameters
+        )
+        return self.__iter_rows(cursor)
+
+    @property
+    def version(self) -> int:
+        return self.__versions()[1]
+
+    @property
+    def last_modified(self) -> float:
+        return self.__versions()[2]
+
+    def version_tag(
+        self, entity_id: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Returns a tag that changes whenever the table changes, together with the
+        time it last changed. Rows have no versions of their own, so the tag of an
+        entity is the tag of the table.
+
+        Parameters:
+            entity_id (Optional[str]): Accepted for interface compatibility.
+
+        Returns:
+            Optional[Tuple[str, float]]: The tag and modification time.
+        """
+        epoch, version, modified_at = self.__versions()
+        return f"{epoch}-{version}", modified_at
+
+    def create(self, entity: Any, sync: bool = False) -> Any:
+        """
+        Adds a new entity instance.
+
+        Parameters:
+            entity (Any): The entity instance to add.
+            sync (bool): Accepted for interface compatibility; writes are synchronous.
+
+        Returns:
+            Any: The added entity instance.
+        """
+        entity.id = generate_id()
+        columns = ", ".join(f'"{column}"' for column in self.__columns.values())
+        placeholders = ", ".join("?" for _ in self.__columns)
+        self.__connection().execute(
+            f'INSERT INTO "{self.__table}" ({columns}) VALUES ({placeholders})',
+            self.__to_row(entity),
+        )
+        return entity
+
+    def create_many(self, entities: List[Any], sync: bool = False) -> List[Any]:
+        """
+        Adds several new entity instances in one transaction.
+
+        Parameters:
+            entities (List[Any]): The entity instances to add.
+            sync (bool): Accepted for interface compatibility; writes are synchronous.
+
+        Returns:
+            List[Any]: The added entity instances.
+        """
+        for entity in entities:
+            entity.id = generate_id()
+        columns = ", ".join(f'"{column}"' for column in self.__columns.values())
+        placeholders = ", ".join("?" for _ in self.__columns)
+        with self.write_lock():
+            self.__connection().executemany(
+                f'INSERT INTO "{self.__table}" ({columns}) VALUES ({placeholders})',
+                [self.__to_row(entity) for entity in entities],
+            )
+        return entities
+
+    def update(self, entity: Any, sync: bool = False) -> Any:
+        """
+        Persists an entity that was modified in place.
+
+        Parameters:
+            entity (Any): The modified entity instance.
+            sync (bool): Accepted for interface compatibility; writes are synchronous.
+
+        Returns:
+            Any: The updated entity instance.
+        """
+        assignments = ", ".join(f'"{column}" = ?' for column in self.__columns.values())
+        self.__connection().execute(
+            f'UPDATE "{self.__table}" SET {assignments} WHERE "id" = ?',
+            self.__to_row(entity) + (entity.id,),
+        )
+        return entity
+
+    def delete(self, entity_id: str, sync: bool = False) -> Optional[Any]:
+        """
+        Removes an entity instance.
+
+        Parameters:
+            entity_id (str): The ID of the entity to remove.
+            sync (bool): Accepted for interface compatibility; writes are synchronous.
+
+        Returns:
+            Optional[Any]: The removed entity instance, or None if not found.
+        """
+        with self.write_lock():
+            entity = self.get_by_id(entity_id)
+            if entity is not None:
+                self.__connection().execute(
+                    f'DELETE FROM "{self.__table}" WHERE "id" = ?', (entity_id,)
+                )
+        return entity
+
+    def flush(self):
+        """
+        Kept for interface compatibility; every write is already committed.
+        """
+
+    def close(self):
+        """
+        Kept for interface compatibility; there is no background thread to stop.
+        """
+
+    def refresh(self) -> bool:
+        """
+        Kept for interface compatibility; every read sees the committed writes of all
+        processes.
+
+        Returns:
+            bool: Always False.
+        """
+        return False
+
+    @contextmanager
+    def write_lock(self):
+        """
+        Runs the enclosed statements in one immediate write transaction, which
+        excludes the writers of every other thread and process until it ends. The
+        lock is reentrant, also across the repositories of the same database file;
+        nested uses join the outer transaction.
+        """
+        with self.__database.transaction():
+            yield
+
+    def serialize_many(
+        self, entities: Iterable[Any], serializer: Callable[[Any], Any]
+    ) -> List[Any]:
+        """
+        Serializes entities. Kept for interface compatibility: entities read from the
+        database are fresh copies, so there is nothing to cache.
+
+        Parameters:
+            entities (Iterable[Any]): The entities to serialize.
+            serializer (Callable[[Any], Any]): The serializer applied to each entity.
+
+        Returns:
+            List[Any]: The serialized entities, in order.
+        """
+        return [serializer(entity) for entity in entities]
+
+    def save_data(self):
+        """
+        Checkpoints the write-ahead log into the database file. Every write is
+        already committed, so this is never needed for durability.
+        """
+        self.__connection().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def migrate_from_json(self, json_file: str) -> int:
+        """
+        Imports the entities of a JSON data file in a single transaction. Entities
+        whose ID already exists are skipped, so the migration can be re-run safely.
+
+        Parameters:
+            json_file (str): The path to the JSON data file.
+
+        Returns:
+            int: The number of imported entities.
+        """
+        with open(json_file, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        names = {column: name for name, column in self.__columns.items()}
+        entities = []
+        for item in items:
+            data = {names.get(key, key): value for key, value in item.items()}
+            entities.append(self.__cls(**data))
+        columns = ", ".join(f'"{column}"' for column in self.__columns.values())
+        placeholders = ", ".join("?" for _ in self.__columns)
+        connection = self.__connection()
+        with connection:
+            connection.execute("BEGIN")
+            before = connection.total_changes
+            connection.executemany(
+                f'INSERT OR IGNORE INTO "{self.__table}" ({columns}) '
+                f"VALUES ({placeholders})",
+                [self.__to_row(entity) for entity in entities],
+            )
+            return connection.total_changes - before
+
+    def __connection(self) -> sqlite3.Connection:
+        return self.__database.connection()
+
+    def __versions(self) -> Tuple[str, int, float]:
+        return (
+            self.__connection()
+            .execute(
+                'SELECT "epoch", "version", "modified" FROM "versions" WHERE "name" = ?',
+                (self.__table,),
+            )
+            .fetchone()
+        )
+
+    def __create_schema(self):
+        definitions = []
+        for field in fields(self.__cls):
+            column = self.__columns[field.name]
+            if field.name == "id":
+                definitions.append(f'"{column}" TEXT PRIMARY KEY')
+            elif field.type is bool:
+                definitions.append(f'"{column}" INTEGER')
+            elif field.type is float:
+                definitions.append(f'"{column}" REAL')
+            else:
+                definitions.append(f'"{column}" TEXT')
+        connection = self.__connection()
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.__table}" ({", ".join(definitions)})'
+        )
+        # Tables created before a field was added to the entity lack its column.
+        existing = {
+            row[1] for row in connection.execute(f'PRAGMA table_info("{self.__table}")')
+        }
+        for column, definition in zip(self.__columns.values(), definitions):
+            if column not in existing:
+                connection.execute(
+                    f'ALTER TABLE "{self.__table}" ADD COLUMN {definition}'
+                )
+        for index in self.indexes:
+            names = index if isinstance(index, tuple) else (index,)
+            columns = [self.__columns[name] for name in names]
+            quoted = ", ".join(f'"{column}"' for column in columns)
+            connection.execute(
+                f'CREATE INDEX IF NOT EXISTS "idx_{self.__table}_{"_".join(columns)}" '
+                f'ON "{self.__table}" ({quoted})'
+            )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS "versions" ("name" TEXT PRIMARY KEY, '
+            '"epoch" TEXT, "version" INTEGER, "modified" REAL)'
+        )
+        connection.execute(
+            'INSERT OR IGNORE INTO "versions" VALUES (?, ?, 0, '
+            "(julianday('now') - 2440587.5) * 86400.0)",
+            (self.__table, secrets.token_hex(4)),
+        )
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            connection.execute(
+                f'CREATE TRIGGER IF NOT EXISTS "{self.__table}_{event.lower()}_version" '
+                f'AFTER {event} ON "{self.__table}" BEGIN '
+                'UPDATE "versions" SET "version" = "version" + 1, '
+                "\"modified\" = (julianday('now') - 2440587.5) * 86400.0 "
+                f"WHERE \"name\" = '{self.__table}'; END"
+            )
+
+    def __where(self, field_name: Any, value: Any) -> Tuple[str, Tuple[Any, ...]]:
+        if field_name not in self.indexes:
+            raise KeyError(field_name)
+        if isinstance(field_name, tuple):
+            names, values = field_name, value
+        else:
+            names, values = (field_name,), (value,)
+        conditions, parameters = [], []
+        for name, item in zip(names, values):
+            column = self.__columns[name]
+            if item is None:
+                conditions.append(f'"{column}" IS NULL')
+            else:
+                conditions.append(f'"{column}" = ?')
+                parameters.append(self.__to_column(item))
+        return " AND ".join(conditions), tuple(parameters)
+
+    def __select(self, clause: str, parameters: Tuple[Any, ...] = ()) -> List[Any]:
+        columns = ", ".join(f'"{column}"' for column in self.__columns.values())
+        rows = self.__connection().execute(
+            f'SELECT {columns} FROM "{self.__table}" {clause}', parameters
+        )
+        return [self.__from_row(row) for row in rows]
+
+    def __iter_rows(self, cursor: sqlite3.Cursor) -> Iterator[Any]:
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                return
+            for row in rows:
+                yield self.__from_row(row)
+
+    def __from_row(self, row: Tuple[Any, ...]) -> Any:
+        data = dict(zip(self.__columns, row))
+        for name in self.__bool_fields:
+            if data[name] is not None:
+                data[name] = bool(data[name])
+        return self.__cls(**data)
+
+    def __to_row(self, entity: Any) -> Tuple[Any, ...]:
+        return tuple(self.__to_column(getattr(entity, name)) for name in self.__columns)
+
+    @staticmethod
+    def __to_column(value: Any) -> Any:
+        if isinstance(value, Enum):
+            return value.value
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+
+class SQLiteBloqRepository(SQLiteRepository):
+    """
+    A SQLite repository class for managing Bloq entities.
+
+    Inherits from SQLiteRepository.
+    """
+
+    def __init__(self, db_file: str):
+        """
+        Initializes the SQLiteBloqRepository with the given database.
+
+        Parameters:
+            db_file (str): The path to the SQLite database.
+        """
+        super().__init__(db_file, Bloq, "bloqs")
+
+
+class SQLiteLockerRepository(SQLiteRepository):
+    """
+    A SQLite repository class for managing Locker entities.
+
+    Inherits from SQLiteRepository. Lockers are indexed by bloq, occupancy and
+    status, and by bloq and occupancy combined so that a bloq's free lockers are
+    found through one index.
+
+    Methods:
+        select_unoccupied(bloq_id: Optional[str]): Selects an unoccupied locker.
+        claim_unoccupied(bloq_id: Optional[str]): Atomically selects and occupies a locker.
+        compare_and_set_occupied(locker_id: str, expected: bool, occupied: bool, status: LockerStatus):
+            Atomically changes the occupancy of a locker if it has the expected one.
+        get_by_bloq(bloq_id: str): Returns the lockers of a bloq.
+        get_by_occupied(occupied: bool): Returns the lockers with the given occupancy.
+    """
+
+    indexes = ("bloq_id", "is_occupied", "status", ("bloq_id", "is_occupied"))
+
+    def __init__(self, db_file: str):
+        """
+        Initializes the SQLiteLockerRepository with the given database.
+
+        Parameters:
+            db_file (str): The path to the SQLite database.
+        """
+        super().__init__(db_file, Locker, "lockers")
+
+    def select_unoccupied(self, bloq_id: Optional[str] = None) -> Optional[Locker]:
+        """
+        Selects an unoccupied locker.
+
+        Parameters:
+            bloq_id (Optional[str]): The bloq to pick from, or None for any bloq.
+
+        Returns:
+            Optional[Locker]: An unoccupied locker, or None if none are available.
+        """
+        if bloq_id is None:
+            return self.first_by("is_occupied", False)
+        return self.first_by(("bloq_id", "is_occupied"), (bloq_id, False))
+
+    def claim_unoccupied(self, bloq_id: Optional[str] = None) -> Optional[Locker]:
+        """
+        Selects an unoccupied locker and marks it closed and occupied in one write
+        transaction, so concurrent callers, in any process, never claim the same one.
+
+        Parameters:
+            bloq_id (Optional[str]): The bloq to pick from, or None for any bloq.
+
+        Returns:
+            Optional[Locker]: The claimed locker, or None if none are available.
+        """
+        with self.write_lock():
+            locker = self.select_unoccupied(bloq_id)
+            if locker:
+                locker.update_status(LockerStatus.CLOSED, True)
+                self.update(locker)
+        return locker
+
+    def compare_and_set_occupied(
+        self, locker_id: str, expected: bool, occupied: bool, status: LockerStatus
+    ) -> Optional[Locker]:
+        """
+        Sets the occupancy and status of a locker only if its occupancy is still the
+        expected one, as one atomic step.
+
+        Parameters:
+            locker_id (str): The ID of the locker.
+            expected (bool): The occupancy the locker must have.
+            occupied (bool): The new occupancy.
+            status (LockerStatus): The new status.
+
+        Returns:
+            Optional[Locker]: The updated locker, or None if the locker does not exist
+            or its occupancy differs from the expected one.
+        """
+        with self.write_lock():
+            locker = self.get_by_id(locker_id)
+            if locker is None or locker.is_occupied != expected:
+                return None
+            locker.update_status(status, occupied)
+            self.update(locker)
+        return locker
+
+    def get_by_bloq(self, bloq_id: str) -> List[Locker]:
+        """
+        Returns the lockers of a bloq.
+
+        Parameters:
+            bloq_id (str): The ID of the bloq.
+
+        Returns:
+            List[Locker]: The lockers belonging to the bloq.
+        """
+        return self.find_by("bloq_id", bloq_id)
+
+    def get_by_occupied(self, occupied: bool) -> List[Locker]:
+        """
+        Returns the lockers with the given occupancy.
+
+        Parameters:
+            occupied (bool): Whether the lockers are occupied.
+
+        Returns:
+            List[Locker]: The matching lockers.
+        """
+        return self.find_by("is_occupied", occupied)
+
+
+class SQLiteRentRepository(SQLiteRepository):
+    """
+    A SQLite repository class for managing Rent entities.
+
+    Inherits from SQLiteRepository. Rents are indexed by locker, status and size.
+
+    Methods:
+        get_by_locker(locker_id: str): Returns the rents assigned to a locker.
+        get_by_status(status: RentStatus): Returns the rents with the given status.
+        is_archived(rent_id: str) -> bool: Kept for interface compatibility; always False.
+        iter_archived(criteria: Optional[Dict[str, Any]]) -> Iterator[Rent]: Kept for
+            interface compatibility; yields nothing.
+    """
+
+    indexes = ("locker_id", "status", "size")
+
+    def __init__(self, db_file: str):
+        """
+        Initializes the SQLiteRentRepository with the given database.
+
+        Parameters:
+            db_file (str): The path to the SQLite database.
+        """
+        super().__init__(db_file, Rent, "rents")
+
+    def is_archived(self, rent_id: str) -> bool:
+        """
+        Kept for interface compatibility; the SQLite backend does not archive rents.
+
+        Parameters:
+            rent_id (str): Ignored.
+
+        Returns:
+            bool: Always False.
+        """
+        return False
+
+    def iter_archived(
+        self, criteria: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Rent]:
+        """
+        Kept for interface compatibility; the SQLite backend does not archive rents.
+
+        Parameters:
+            criteria (Optional[Dict[str, Any]]): Ignored.
+
+        Returns:
+            Iterator[Rent]: An empty iterator.
+        """
+        return iter(())
+
+    def get_by_locker(self, locker_id: str) -> List[Rent]:
+        """
+        Returns the rents assigned to a locker.
+
+        Parameters:
+            locker_id (str): The ID of the locker.
+
+        Returns:
+            List[Rent]: The rents assigned to the locker.
+        """
+        return self.find_by("locker_id", locker_id)
+
+    def get_by_status(self, status: RentStatus) -> List[Rent]:
+        """
+        Returns the rents with the given status.
+
+        Parameters:
+            status (RentStatus): The rent status, as an enum or its raw value.
+
+        Returns:
+            List[Rent]: The matching rents.
+        """
+        return self.find_by("status", status)
@@ -1,12 +1,179 @@
+import base64
+import binascii
+import json
+import re
+import sys
 import uuid
 
+WHITESPACE = re.compile(r"\s*")
+DELIMITERS = frozenset(", \t\r\n]")
+
 
 def generate_id():
     return str(uuid.uuid4())
 
 
-def select_unoccupied_locker(lockers):
-    for locker in lockers:
-        if not locker.is_occupied:
-            return locker
-    return None
+def intern_value(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def encode_cursor(key):
+    """
+    Encodes the key of a page as an opaque, URL-safe cursor.
+
+    Parameters:
+        key (Tuple): The page key returned by a repository: the ID and position of
+            an entity, preceded by a shard key for sharded repositories.
+
+    Returns:
+        str: The cursor.
+    """
+    data = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor made by ``encode_cursor``.
+
+    Parameters:
+        cursor (str): The cursor.
+
+    Returns:
+        Tuple: The page key, ``(entity_id, position)`` or
+        ``(shard_key, entity_id, position)``.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        *strings, position = json.loads(data)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor.") from e
+    if (
+        len(strings) not in (1, 2)
+        or any(type(string) is not str for string in strings)
+        or type(position) is not int
+    ):
+        raise ValueError("Invalid cursor.")
+    return (*strings, position)
+
+
+def check_page_key(key, size=2):
+    """
+    Checks that a page key decoded from a cursor has the shape a repository
+    expects, since cursors of sharded and unsharded listings differ.
+
+    Parameters:
+        key (Tuple): The page key.
+        size (int): The number of items of the expected key.
+
+    Returns:
+        Tuple: The same key.
+
+    Raises:
+        ValueError: If the key has another number of items.
+    """
+    if len(key) != size:
+        raise ValueError("Invalid cursor.")
+    return key
+
+
+def paginate(entities, limit, after=None):
+    """
+    Returns a page of an ordered list of entities, with the same keys as the
+    ``get_page()`` of repositories: the ID and position of the last entity. The
+    page after a key starts behind that entity, found at its position or else by
+    scanning; if it is gone, the page starts at its former position.
+
+    Parameters:
+        entities (Sequence[Any]): The entities, in a stable order.
+        limit (int): The maximum number of entities to return.
+        after (Optional[Tuple[str, int]]): The key returned with the previous page,
+            or None for the first page.
+
+    Returns:
+        Tuple[List[Any], Optional[Tuple[str, int]]]: The entities, and the key of
+        the next page, or None if this is the last one.
+
+    Raises:
+        ValueError: If ``after`` is not a key of this shape.
+    """
+    start = 0
+    if after is not None:
+        entity_id, position = check_page_key(after)
+        start = min(max(position, 0), len(entities))
+        if start < len(entities) and entities[start].id == entity_id:
+            start += 1
+        else:
+            found = (i for i, entity in enumerate(entities) if entity.id == entity_id)
+            start = next(found, start - 1) + 1
+    page = list(entities[start : start + limit])
+    end = start + len(page)
+    if not page or end >= len(entities):
+        return page, None
+    return page, (page[-1].id, end - 1)
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """
+    Parses a JSON array from a text file item by item, reading it in chunks so
+    that only the item being decoded is held in memory.
+
+    Parameters:
+        file: A text file object positioned at the start of a JSON array.
+        chunk_size (int): The number of characters read at a time.
+
+    Yields:
+        Any: The decoded items of the array.
+
+    Raises:
+        ValueError: If the file does not contain a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position = "", 0
+
+    def fill():
+        nonlocal buffer, position
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return False
+        buffer, position = buffer[position:] + chunk, 0
+        return True
+
+    def peek():
+        nonlocal position
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position < len(buffer):
+                return buffer[position]
+            if not fill():
+                raise ValueError("Unexpected end of JSON array")
+
+    if peek() != "[":
+        raise ValueError("Expected a JSON array")
+    position += 1
+    if peek() == "]":
+        return
+    while True:
+        peek()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not fill():
+                    raise
+                continue
+            # A number cut at a chunk boundary decodes as a shorter number, so only
+            # accept a value once the character after it is visible and delimits it.
+            if buffer[end : end + 1] in DELIMITERS or not fill():
+                break
+        yield item
+        position = end
+        char = peek()
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError(f"Expected ',' or ']' but found {char!r}")
+        position += 1
@@ -0,0 +1,90 @@
+"""
+Measures the memory held per Locker and Rent entity, comparing the slotted,
+interned models in app.models against plain dataclasses with the same fields.
+
+Usage:
+    python -m benchmarks.bench_entity_memory [count]
+"""
+
+import json
+import sys
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.models import Locker, Rent
+
+
+@dataclass
+class PlainRent:
+    id: str = ""
+    locker_id: Optional[str] = field(default=None, metadata={"data_key": "lockerId"})
+    weight: float = 0.0
+    size: str = ""
+    status: str = "CREATED"
+
+
+@dataclass
+class PlainLocker:
+    id: str = ""
+    bloq_id: Optional[str] = field(default=None, metadata={"data_key": "bloqId"})
+    status: str = "OPEN"
+    is_occupied: bool = field(default=False, metadata={"data_key": "isOccupied"})
+
+
+def sample_documents(count):
+    bloq_ids = [str(uuid.uuid4()) for _ in range(max(1, count // 1000))]
+    locker_ids = [str(uuid.uuid4()) for _ in range(max(1, count // 10))]
+    lockers = [
+        {
+            "id": locker_id,
+            "bloq_id": bloq_ids[i % len(bloq_ids)],
+            "status": "CLOSED",
+            "is_occupied": i % 2 == 0,
+        }
+        for i, locker_id in enumerate(locker_ids)
+    ]
+    rents = [
+        {
+            "id": str(uuid.uuid4()),
+            "locker_id": locker_ids[i % len(locker_ids)],
+            "weight": 5.0,
+            "size": "M",
+            "status": "DELIVERED",
+        }
+        for i in range(count)
+    ]
+    return json.dumps(lockers), json.dumps(rents)
+
+
+def bytes_per_entity(cls, text):
+    """
+    Returns the memory retained per entity, strings included, once entities are
+    built from a JSON document and the parsed rows are released, as when loading
+    a data file.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entities = [cls(**row) for row in json.loads(text)]
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held / len(entities)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    locker_document, rent_document = sample_documents(count)
+    print(f"{'entity':<8} {'rows':>8} {'plain B/entity':>15} {'compact B/entity':>17}")
+    for name, plain, compact, document in (
+        ("Locker", PlainLocker, Locker, locker_document),
+        ("Rent", PlainRent, Rent, rent_document),
+    ):
+        plain_bytes = bytes_per_entity(plain, document)
+        compact_bytes = bytes_per_entity(compact, document)
+        count = len(json.loads(document))
+        print(f"{name:<8} {count:>8} {plain_bytes:>15.1f} {compact_bytes:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compares the throughput of rendering GET /lockers response bodies through
+marshmallow and jsonify, as the endpoint did before, against the compiled
+serializers: compiled dumps still encoded by jsonify, and the compiled JSON text
+that list endpoints join, cold and with the repository's cache warm. Every path
+is checked to produce the same bytes.
+
+Usage:
+    python -m benchmarks.bench_serialization [count ...]
+"""
+
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+from flask import Flask, jsonify
+
+from app.repositories import LockerRepository
+from app.schemas import LockerSchema, compile_json_serializer, compile_serializer
+
+RUNS = 5
+
+
+def write_lockers(path, count):
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "bloqId": str(uuid.uuid4()),
+            "status": "OPEN" if position % 3 else "CLOSED",
+            "isOccupied": position % 2 == 0,
+        }
+        for position in range(count)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=4)
+
+
+def best_ms(render):
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        body = render()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), body
+
+
+def measure(count, directory):
+    path = os.path.join(directory, "lockers.json")
+    write_lockers(path, count)
+    repository = LockerRepository(path)
+    lockers = repository.get_all()
+    schema = LockerSchema()
+    dump = compile_serializer(schema)
+    to_json = compile_json_serializer(schema)
+
+    def marshmallow():
+        return jsonify(LockerSchema(many=True).dump(lockers)).get_data()
+
+    def compiled():
+        return jsonify([dump(locker) for locker in lockers]).get_data()
+
+    def compiled_text_cold():
+        # A serializer compiled afresh for each run has no cached JSON text yet.
+        fresh = compile_json_serializer(schema)
+        texts = repository.serialize_many(repository.get_all(), fresh)
+        return ("[" + ",".join(texts) + "]\n").encode()
+
+    def compiled_text_warm():
+        texts = repository.serialize_many(repository.get_all(), to_json)
+        return ("[" + ",".join(texts) + "]\n").encode()
+
+    compiled_text_warm()
+    results = []
+    expected = None
+    for render in (marshmallow, compiled, compiled_text_cold, compiled_text_warm):
+        milliseconds, body = best_ms(render)
+        expected = expected or body
+        if body != expected:
+            raise AssertionError(f"{render.__name__} renders different bytes")
+        results.append(milliseconds)
+    return results
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    directory = tempfile.mkdtemp()
+    app = Flask(__name__)
+    try:
+        with app.app_context():
+            print(
+                f"{'rows':>8} {'marshmallow ms':>15} {'compiled ms':>12}"
+                f" {'text cold ms':>13} {'text warm ms':>13} {'rows/s warm':>12}"
+            )
+            for count in counts:
+                slow, compiled, cold, warm = measure(count, directory)
+                print(
+                    f"{count:>8} {slow:>15.1f} {compiled:>12.1f}"
+                    f" {cold:>13.1f} {warm:>13.1f} {count / warm * 1000:>12.0f}"
+                )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
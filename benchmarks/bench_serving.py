@@ -0,0 +1,206 @@
+"""
+Load-tests the application served over WSGI by a pool of worker threads, as a
+threaded WSGI server does, against the ASGI mode of ``app/asgi.py`` with a
+handler pool of the same size. Closed-loop clients send a mix of rent lookups,
+paginated locker lists and rent creations, which rewrite the rents data file.
+
+The servers are driven in-process, without sockets, so the numbers compare the
+serving models rather than an HTTP stack. ``--client-delay-ms`` simulates the time
+a client takes to upload its request: a WSGI worker thread waits for it, while
+the ASGI mode awaits it on the event loop without holding a handler thread.
+Request logging is disabled during the runs.
+
+Usage:
+    python -m benchmarks.bench_serving [--rents N] [--requests N] [--clients N]
+        [--workers N] [--client-delay-ms MS ...]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from app.asgi import create_asgi_app
+
+
+def write_data(directory, count):
+    lockers = [
+        {"id": str(uuid.uuid4()), "bloqId": "b1", "status": "OPEN", "isOccupied": False}
+        for _ in range(200)
+    ]
+    rents = [
+        {
+            "id": str(uuid.uuid4()),
+            "lockerId": None,
+            "weight": 5,
+            "size": "M",
+            "status": "CREATED",
+        }
+        for _ in range(count)
+    ]
+    rows = {
+        "bloqs.json": [{"id": "b1", "title": "Bloq", "address": "Street"}],
+        "lockers.json": lockers,
+        "rents.json": rents,
+    }
+    for name, items in rows.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            json.dump(items, f, indent=4)
+    return [rent["id"] for rent in rents]
+
+
+def workload(rent_ids, total):
+    """Returns the (method, path, query, body) of each request, in order."""
+    body = json.dumps({"weight": 3, "size": "S"}).encode()
+    requests = []
+    for position in range(total):
+        if position % 10 == 0:
+            requests.append(("POST", "/api/rents/rent", "", body))
+        elif position % 2:
+            rent_id = rent_ids[position % len(rent_ids)]
+            requests.append(("GET", f"/api/rents/{rent_id}", "", b""))
+        else:
+            requests.append(("GET", "/api/lockers", "limit=50", b""))
+    return requests
+
+
+def summarize(latencies, elapsed):
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return len(latencies) / elapsed, statistics.median(latencies), p99
+
+
+def run_wsgi(flask_app, requests, clients, workers, delay):
+    pool = ThreadPoolExecutor(max_workers=workers)
+    latencies = []
+    lock = threading.Lock()
+
+    def handle(method, path, query, body):
+        time.sleep(delay)
+        environ = EnvironBuilder(
+            path=path,
+            method=method,
+            query_string=query,
+            data=body,
+            content_type="application/json",
+        ).get_environ()
+        _, status, _ = run_wsgi_app(flask_app, environ, buffered=True)
+        if not status.startswith(("200", "201")):
+            raise AssertionError(f"{method} {path}: {status}")
+
+    def client(assigned):
+        for request in assigned:
+            started = time.perf_counter()
+            pool.submit(handle, *request).result()
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    threads = [
+        threading.Thread(target=client, args=(requests[index::clients],))
+        for index in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return summarize(latencies, elapsed)
+
+
+async def run_asgi(asgi_app, requests, clients, delay):
+    latencies = []
+
+    async def call(method, path, query, body):
+        received = []
+
+        async def receive():
+            if received:
+                return {"type": "http.disconnect"}
+            await asyncio.sleep(delay)
+            received.append(True)
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        statuses = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": query.encode(),
+            "headers": [(b"content-type", b"application/json")],
+            "http_version": "1.1",
+            "scheme": "http",
+        }
+        await asgi_app(scope, receive, send)
+        if statuses[0] not in (200, 201):
+            raise AssertionError(f"{method} {path}: {statuses[0]}")
+
+    async def client(assigned):
+        for request in assigned:
+            started = time.perf_counter()
+            await call(*request)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client(requests[index::clients]) for index in range(clients))
+    )
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def measure(options, delay_ms, directory):
+    rent_ids = write_data(directory, options.rents)
+    requests = workload(rent_ids, options.requests)
+    delay = delay_ms / 1000
+    asgi_app = create_asgi_app({"DATA_DIR": directory}, options.workers)
+    logging.disable(logging.CRITICAL)
+    # Loads the repositories before timing.
+    run_wsgi(asgi_app.flask_app, requests[:10], 1, 1, 0)
+    wsgi = run_wsgi(
+        asgi_app.flask_app, requests, options.clients, options.workers, delay
+    )
+    asgi = asyncio.run(run_asgi(asgi_app, requests, options.clients, delay))
+    return wsgi, asgi
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rents", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--client-delay-ms", type=float, nargs="+", default=[0.0, 5.0, 20.0]
+    )
+    options = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        print(f"{'delay ms':>8} {'mode':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for delay_ms in options.client_delay_ms:
+            results = measure(options, delay_ms, directory)
+            for mode, (rate, p50, p99) in zip(("wsgi", "asgi"), results):
+                print(
+                    f"{delay_ms:>8.1f} {mode:>5} {rate:>8.0f} {p50:>8.1f} {p99:>8.1f}"
+                )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Measures the startup cost of the application in a fresh interpreter: importing
+the app package, creating the application, and serving the first and second
+requests. Repositories are built on first use, so loading the data shows up in
+the first request that needs it rather than in the import or create_app.
+
+Usage:
+    python -m benchmarks.bench_startup [count ...]
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+client = application.test_client()
+client.get("/api/bloqs")
+first_bloqs = time.perf_counter()
+client.get("/api/rents")
+first_rents = time.perf_counter()
+client.get("/api/rents")
+second_rents = time.perf_counter()
+print(json.dumps([
+    imported - started,
+    created - imported,
+    first_bloqs - created,
+    first_rents - first_bloqs,
+    second_rents - first_rents,
+]))
+"""
+
+
+def write_data(directory, count):
+    rows = {
+        "bloqs.json": [{"id": "b1", "title": "Bloq", "address": "Street"}],
+        "lockers.json": [
+            {"id": "l1", "bloqId": "b1", "status": "OPEN", "isOccupied": False}
+        ],
+        "rents.json": [
+            {
+                "id": str(uuid.uuid4()),
+                "lockerId": None,
+                "weight": 5,
+                "size": "M",
+                "status": "CREATED",
+            }
+            for _ in range(count)
+        ],
+    }
+    for name, items in rows.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            json.dump(items, f, indent=4)
+
+
+def measure(count, directory):
+    write_data(directory, count)
+    environment = dict(os.environ, BLOQIT_DATA_DIR=directory)
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        env=environment,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return [seconds * 1000 for seconds in json.loads(output.splitlines()[-1])]
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [1_000, 100_000]
+    directory = tempfile.mkdtemp()
+    try:
+        print(
+            f"{'rents':>8} {'import ms':>10} {'create ms':>10} {'bloqs ms':>9}"
+            f" {'1st rents ms':>13} {'2nd rents ms':>13}"
+        )
+        for count in counts:
+            imported, created, bloqs, first, second = measure(count, directory)
+            print(
+                f"{count:>8} {imported:>10.1f} {created:>10.1f} {bloqs:>9.1f}"
+                f" {first:>13.1f} {second:>13.1f}"
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Measures the latency of persisting a single-entity update as the dataset grows,
+comparing a full re-serialization of every row against the repository, whose
+cache only re-serializes the entities that changed. The cost of dumping the
+whole list through RentSchema, as GET /rents does, is shown cold and warm.
+
+Usage:
+    python -m benchmarks.bench_write_latency [count ...]
+"""
+
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import asdict
+
+from app.repositories import RentRepository
+from app.schemas import RentSchema
+
+UPDATES = 20
+
+
+def write_rents(path, count):
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "lockerId": None,
+            "weight": 5,
+            "size": "M",
+            "status": "CREATED",
+        }
+        for _ in range(count)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=4)
+
+
+def full_rewrite(repository, path):
+    # What every write cost before the cache: asdict per row, then json.dump.
+    items = [asdict(rent) for rent in repository.get_all()]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=4)
+
+
+def milliseconds(action):
+    started = time.perf_counter()
+    action()
+    return (time.perf_counter() - started) * 1000
+
+
+def measure(count, directory):
+    path = os.path.join(directory, "rents.json")
+    write_rents(path, count)
+    repository = RentRepository(path)
+    rents = repository.get_all()
+
+    full = statistics.median(
+        milliseconds(lambda: full_rewrite(repository, path)) for _ in range(3)
+    )
+    cold = milliseconds(lambda: repository.update(rents[0]))
+    warm = []
+    for position in range(1, UPDATES + 1):
+        rent = rents[position * (count // (UPDATES + 1))]
+        rent.update_status("DELIVERED")
+        warm.append(milliseconds(lambda: repository.update(rent)))
+
+    dump = RentSchema().dump
+    list_cold = milliseconds(lambda: repository.serialize_many(rents, dump))
+    list_warm = milliseconds(lambda: repository.serialize_many(rents, dump))
+    return full, cold, statistics.median(warm), list_cold, list_warm
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    directory = tempfile.mkdtemp()
+    try:
+        print(
+            f"{'rows':>8} {'full ms':>9} {'first ms':>9} {'update ms':>10}"
+            f" {'list cold ms':>13} {'list warm ms':>13}"
+        )
+        for count in counts:
+            full, cold, warm, list_cold, list_warm = measure(count, directory)
+            print(
+                f"{count:>8} {full:>9.1f} {cold:>9.1f} {warm:>10.1f}"
+                f" {list_cold:>13.1f} {list_warm:>13.1f}"
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
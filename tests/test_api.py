@@ -1,11 +1,39 @@
 import unittest
+import asyncio
+import gzip
 import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+import uuid
 from app import create_app
+from app.asgi import create_asgi_app
+from app.container import current_services
+from app.response_cache import ResponseCache
+from app.models import Rent, RentStatus
+from app.utils import encode_cursor
+from marshmallow import ValidationError, fields, validate
+from app.schemas import (
+    LockerSchema,
+    LockerSchemaPatch,
+    RentCreateSchema,
+    RentSchema,
+    RentSchemaPatch,
+    compile_loader,
+    compile_serializer,
+    validate_locker_status,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 
 
 class APITestCase(unittest.TestCase):
     def setUp(self):
-        self.app = create_app()
+        self.data_dir = tempfile.mkdtemp()
+        for name in ("bloqs.json", "lockers.json", "rents.json"):
+            shutil.copy(os.path.join(DATA_DIR, name), self.data_dir)
+        self.app = create_app({"DATA_DIR": self.data_dir})
         self.client = self.app.test_client()
         self.app.config["TESTING"] = True
 
@@ -18,6 +46,20 @@ class APITestCase(unittest.TestCase):
         }
         self.sample_rent = {"weight": 10.5, "size": "M"}
 
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_repositories_are_built_on_first_use(self):
+        with self.app.app_context():
+            services = current_services()
+            self.assertEqual(services.loaded_repositories(), [])
+            self.client.get("/api/bloqs")
+            self.assertEqual(services.loaded_repositories(), [services.bloq_repository])
+            self.client.get("/api/rents")
+            self.assertEqual(len(services.loaded_repositories()), 3)
+        with open(os.path.join(self.data_dir, "bloqs.json")) as f:
+            self.assertEqual(len(json.load(f)), len(services.bloq_service.get_all()))
+
     def test_get_bloqs(self):
         response = self.client.get("/api/bloqs")
         self.assertEqual(response.status_code, 200)
@@ -105,6 +147,364 @@ class APITestCase(unittest.TestCase):
         response = self.client.get("/api/rents")
         self.assertEqual(response.status_code, 200)
 
+    def test_get_rents_in_pages(self):
+        everything = self.client.get("/api/rents").get_json()
+        items, cursor = [], None
+        while True:
+            query = f"?limit=3&cursor={cursor}" if cursor else "?limit=3"
+            response = self.client.get(f"/api/rents{query}")
+            self.assertEqual(response.status_code, 200)
+            page = response.get_json()
+            self.assertLessEqual(len(page["items"]), 3)
+            items.extend(page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(items, everything)
+
+        sharded_cursor = encode_cursor(("_unassigned", "r1", 0))
+        for query in (
+            "?limit=0",
+            "?limit=abc",
+            "?cursor=not-a-cursor",
+            f"?cursor={sharded_cursor}",
+            f"?cursor={sharded_cursor}&status=OPEN",
+        ):
+            response = self.client.get(f"/api/lockers{query}")
+            self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        response = self.client.get("/api/lockers")
+        etag = response.headers["ETag"]
+        self.assertIn("Last-Modified", response.headers)
+
+        response = self.client.get("/api/lockers", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+        locker = self.client.get("/api/lockers").get_json()[0]
+        detail = self.client.get(f"/api/lockers/{locker['id']}")
+        self.client.patch(
+            f"/api/lockers/{locker['id']}/status",
+            data=json.dumps({"status": "CLOSED", "is_occupied": True}),
+            content_type="application/json",
+        )
+        response = self.client.get("/api/lockers", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        response = self.client.get(
+            f"/api/lockers/{locker['id']}",
+            headers={"If-None-Match": detail.headers["ETag"]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["status"], "CLOSED")
+
+        response = self.client.get("/api/lockers/missing")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response.headers)
+
+    def test_response_cache(self):
+        with self.app.app_context():
+            cache = current_services().response_cache
+        first = self.client.get("/api/rents?status=CREATED")
+        self.assertEqual(first.headers["X-Cache"], "MISS")
+        second = self.client.get("/api/rents?status=CREATED")
+        self.assertEqual(second.headers["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+        self.assertEqual(cache.stats()["hits"], 1)
+
+        # Another query of the same route is cached separately.
+        other = self.client.get("/api/rents?status=DELIVERED")
+        self.assertEqual(other.headers["X-Cache"], "MISS")
+
+        self.client.post(
+            "/api/rents/rent",
+            data=json.dumps(self.sample_rent),
+            content_type="application/json",
+        )
+        third = self.client.get("/api/rents?status=CREATED")
+        self.assertEqual(third.headers["X-Cache"], "MISS")
+        self.assertEqual(len(third.get_json()), len(first.get_json()) + 1)
+        self.assertEqual(cache.stats()["misses"], 3)
+
+    def test_response_cache_is_bounded(self):
+        cache = ResponseCache(max_bytes=10)
+        cache.put("a", "t1", b"12345", "application/json")
+        cache.put("b", "t1", b"12345", "application/json")
+        self.assertEqual(cache.get("a", "t1"), (b"12345", "application/json"))
+        cache.put("c", "t1", b"123", "application/json")
+        # "b" was the least recently used entry.
+        self.assertIsNone(cache.get("b", "t1"))
+        self.assertIsNone(cache.get("a", "t2"))
+        cache.put("d", "t1", b"12345678901", "application/json")
+        self.assertEqual(cache.stats()["bytes"], 8)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_archived_rents_cannot_be_changed(self):
+        rent_id = "feb72a9a-258d-49c9-92de-f90b1f11984d"
+        with self.app.app_context():
+            current_services().rent_repository.archive_delivered()
+        response = self.client.patch(
+            f"/api/rents/{rent_id}/status", json={"status": "WAITING_PICKUP"}
+        )
+        self.assertEqual(response.status_code, 409)
+        locker_id = self.client.post(
+            "/api/lockers", json=self.sample_locker
+        ).get_json()["id"]
+        response = self.client.patch(
+            f"/api/rents/{rent_id}/assign", json={"locker_id": locker_id}
+        )
+        self.assertEqual(response.status_code, 409)
+        # The locker was not occupied and the rent stays archived only.
+        self.assertFalse(
+            self.client.get(f"/api/lockers/{locker_id}").get_json()["is_occupied"]
+        )
+        self.assertNotIn(
+            rent_id, [rent["id"] for rent in self.client.get("/api/rents").get_json()]
+        )
+        with open(os.path.join(self.data_dir, "rents.json"), encoding="utf-8") as f:
+            self.assertNotIn(rent_id, [item["id"] for item in json.load(f)])
+        response = self.client.get("/api/rents/export?archived=true")
+        ids = [json.loads(line)["id"] for line in response.data.decode().splitlines()]
+        self.assertEqual(ids.count(rent_id), 1)
+        self.assertEqual(self.client.get(f"/api/rents/{rent_id}").status_code, 200)
+
+    def test_compression(self):
+        app = create_app(
+            {
+                "DATA_DIR": self.data_dir,
+                "COMPRESSION": True,
+                "COMPRESSION_MIN_BYTES": 512,
+            }
+        )
+        client = app.test_client()
+        plain = client.get("/api/lockers")
+        self.assertGreater(len(plain.data), 512)
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertEqual(plain.headers["Vary"], "Accept-Encoding")
+
+        first = client.get("/api/lockers", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(first.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(first.data), plain.data)
+        self.assertTrue(first.headers["ETag"].startswith("W/"))
+
+        # The compressed variant is cached with the body, and the weak tag still
+        # answers conditional requests.
+        with app.app_context():
+            cache = current_services().response_cache
+            self.assertIsNotNone(
+                cache.get_encoded(("/api/lockers", ()), first.get_etag()[0], "gzip")
+            )
+        second = client.get("/api/lockers", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(second.data, first.data)
+        not_modified = client.get(
+            "/api/lockers",
+            headers={
+                "Accept-Encoding": "gzip",
+                "If-None-Match": first.headers["ETag"],
+            },
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+        refused = client.get("/api/lockers", headers={"Accept-Encoding": "gzip;q=0"})
+        self.assertNotIn("Content-Encoding", refused.headers)
+
+        # Bodies below the threshold are sent as they are.
+        small = client.get(
+            f"/api/bloqs/{self.sample_locker['bloq_id']}",
+            headers={"Accept-Encoding": "gzip"},
+        )
+        self.assertEqual(small.status_code, 200)
+        self.assertNotIn("Content-Encoding", small.headers)
+
+    def test_compression_is_opt_in(self):
+        response = self.client.get("/api/lockers", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_response_cache_stores_encoded_variants(self):
+        cache = ResponseCache(max_bytes=16)
+        cache.put("a", "t1", b"12345", "application/json")
+        cache.put_encoded("a", "t1", "gzip", b"123")
+        self.assertEqual(cache.get_encoded("a", "t1", "gzip"), b"123")
+        self.assertIsNone(cache.get_encoded("a", "t2", "gzip"))
+        # Variants of stale or missing entries are not stored.
+        cache.put_encoded("a", "t2", "br", b"12")
+        cache.put_encoded("b", "t1", "gzip", b"12")
+        self.assertEqual(cache.stats()["bytes"], 8)
+        # Replacing the body drops its variants.
+        cache.put("a", "t2", b"1234", "application/json")
+        self.assertIsNone(cache.get_encoded("a", "t2", "gzip"))
+        self.assertEqual(cache.stats()["bytes"], 4)
+
+    def test_compiled_serializers_match_marshmallow(self):
+        def jsonify_bytes(data):
+            return (
+                json.dumps(data, sort_keys=True, separators=(",", ":")) + "\n"
+            ).encode()
+
+        with self.app.app_context():
+            lockers = list(current_services().locker_service.get_all())
+            rents = list(current_services().rent_service.get_all())
+        self.assertEqual(
+            self.client.get("/api/lockers").data,
+            jsonify_bytes(LockerSchema(many=True).dump(lockers)),
+        )
+        self.assertEqual(
+            self.client.get("/api/rents?limit=2").data,
+            jsonify_bytes(
+                {
+                    "items": RentSchema(many=True).dump(rents[:2]),
+                    "next_cursor": self.client.get("/api/rents?limit=2").get_json()[
+                        "next_cursor"
+                    ],
+                }
+            ),
+        )
+        self.assertEqual(
+            self.client.get(f"/api/rents/{rents[0].id}").data,
+            jsonify_bytes(RentSchema().dump(rents[0])),
+        )
+
+        dump = compile_serializer(RentSchema())
+        for rent in (Rent(weight=5, size="M"), Rent(weight=2.5, locker_id="\u00e9")):
+            self.assertEqual(dump(rent), RentSchema().dump(rent))
+        self.assertEqual(
+            dump({"id": "r1", "weight": 1}),
+            RentSchema().dump({"id": "r1", "weight": 1}),
+        )
+
+    def test_compiled_loaders_match_marshmallow(self):
+        def outcome(load, data):
+            try:
+                return load(data)
+            except ValidationError as err:
+                return err.messages, err.valid_data
+
+        inputs = [
+            {"weight": 10.5, "size": "M"},
+            {"weight": 10, "size": "M"},
+            {"weight": "10.5", "size": "M"},
+            {"weight": True, "size": "M"},
+            {"weight": float("nan"), "size": "M"},
+            {"weight": 10, "size": "XXL"},
+            {"size": "M"},
+            {"weight": 10, "size": "M", "status": "DELIVERED"},
+            [],
+        ]
+        load = compile_loader(RentCreateSchema())
+        for data in inputs:
+            self.assertEqual(
+                outcome(load, data), outcome(RentCreateSchema().load, data)
+            )
+
+        load = compile_loader(RentSchemaPatch())
+        for status in [member.value for member in RentStatus] + ["LOST", 1]:
+            data = {"status": status}
+            self.assertEqual(outcome(load, data), outcome(RentSchemaPatch().load, data))
+
+        class CappedLockerSchema(LockerSchema):
+            bloq_id = fields.Str(
+                required=True, validate=[validate.Length(max=3), validate_locker_status]
+            )
+
+        load = compile_loader(CappedLockerSchema())
+        for bloq_id in ("OPEN", "SHUT", "CLOSED", "b1"):
+            data = {"bloq_id": bloq_id, "status": "OPEN", "is_occupied": False}
+            self.assertEqual(
+                outcome(load, data), outcome(CappedLockerSchema().load, data)
+            )
+
+        locker = self.client.get("/api/lockers").get_json()[0]
+        for body in (
+            {"status": "SHUT", "is_occupied": True},
+            {"status": "OPEN", "is_occupied": "maybe"},
+            {"status": "OPEN"},
+        ):
+            response = self.client.patch(
+                f"/api/lockers/{locker['id']}/status",
+                data=json.dumps(body),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(
+                response.get_json(), outcome(LockerSchemaPatch().load, body)[0]
+            )
+
+    def test_export_rents(self):
+        response = self.client.get("/api/rents/export")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = response.data.decode().splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            self.client.get("/api/rents").get_json(),
+        )
+
+        response = self.client.get("/api/rents/export?status=DELIVERED")
+        delivered = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(len(delivered), 1)
+
+        with self.app.app_context():
+            current_services().rent_repository.archive_delivered()
+        response = self.client.get("/api/rents/export?status=DELIVERED")
+        self.assertEqual(response.data, b"")
+        response = self.client.get("/api/rents/export?status=DELIVERED&archived=true")
+        archived = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(archived, delivered)
+
+        response = self.client.get("/api/lockers/export?status=SHUT")
+        self.assertEqual(response.status_code, 400)
+
+    def test_filter_lockers_and_rents(self):
+        bloq_id = self.sample_locker["bloq_id"]
+        lockers = self.client.get("/api/lockers").get_json()
+        expected = [
+            l for l in lockers if l["bloq_id"] == bloq_id and not l["is_occupied"]
+        ]
+        response = self.client.get(f"/api/lockers?bloq_id={bloq_id}&is_occupied=false")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), expected)
+
+        response = self.client.get("/api/rents?status=DELIVERED&limit=1")
+        page = response.get_json()
+        self.assertTrue(all(r["status"] == "DELIVERED" for r in page["items"]))
+
+        for query in ("status=LOST", "size=XXL"):
+            self.assertEqual(self.client.get(f"/api/rents?{query}").status_code, 400)
+        self.assertEqual(
+            self.client.get("/api/lockers?is_occupied=maybe").status_code, 400
+        )
+
+    def test_bulk_create(self):
+        lockers = [self.sample_locker, dict(self.sample_locker, status="AJAR")]
+        response = self.client.post("/api/lockers/bulk", json=lockers)
+        self.assertEqual(response.status_code, 207)
+        body = response.get_json()
+        self.assertEqual((body["created"], body["failed"]), (1, 1))
+        created, failed = body["results"]
+        self.assertEqual(created["status"], 201)
+        locker_id = created["data"]["id"]
+        response = self.client.get(f"/api/lockers/{locker_id}")
+        self.assertEqual(response.get_json(), created["data"])
+        self.assertEqual(
+            failed, {"status": 400, "errors": {"status": ["Invalid LockerStatus."]}}
+        )
+
+        response = self.client.post("/api/rents/bulk", json=[self.sample_rent] * 3)
+        self.assertEqual(response.status_code, 201)
+        results = response.get_json()["results"]
+        self.assertEqual([r["data"]["size"] for r in results], ["M"] * 3)
+        for result in results:
+            response = self.client.get(f"/api/rents/{result['data']['id']}")
+            self.assertEqual(response.get_json(), result["data"])
+
+        response = self.client.post("/api/bloqs/bulk", json=self.sample_bloq)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/api/bloqs/bulk", json=[self.sample_bloq] * 1001)
+        self.assertEqual(response.status_code, 400)
+
     def test_create_rent(self):
         response = self.client.post(
             "/api/rents/rent",
@@ -183,6 +583,319 @@ class APITestCase(unittest.TestCase):
         self.assertEqual(data["id"], rent_id)
         self.assertEqual(data["locker_id"], payload["locker_id"])
 
+        # The locker is now occupied and cannot be assigned again
+        response = self.client.post(
+            "/api/rents/rent",
+            data=json.dumps(self.sample_rent),
+            content_type="application/json",
+        )
+        other_rent_id = json.loads(response.data.decode())["id"]
+        response = self.client.patch(
+            f"/api/rents/{other_rent_id}/assign",
+            data=json.dumps(payload),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 409)
+
+
+class SQLiteAPITestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        for name in ("bloqs.json", "lockers.json", "rents.json"):
+            shutil.copy(os.path.join(DATA_DIR, name), self.data_dir)
+        self.app = create_app(
+            {
+                "DATA_DIR": self.data_dir,
+                "STORAGE_ENGINE": "sqlite",
+                "SQLITE_DATABASE": os.path.join(self.data_dir, "bloqit.db"),
+            }
+        )
+        self.app.test_cli_runner().invoke(args=["migrate-sqlite"])
+        self.client = self.app.test_client()
+
+    def test_assign_locker_to_rent(self):
+        rent_id = self.client.post(
+            "/api/rents/rent", json={"weight": 10.5, "size": "M"}
+        ).get_json()["id"]
+        locker_id = self.client.post(
+            "/api/lockers",
+            json={
+                "bloq_id": "484e01be-1570-4ac1-a2a9-02aad3acc54e",
+                "status": "OPEN",
+                "is_occupied": False,
+            },
+        ).get_json()["id"]
+
+        response = self.client.patch(
+            f"/api/rents/{rent_id}/assign", json={"locker_id": locker_id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["locker_id"], locker_id)
+        locker = self.client.get(f"/api/lockers/{locker_id}").get_json()
+        self.assertTrue(locker["is_occupied"])
+
+        other_rent_id = self.client.post(
+            "/api/rents/rent", json={"weight": 1, "size": "S"}
+        ).get_json()["id"]
+        response = self.client.patch(
+            f"/api/rents/{other_rent_id}/assign", json={"locker_id": locker_id}
+        )
+        self.assertEqual(response.status_code, 409)
+        # The failed assignment is rolled back with its transaction.
+        other_rent = self.client.get(f"/api/rents/{other_rent_id}").get_json()
+        self.assertIsNone(other_rent["locker_id"])
+
+    def test_archive_rents_is_rejected(self):
+        result = self.app.test_cli_runner().invoke(args=["archive-rents"])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Archiving is not supported by the sqlite engine", result.output)
+
+        app = create_app(dict(self.app.config, ARCHIVE_AFTER_DAYS=30))
+        with app.app_context(), self.assertLogs(level="WARNING") as logs:
+            current_services().rent_repository
+        self.assertIn("ARCHIVE_AFTER_DAYS is ignored", logs.output[0])
+
+
+class ExportMemoryTestCase(unittest.TestCase):
+    def export_peak_memory(self, count):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        for name in ("bloqs.json", "lockers.json"):
+            shutil.copy(os.path.join(DATA_DIR, name), data_dir)
+        rents = [
+            {
+                "id": str(uuid.uuid4()),
+                "lockerId": None,
+                "weight": 5,
+                "size": "M",
+                "status": "CREATED",
+            }
+            for _ in range(count)
+        ]
+        with open(os.path.join(data_dir, "rents.json"), "w") as f:
+            json.dump(rents, f)
+        del rents
+        app = create_app({"DATA_DIR": data_dir})
+        client = app.test_client()
+        # Load the rents before measuring; only the export itself is measured.
+        client.get("/api/rents?limit=1")
+        with app.app_context():
+            current_services().rent_repository.get_all()
+
+        tracemalloc.start()
+        try:
+            response = client.get("/api/rents/export", buffered=False)
+            lines = sum(chunk.count(b"\n") for chunk in response.iter_encoded())
+            response.close()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(lines, count)
+        return peak
+
+    def test_export_memory_stays_flat(self):
+        small = self.export_peak_memory(2_000)
+        large = self.export_peak_memory(20_000)
+        self.assertLess(large, small * 1.5)
+
+
+class AsgiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        for name in ("bloqs.json", "lockers.json", "rents.json"):
+            shutil.copy(os.path.join(DATA_DIR, name), self.data_dir)
+        self.app = create_asgi_app({"DATA_DIR": self.data_dir}, max_workers=2)
+
+    def call(self, method, path, body=b"", query=b""):
+        return asyncio.run(self.request(self.app, method, path, body, query))
+
+    async def request(self, app, method, path, body=b"", query=b""):
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": query,
+            "headers": [(b"content-type", b"application/json")],
+            "http_version": "1.1",
+            "scheme": "http",
+        }
+        await app(scope, receive, send)
+        self.assertFalse(sent[-1].get("more_body", False))
+        return sent[0], b"".join(message.get("body", b"") for message in sent[1:])
+
+    def test_asgi_matches_wsgi(self):
+        client = self.app.flask_app.test_client()
+        for path, query in (("/api/bloqs", b""), ("/api/lockers", b"limit=2")):
+            start, body = self.call("GET", path, query=query)
+            self.assertEqual(start["status"], 200)
+            self.assertIn((b"content-type", b"application/json"), start["headers"])
+            self.assertEqual(body, client.get(path, query_string=query.decode()).data)
+
+    def test_asgi_writes_and_streams(self):
+        start, body = self.call(
+            "POST", "/api/rents/rent", json.dumps({"weight": 2, "size": "S"}).encode()
+        )
+        self.assertEqual(start["status"], 201)
+        rent_id = json.loads(body)["id"]
+        start, body = self.call("GET", "/api/rents/export")
+        self.assertEqual(start["status"], 200)
+        ids = [json.loads(line)["id"] for line in body.decode().splitlines()]
+        self.assertIn(rent_id, ids)
+
+    def test_asgi_streams_sqlite_export_on_one_thread(self):
+        app = create_asgi_app(
+            {
+                "DATA_DIR": self.data_dir,
+                "STORAGE_ENGINE": "sqlite",
+                "SQLITE_DATABASE": os.path.join(self.data_dir, "bloqit.db"),
+            },
+            max_workers=3,
+        )
+        app.flask_app.test_cli_runner().invoke(args=["migrate-sqlite"])
+
+        async def export_concurrently():
+            return await asyncio.gather(
+                *(self.request(app, "GET", "/api/rents/export") for _ in range(6))
+            )
+
+        for start, body in asyncio.run(export_concurrently()):
+            self.assertEqual(start["status"], 200)
+            self.assertEqual(len(body.decode().splitlines()), 4)
+
+    def test_asgi_supports_the_write_callable(self):
+        def legacy_app(environ, start_response):
+            write = start_response("200 OK", [("Content-Type", "text/plain")])
+            write(b"hello")
+            return [b" world"]
+
+        self.app.flask_app.wsgi_app = legacy_app
+        start, body = self.call("GET", "/")
+        self.assertEqual(start["status"], 200)
+        self.assertEqual(body, b"hello world")
+
+    def test_asgi_stops_producing_abandoned_responses(self):
+        closed = []
+
+        def endless_app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/plain")])
+
+            def chunks():
+                try:
+                    while True:
+                        yield b"chunk"
+                finally:
+                    closed.append(True)
+
+            return chunks()
+
+        self.app.flask_app.wsgi_app = endless_app
+
+        async def disconnect_after_first_chunk():
+            async def receive():
+                return {"type": "http.request", "body": b""}
+
+            async def send(message):
+                if message["type"] == "http.response.body":
+                    raise ConnectionResetError()
+
+            scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+            with self.assertRaises(ConnectionResetError):
+                await self.app(scope, receive, send)
+
+        # More abandoned responses than worker threads: none keeps its thread.
+        for _ in range(3):
+            asyncio.run(disconnect_after_first_chunk())
+        self.assertEqual(closed, [True, True, True])
+
+    def test_asgi_reports_handler_errors(self):
+        def fail():
+            raise RuntimeError("boom")
+
+        self.app.flask_app.add_url_rule("/fail", "fail", fail)
+        start, body = self.call("GET", "/fail")
+        self.assertEqual(start["status"], 500)
+        self.assertEqual(json.loads(body), {"error": "boom"})
+
+    def test_asgi_closes_responses_that_fail_midway(self):
+        closed = []
+
+        def failing_app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/plain")])
+
+            def chunks():
+                try:
+                    yield b"partial"
+                    raise RuntimeError("boom")
+                finally:
+                    closed.append(True)
+
+            return chunks()
+
+        self.app.flask_app.wsgi_app = failing_app
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+        with self.assertRaises(RuntimeError):
+            asyncio.run(self.app(scope, receive, send))
+        self.assertEqual(closed, [True])
+        self.assertEqual(sent[-1]["body"], b"partial")
+        self.assertTrue(sent[-1]["more_body"])
+
+    def test_asgi_drops_requests_abandoned_while_uploading(self):
+        called = []
+        self.app.flask_app.wsgi_app = lambda environ, start_response: called.append(1)
+        messages = [
+            {"type": "http.request", "body": b"{", "more_body": True},
+            {"type": "http.disconnect"},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/", "headers": []}
+        asyncio.run(self.app(scope, receive, send))
+        self.assertEqual((called, sent), ([], []))
+
+    def test_asgi_lifespan(self):
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.app({"type": "lifespan"}, receive, send))
+        self.assertEqual(
+            [message["type"] for message in sent],
+            ["lifespan.startup.complete", "lifespan.shutdown.complete"],
+        )
+
+        with self.assertRaises(ValueError):
+            asyncio.run(self.app({"type": "websocket"}, receive, send))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,1041 @@
+import gc
+import gzip
+import json
+import io
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from app.archive import ArchiveSegment
+from app.models import Locker, LockerStatus, Rent, RentSize, RentStatus
+from app.repositories import LockerRepository, RentRepository
+from app.rw_lock import ReadWriteLock
+from app.sharded_repository import (
+    UNASSIGNED_SHARD,
+    ShardedLockerRepository,
+    ShardedRentRepository,
+)
+from app.services import LockerService, LockerUnavailableError, RentService
+from app.snapshot import (
+    is_fresh,
+    main as snapshot_main,
+    read_snapshot,
+    snapshot_path,
+    write_snapshot,
+)
+from app.sqlite_repository import SQLiteLockerRepository, SQLiteRentRepository
+from app.utils import iter_json_array
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+class DataDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        for name in ("bloqs.json", "lockers.json", "rents.json"):
+            shutil.copy(os.path.join(TEST_DATA_DIR, name), self.data_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def data_path(self, name):
+        return os.path.join(self.data_dir, name)
+
+
+class ModelTestCase(unittest.TestCase):
+    def test_entities_are_slotted_and_share_repeated_strings(self):
+        first = json.loads('{"locker_id": "L-1", "size": "M", "status": "CREATED"}')
+        second = json.loads('{"locker_id": "L-1", "size": "M", "status": "CREATED"}')
+        a, b = Rent(**first), Rent(**second)
+        self.assertFalse(hasattr(a, "__dict__"))
+        self.assertIs(a.locker_id, b.locker_id)
+        self.assertIs(a.status, b.status)
+
+        a.update_status("".join(["DELI", "VERED"]))
+        b.update_status("DELIVERED")
+        self.assertIs(a.status, b.status)
+
+
+class IndexTestCase(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.locker_repository = LockerRepository(self.data_path("lockers.json"))
+        self.rent_repository = RentRepository(self.data_path("rents.json"))
+
+    def test_get_by_id_uses_primary_index(self):
+        locker = self.locker_repository.get_all()[0]
+        self.assertIs(self.locker_repository.get_by_id(locker.id), locker)
+        self.assertIsNone(self.locker_repository.get_by_id("missing"))
+
+        created = self.locker_repository.create(Locker(bloq_id="b1"))
+        self.assertIs(self.locker_repository.get_by_id(created.id), created)
+
+    def test_lockers_by_bloq_and_occupancy(self):
+        bloq_id = "c3ee858c-f3d8-45a3-803d-e080649bbb6f"
+        lockers = self.locker_repository.get_by_bloq(bloq_id)
+        self.assertEqual(len(lockers), 3)
+        self.assertTrue(all(locker.bloq_id == bloq_id for locker in lockers))
+
+        free = self.locker_repository.get_by_occupied(False)
+        self.assertTrue(free)
+        self.assertTrue(all(not locker.is_occupied for locker in free))
+
+    def test_update_moves_entity_between_buckets(self):
+        locker = self.locker_repository.get_by_occupied(False)[0]
+        locker.update_status(LockerStatus.CLOSED, True)
+        self.locker_repository.update(locker)
+
+        self.assertNotIn(locker, self.locker_repository.get_by_occupied(False))
+        self.assertIn(locker, self.locker_repository.get_by_occupied(True))
+
+        reloaded = LockerRepository(self.data_path("lockers.json"))
+        self.assertTrue(reloaded.get_by_id(locker.id).is_occupied)
+
+    def test_claim_takes_lockers_from_the_bloq_pool(self):
+        bloq_id = "c3ee858c-f3d8-45a3-803d-e080649bbb6f"
+        free = self.locker_repository.select_unoccupied(bloq_id)
+        self.assertEqual(free.id, "8b4b59ae-8de5-4322-a426-79c29315a9f1")
+
+        claimed = self.locker_repository.claim_unoccupied(bloq_id)
+        self.assertEqual(claimed.id, free.id)
+        # The claimed locker replaces the free one, which keeps its state.
+        self.assertFalse(free.is_occupied)
+        self.assertIs(self.locker_repository.get_by_id(free.id), claimed)
+        self.assertTrue(claimed.is_occupied)
+        self.assertEqual(claimed.status, LockerStatus.CLOSED)
+        self.assertIsNone(self.locker_repository.select_unoccupied(bloq_id))
+        self.assertIsNone(self.locker_repository.claim_unoccupied(bloq_id))
+
+        claimed.update_status(LockerStatus.OPEN, False)
+        self.locker_repository.update(claimed)
+        self.assertEqual(
+            self.locker_repository.claim_unoccupied(bloq_id).id, claimed.id
+        )
+
+    def test_concurrent_claims_never_share_a_locker(self):
+        claimed = []
+        threads = [
+            threading.Thread(
+                target=lambda: claimed.append(self.locker_repository.claim_unoccupied())
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        lockers = [locker for locker in claimed if locker]
+        self.assertEqual(len(lockers), 6)
+        self.assertEqual(len({locker.id for locker in lockers}), 6)
+        self.assertIsNone(self.locker_repository.select_unoccupied())
+
+    def test_rents_by_locker_and_status(self):
+        rents = self.rent_repository.get_by_locker(
+            "6b33b2d1-af38-4b60-a3c5-53a69f70a351"
+        )
+        self.assertEqual(len(rents), 2)
+
+        created = self.rent_repository.create(Rent(weight=1, size="S"))
+        self.assertIn(created, self.rent_repository.get_by_status(RentStatus.CREATED))
+        self.assertIn(created, self.rent_repository.get_by_locker(None))
+
+        created.update_status(RentStatus.DELIVERED.name)
+        self.rent_repository.update(created)
+        self.assertNotIn(
+            created, self.rent_repository.get_by_status(RentStatus.CREATED)
+        )
+        self.assertIn(created, self.rent_repository.get_by_status("DELIVERED"))
+
+    def test_create_many_writes_once(self):
+        saves = []
+        repository = LockerRepository(self.data_path("lockers.json"))
+        repository.save_data = lambda: saves.append(1)
+        created = repository.create_many([Locker(bloq_id="b1") for _ in range(3)])
+        self.assertEqual(len(saves), 1)
+        self.assertEqual(len({locker.id for locker in created}), 3)
+        self.assertEqual(repository.get_by_bloq("b1"), created)
+
+    def test_find_where_intersects_indexes(self):
+        bloq_id = "c3ee858c-f3d8-45a3-803d-e080649bbb6f"
+        free = self.locker_repository.find_where(
+            {"bloq_id": bloq_id, "is_occupied": False}
+        )
+        self.assertEqual(
+            free,
+            self.locker_repository.find_by(
+                ("bloq_id", "is_occupied"), (bloq_id, False)
+            ),
+        )
+        closed = self.locker_repository.find_where(
+            {"bloq_id": bloq_id, "status": LockerStatus.CLOSED}
+        )
+        self.assertTrue(closed)
+        self.assertTrue(
+            all(l.bloq_id == bloq_id and l.status == "CLOSED" for l in closed)
+        )
+        lockers = list(self.locker_repository.get_all())
+        self.assertEqual(
+            closed,
+            [l for l in lockers if l.bloq_id == bloq_id and l.status == "CLOSED"],
+        )
+
+        created = self.rent_repository.create(Rent(weight=1, size="XL"))
+        self.assertEqual(
+            self.rent_repository.find_where({"status": "CREATED", "size": "XL"}),
+            [created],
+        )
+        self.assertEqual(self.rent_repository.find_where({"size": "XS"}), [])
+        with self.assertRaises(KeyError):
+            self.rent_repository.find_where({"weight": 1})
+
+    def test_pages_follow_their_last_entity(self):
+        lockers = list(self.locker_repository.get_all())
+        first, key = self.locker_repository.get_page(4)
+        self.assertEqual(first, lockers[:4])
+
+        # Deleting entities the client has already seen, or the last one of its
+        # page, neither skips nor repeats any.
+        self.locker_repository.delete(lockers[0].id)
+        second, key = self.locker_repository.get_page(4, key)
+        self.assertEqual(second, lockers[4:8])
+        self.locker_repository.delete(lockers[7].id)
+        third, key = self.locker_repository.get_page(4, key)
+        self.assertEqual(third, lockers[8:])
+        self.assertIsNone(key)
+
+
+class SerializationCacheTestCase(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repository = LockerRepository(self.data_path("lockers.json"))
+        self.calls = []
+
+    def serializer(self, entity):
+        self.calls.append(entity.id)
+        return {"id": entity.id}
+
+    def test_only_modified_entities_are_serialized_again(self):
+        lockers = self.repository.get_all()
+        first = self.repository.serialize_many(lockers, self.serializer)
+        self.assertEqual(len(self.calls), 9)
+        self.assertEqual(
+            self.repository.serialize_many(lockers, self.serializer), first
+        )
+        self.assertEqual(len(self.calls), 9)
+
+        locker = lockers[1]
+        locker.update_status(LockerStatus.CLOSED, True)
+        self.repository.update(locker)
+        self.repository.serialize_many(lockers, self.serializer)
+        self.assertEqual(self.calls[9:], [locker.id])
+
+        detached = Locker(id=locker.id)
+        self.repository.serialize_many([detached, detached], self.serializer)
+        self.assertEqual(len(self.calls), 12)
+
+    def test_data_file_matches_json_dump(self):
+        self.repository.create(Locker(bloq_id="Bloq «ü»", status=LockerStatus.CLOSED))
+        self.repository.update(self.repository.get_all()[0])
+        items = [
+            self.repository.serialize_entity(locker)
+            for locker in self.repository.get_all()
+        ]
+        with open(self.data_path("lockers.json"), encoding="utf-8") as f:
+            content = f.read()
+        self.assertEqual(content, json.dumps(items, ensure_ascii=False, indent=4))
+
+        rents = RentRepository(self.data_path("rents.json"))
+        rents.create(Rent(weight=2.5, size="S"))
+        items = [rents.serialize_entity(rent) for rent in rents.get_all()]
+        with open(self.data_path("rents.json"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), json.dumps(items, ensure_ascii=False, indent=4))
+
+
+class ListSnapshotTestCase(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repository = LockerRepository(self.data_path("lockers.json"))
+        self.repository.snapshot_chunk_size = 4
+
+    def test_snapshot_is_stable_and_shared_until_a_mutation(self):
+        snapshot = self.repository.get_all()
+        self.assertIs(self.repository.get_all(), snapshot)
+        items = list(snapshot)
+
+        created = self.repository.create(Locker(bloq_id="b1"))
+        self.repository.delete(items[0].id)
+        self.assertEqual(list(snapshot), items)
+        self.assertEqual(len(snapshot), 9)
+
+        current = self.repository.get_all()
+        self.assertGreater(current.version, snapshot.version)
+        self.assertEqual(current, items[1:] + [created])
+        self.assertEqual(current[-1], created)
+
+    def test_service_updates_leave_snapshots_untouched(self):
+        snapshot = self.repository.get_all()
+        locker = snapshot[1]
+        service = LockerService(self.repository)
+        updated = service.update_locker_status(locker.id, LockerStatus.CLOSED, True)
+        self.assertIsNot(updated, locker)
+        self.assertEqual(locker.status, snapshot[1].status)
+        self.assertIs(snapshot[1], locker)
+        self.assertNotEqual(locker, updated)
+        self.assertIs(self.repository.get_all()[1], updated)
+
+    def test_unchanged_chunks_are_shared(self):
+        first = self.repository.get_all().chunks()
+        self.assertEqual([len(chunk) for chunk in first], [4, 4, 1])
+
+        self.repository.create(Locker(bloq_id="b1"))
+        second = self.repository.get_all().chunks()
+        self.assertIs(second[0], first[0])
+        self.assertIs(second[1], first[1])
+        self.assertEqual(len(second[2]), 2)
+
+        locker = self.repository.get_all()[5]
+        locker.update_status(LockerStatus.CLOSED, True)
+        self.repository.update(locker)
+        self.assertIs(self.repository.get_all().chunks(), second)
+
+        self.repository.delete(locker.id)
+        third = self.repository.get_all().chunks()
+        self.assertIs(third[0], first[0])
+        self.assertEqual([len(chunk) for chunk in third], [4, 4, 1])
+
+    def test_concurrent_reads_after_a_mutation_agree(self):
+        self.repository.create_many([Locker(bloq_id="b1") for _ in range(200)])
+        # Switch threads as often as possible, so that readers interleave.
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        for round in range(20):
+            # Deleting shortens the chunk list, creating retires its last chunk.
+            self.repository.delete(self.repository.get_all()[round % 4].id)
+            created = self.repository.create(Locker(bloq_id="b1"))
+            expected = [l for l in self.repository.get_page(1000)[0]]
+            self.repository.update(created)
+            barrier = threading.Barrier(8)
+
+            def read(_):
+                barrier.wait()
+                return self.repository.get_all()
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                snapshots = list(pool.map(read, range(8)))
+            for snapshot in snapshots:
+                self.assertEqual(list(snapshot), expected)
+                self.assertEqual(
+                    [len(chunk) for chunk in snapshot.chunks()],
+                    [len(expected[i : i + 4]) for i in range(0, len(expected), 4)],
+                )
+            self.assertEqual(
+                len(self.repository._BaseRepository__chunks),
+                len(snapshots[0].chunks()),
+            )
+
+    def test_serialize_many_accepts_snapshots(self):
+        snapshot = self.repository.get_all()
+        forms = self.repository.serialize_many(
+            snapshot, self.repository.serialize_entity
+        )
+        self.assertEqual([form["id"] for form in forms], [e.id for e in snapshot])
+
+
+class VersionTestCase(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repository = LockerRepository(self.data_path("lockers.json"))
+
+    def test_mutations_advance_collection_and_entity_versions(self):
+        lockers = list(self.repository.get_all())
+        tag, _ = self.repository.version_tag()
+        loaded = self.repository.entity_version(lockers[0].id)
+        self.assertEqual(self.repository.entity_version(lockers[1].id), loaded)
+
+        lockers[0].update_status(LockerStatus.CLOSED, True)
+        self.repository.update(lockers[0])
+        self.assertGreater(self.repository.version, loaded[0])
+        self.assertNotEqual(self.repository.version_tag()[0], tag)
+        self.assertEqual(
+            self.repository.entity_version(lockers[0].id)[0], self.repository.version
+        )
+        self.assertEqual(self.repository.entity_version(lockers[1].id), loaded)
+
+        version = self.repository.version
+        self.repository.delete(lockers[0].id)
+        self.assertGreater(self.repository.version, version)
+        self.assertIsNone(self.repository.version_tag(lockers[0].id))
+
+    def test_tags_differ_between_instances(self):
+        other = LockerRepository(self.data_path("lockers.json"))
+        self.assertEqual(other.version, self.repository.version)
+        self.assertNotEqual(other.version_tag(), self.repository.version_tag())
+
+    def test_sharded_and_sqlite_versions(self):
+        sharded = ShardedLockerRepository(self.data_path("lockers"))
+        sharded.import_file(self.data_path("lockers.json"))
+        tag = sharded.version_tag()
+        locker = sharded.get_all()[0]
+        self.assertIsNotNone(sharded.version_tag(locker.id))
+        sharded.create(Locker(bloq_id=locker.bloq_id))
+        self.assertNotEqual(sharded.version_tag(), tag)
+
+        sqlite = SQLiteLockerRepository(self.data_path("bloqit.db"))
+        sqlite.migrate_from_json(self.data_path("lockers.json"))
+        version = sqlite.version
+        sqlite.create(Locker(bloq_id="b1"))
+        self.assertEqual(sqlite.version, version + 1)
+        # Another connection to the database sees the same version.
+        other = SQLiteLockerRepository(self.data_path("bloqit.db"))
+        self.assertEqual(other.version_tag(), sqlite.version_tag())
+
+
+class ArchiveTestCase(DataDirTestCase):
+    delivered_id = "feb72a9a-258d-49c9-92de-f90b1f11984d"
+
+    def setUp(self):
+        super().setUp()
+        self.data_file = self.data_path("rents.json")
+        self.archive_file = self.data_path("rents.archive.gz")
+
+    def test_delivered_rents_move_to_the_archive(self):
+        repository = RentRepository(self.data_file)
+        self.assertEqual(repository.archive_delivered(), 1)
+        self.assertEqual(repository.archive_delivered(), 0)
+
+        with open(self.data_file, encoding="utf-8") as f:
+            self.assertNotIn(self.delivered_id, [item["id"] for item in json.load(f)])
+        with gzip.open(self.archive_file, "rt", encoding="utf-8") as f:
+            self.assertEqual(
+                [json.loads(line)["id"] for line in f], [self.delivered_id]
+            )
+
+        reloaded = RentRepository(self.data_file)
+        self.assertEqual(len(reloaded.get_all()), 3)
+        self.assertEqual(reloaded.get_by_status(RentStatus.DELIVERED), [])
+        archived = reloaded.get_by_id(self.delivered_id)
+        self.assertTrue(reloaded.is_archived(self.delivered_id))
+        self.assertFalse(reloaded.is_archived(reloaded.get_all()[0].id))
+        self.assertEqual(archived.status, "DELIVERED")
+        self.assertEqual(archived.locker_id, "6b33b2d1-af38-4b60-a3c5-53a69f70a351")
+
+    def test_only_rents_delivered_long_enough_ago_are_archived(self):
+        repository = RentRepository(self.data_file, archive_after_days=1)
+        # Delivered before delivery times were recorded: its age is unknown, so it
+        # stays in the hot set until archived without an age.
+        self.assertFalse(repository.is_archived(self.delivered_id))
+        self.assertEqual(len(repository.get_all()), 4)
+        self.assertEqual(repository.archive_delivered(timedelta(0)), 0)
+        self.assertEqual(repository.archive_delivered(), 1)
+        self.assertTrue(repository.is_archived(self.delivered_id))
+
+        rent = repository.get_all()[0]
+        rent.update_status(RentStatus.DELIVERED.name)
+        self.assertIsNotNone(rent.delivered_at)
+        repository.update(rent)
+        self.assertEqual(repository.archive_delivered(timedelta(days=1)), 0)
+        self.assertEqual(repository.archive_delivered(timedelta(0)), 1)
+        self.assertEqual(repository.get_by_id(rent.id).delivered_at, rent.delivered_at)
+
+    def test_rents_archived_before_a_crash_are_not_archived_twice(self):
+        repository = RentRepository(self.data_file)
+        delivered = repository.get_by_id(self.delivered_id)
+        segment = ArchiveSegment(self.archive_file)
+        segment.append([repository.serialize_entity(delivered)])
+        with open(self.archive_file, "ab") as f:
+            f.write(b"partial block")
+
+        self.assertEqual(repository.archive_delivered(), 1)
+        self.assertEqual(repository.get_by_status(RentStatus.DELIVERED), [])
+        self.assertEqual(len(ArchiveSegment(self.archive_file)), 1)
+        rent = repository.get_all()[0]
+        rent.update_status(RentStatus.DELIVERED.name)
+        repository.update(rent)
+        repository.archive_delivered()
+        self.assertEqual(repository.get_by_id(rent.id).id, rent.id)
+
+
+class JournalTestCase(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.snapshot_file = self.data_path("lockers.json")
+        self.journal_file = self.data_path("lockers.journal")
+        with open(self.snapshot_file, encoding="utf-8") as f:
+            self.snapshot = f.read()
+
+    def journal_repository(self, **options):
+        return LockerRepository(self.snapshot_file, journal=True, **options)
+
+    def test_mutations_append_to_journal(self):
+        repository = self.journal_repository()
+        created = repository.create(Locker(bloq_id="b1"))
+        created.update_status(LockerStatus.CLOSED, True)
+        repository.update(created)
+
+        with open(self.snapshot_file, encoding="utf-8") as f:
+            self.assertEqual(f.read(), self.snapshot)
+        with open(self.journal_file, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[-1]["data"]["id"], created.id)
+
+    def test_journal_is_replayed_on_load(self):
+        repository = self.journal_repository()
+        created = repository.create(Locker(bloq_id="b1"))
+        existing = repository.get_all()[0]
+        existing.update_status(LockerStatus.OPEN, False)
+        repository.update(existing)
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.write('{"op":"put","data":{"id"')
+
+        reloaded = self.journal_repository()
+        self.assertEqual(len(reloaded.get_all()), len(repository.get_all()))
+        self.assertEqual(reloaded.get_by_id(created.id).bloq_id, "b1")
+        self.assertFalse(reloaded.get_by_id(existing.id).is_occupied)
+        self.assertEqual(reloaded.get_all()[0].id, existing.id)
+
+    def test_delete_is_journaled_and_replayed(self):
+        repository = self.journal_repository()
+        removed = repository.get_all()[0]
+        self.assertIs(repository.delete(removed.id), removed)
+        self.assertIsNone(repository.delete(removed.id))
+
+        reloaded = self.journal_repository()
+        self.assertIsNone(reloaded.get_by_id(removed.id))
+        self.assertEqual(len(reloaded.get_all()), 8)
+        self.assertNotIn(
+            removed.id, [l.id for l in reloaded.get_by_bloq(removed.bloq_id)]
+        )
+
+    def test_compact_folds_journal_into_snapshot(self):
+        repository = self.journal_repository()
+        created = repository.create(Locker(bloq_id="b1"))
+        repository.compact()
+
+        self.assertFalse(os.path.exists(self.journal_file))
+        with open(self.snapshot_file, encoding="utf-8") as f:
+            ids = [item["id"] for item in json.load(f)]
+        self.assertIn(created.id, ids)
+        self.assertIsNotNone(self.journal_repository().get_by_id(created.id))
+
+    def test_interrupted_compaction_is_finished_on_load(self):
+        repository = self.journal_repository()
+        first = repository.create(Locker(bloq_id="b1"))
+        os.replace(self.journal_file, self.journal_file + ".old")
+        second = {"id": "second", "bloq_id": "b2", "status": "OPEN"}
+        with open(self.journal_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"op": "put", "data": second}) + "\n")
+
+        reloaded = self.journal_repository()
+        self.assertIsNotNone(reloaded.get_by_id(first.id))
+        self.assertEqual(reloaded.get_by_id("second").bloq_id, "b2")
+        self.assertFalse(os.path.exists(self.journal_file + ".old"))
+
+
+class GroupCommitTestCase(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.snapshot_file = self.data_path("lockers.json")
+        self.threads = set(threading.enumerate())
+
+    def stored_ids(self):
+        with open(self.snapshot_file, encoding="utf-8") as f:
+            return [item["id"] for item in json.load(f)]
+
+    def test_mutations_are_deferred_until_flush(self):
+        repository = LockerRepository(self.snapshot_file, flush_interval_ms=60000)
+        created = repository.create(Locker(bloq_id="b1"))
+        self.assertNotIn(created.id, self.stored_ids())
+
+        repository.flush()
+        self.assertIn(created.id, self.stored_ids())
+
+    def test_sync_flushes_before_returning(self):
+        repository = LockerRepository(
+            self.snapshot_file, journal=True, flush_interval_ms=60000
+        )
+        created = repository.create(Locker(bloq_id="b1"), sync=True)
+        reloaded = LockerRepository(self.snapshot_file, journal=True)
+        self.assertIsNotNone(reloaded.get_by_id(created.id))
+
+    def test_background_flusher_persists_after_interval(self):
+        repository = LockerRepository(self.snapshot_file, flush_interval_ms=10)
+        created = repository.create(Locker(bloq_id="b1"))
+
+        deadline = time.monotonic() + 5
+        while created.id not in self.stored_ids() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIn(created.id, self.stored_ids())
+
+    def test_mutation_threshold_triggers_flush(self):
+        repository = LockerRepository(
+            self.snapshot_file, flush_interval_ms=60000, flush_max_mutations=3
+        )
+        created = [repository.create(Locker(bloq_id="b1")) for _ in range(3)]
+
+        deadline = time.monotonic() + 5
+        while created[-1].id not in self.stored_ids() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIn(created[-1].id, self.stored_ids())
+
+    def test_close_stops_the_flusher(self):
+        repository = LockerRepository(self.snapshot_file, flush_interval_ms=60000)
+        created = repository.create(Locker(bloq_id="b1"))
+        flushers = [t for t in threading.enumerate() if t not in self.threads]
+        self.assertEqual(len(flushers), 1)
+
+        repository.close()
+        self.assertIn(created.id, self.stored_ids())
+        self.assertFalse(flushers[0].is_alive())
+
+    def test_discarded_repository_stops_its_flusher(self):
+        repository = LockerRepository(self.snapshot_file, flush_interval_ms=10)
+        created = repository.create(Locker(bloq_id="b1"))
+        flusher = next(t for t in threading.enumerate() if t not in self.threads)
+        reference = weakref.ref(repository)
+
+        deadline = time.monotonic() + 5
+        while created.id not in self.stored_ids() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Once flushed, nothing but the caller holds the repository; its cached
+        # bound methods form a cycle left to the garbage collector.
+        del repository, created
+        deadline = time.monotonic() + 5
+        while reference() is not None and time.monotonic() < deadline:
+            gc.collect()
+            time.sleep(0.01)
+        self.assertIsNone(reference())
+        flusher.join(5)
+        self.assertFalse(flusher.is_alive())
+
+
+class StreamingLoadTestCase(DataDirTestCase):
+    def test_iter_json_array_across_chunk_boundaries(self):
+        items = [{"id": "é" * 3, "weight": 1.5e10}, 12345, None, [1, {"a": True}]]
+        text = json.dumps(items, indent=4, ensure_ascii=False)
+        for chunk_size in (1, 2, 3, 7, 4096):
+            parsed = list(iter_json_array(io.StringIO(text), chunk_size))
+            self.assertEqual(parsed, items)
+
+    def test_iter_json_array_rejects_malformed_input(self):
+        for text in ("", "{}", "[1,]", "[1 2]", '[{"a": 1}'):
+            with self.assertRaises(ValueError):
+                list(iter_json_array(io.StringIO(text), 2))
+
+    def test_load_stats_are_recorded(self):
+        repository = LockerRepository(
+            self.data_path("lockers.json"), measure_load_memory=True
+        )
+        self.assertEqual(repository.load_stats["entities"], 9)
+        self.assertGreaterEqual(repository.load_stats["seconds"], 0)
+        self.assertGreater(repository.load_stats["peak_memory_bytes"], 0)
+
+
+class BinarySnapshotTestCase(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data_file = self.data_path("rents.json")
+        self.snapshot_file = snapshot_path(self.data_file)
+
+    def test_round_trip_preserves_rows(self):
+        rows = [
+            {"id": "a", "lockerId": None, "weight": 5, "size": "M", "ok": True},
+            {"id": "b", "lockerId": "a", "weight": 2.5, "size": "M", "ok": False},
+            {"id": "ç\u0000", "weight": -(2**40), "extra": ""},
+        ]
+        write_snapshot(self.snapshot_file, rows)
+        self.assertEqual(read_snapshot(self.snapshot_file), rows)
+
+        with self.assertRaises(TypeError):
+            write_snapshot(self.snapshot_file, [{"id": "a", "tags": ["x"]}])
+
+    def test_repository_writes_and_prefers_fresh_snapshot(self):
+        repository = RentRepository(self.data_file, binary_snapshot=True)
+        self.assertTrue(is_fresh(self.snapshot_file, self.data_file))
+
+        created = repository.create(Rent(weight=1, size="S"))
+        self.assertTrue(is_fresh(self.snapshot_file, self.data_file))
+        reloaded = RentRepository(self.data_file, binary_snapshot=True)
+        self.assertEqual(reloaded.get_all(), repository.get_all())
+        self.assertEqual(reloaded.get_by_id(created.id).size, "S")
+
+    def test_stale_snapshot_is_ignored(self):
+        RentRepository(self.data_file, binary_snapshot=True)
+        with open(self.data_file, encoding="utf-8") as f:
+            rows = json.load(f)
+        rows[0]["weight"] = 99
+        with open(self.data_file, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        self.assertFalse(is_fresh(self.snapshot_file, self.data_file))
+
+        reloaded = RentRepository(self.data_file, binary_snapshot=True)
+        self.assertEqual(reloaded.get_all()[0].weight, 99)
+
+    def test_cli_converts_both_ways(self):
+        json_copy = self.data_path("copy.json")
+        snapshot_main(["to-snapshot", self.data_file, self.snapshot_file])
+        snapshot_main(["to-json", self.snapshot_file, json_copy])
+        with open(self.data_file, encoding="utf-8") as f:
+            original = json.load(f)
+        with open(json_copy, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), original)
+
+
+class ConcurrencyTestCase(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.locker_service = LockerService(
+            LockerRepository(self.data_path("lockers.json"))
+        )
+        self.rent_service = RentService(
+            RentRepository(self.data_path("rents.json")), self.locker_service
+        )
+
+    def test_write_lock_excludes_readers(self):
+        lock, events = ReadWriteLock(), []
+
+        def read():
+            with lock.reading():
+                events.append("read")
+
+        with lock.writing():
+            reader = threading.Thread(target=read)
+            reader.start()
+            reader.join(0.1)
+            self.assertEqual(events, [])
+            with lock.reading(), lock.writing():
+                events.append("nested")
+        reader.join()
+        self.assertEqual(events, ["nested", "read"])
+
+    def test_parallel_assigns_never_double_book_a_locker(self):
+        lockers = [
+            self.locker_service.create(Locker(bloq_id="stress")) for _ in range(20)
+        ]
+        rents = [
+            self.rent_service.create_rent(Rent(weight=1, size=RentSize.S))
+            for _ in range(300)
+        ]
+
+        def assign(position):
+            locker = lockers[position % len(lockers)]
+            try:
+                self.rent_service.assign_locker_to_rent(rents[position].id, locker.id)
+            except LockerUnavailableError:
+                return None
+            return locker.id
+
+        def read(_):
+            return len(self.locker_service.get_lockers_by_bloq("stress"))
+
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            reads = executor.map(read, range(300))
+            assigned = list(executor.map(assign, range(300)))
+        self.assertEqual(set(reads), {20})
+
+        assigned = [locker_id for locker_id in assigned if locker_id]
+        self.assertEqual(sorted(assigned), sorted(locker.id for locker in lockers))
+        for locker in lockers:
+            self.assertEqual(len(self.rent_service.get_rents_by_locker(locker.id)), 1)
+            self.assertTrue(self.locker_service.get_by_id(locker.id).is_occupied)
+
+
+def create_rents(data_file, count):
+    repository = RentRepository(data_file, journal=True, multi_process=True)
+    for _ in range(count):
+        repository.create(Rent(weight=1, size="S"))
+
+
+class MultiProcessTestCase(DataDirTestCase):
+    def open_lockers(self, **options):
+        return LockerRepository(
+            self.data_path("lockers.json"), multi_process=True, **options
+        )
+
+    def test_writers_do_not_overwrite_each_other(self):
+        first, second = self.open_lockers(), self.open_lockers()
+        a = first.create(Locker(bloq_id="b1"))
+        b = second.create(Locker(bloq_id="b1"))
+
+        self.assertTrue(first.refresh())
+        self.assertFalse(first.refresh())
+        self.assertEqual(
+            [locker.id for locker in first.get_by_bloq("b1")], [a.id, b.id]
+        )
+        reloaded = LockerRepository(self.data_path("lockers.json"))
+        self.assertEqual(len(reloaded.get_all()), 11)
+
+    def test_journal_changes_are_replayed_incrementally(self):
+        first = self.open_lockers(journal=True)
+        second = self.open_lockers(journal=True)
+        untouched = second.get_all()[0]
+        locker = first.get_by_occupied(False)[0]
+        locker.update_status(LockerStatus.CLOSED, True)
+        first.update(locker)
+
+        self.assertTrue(second.refresh())
+        self.assertTrue(second.get_by_id(locker.id).is_occupied)
+        self.assertNotIn(locker.id, [item.id for item in second.get_by_occupied(False)])
+        self.assertIs(second.get_all()[0], untouched)
+
+        first.compact()
+        created = second.create(Locker(bloq_id="b1"))
+        self.assertTrue(first.refresh())
+        self.assertEqual(first.get_by_id(created.id).bloq_id, "b1")
+        self.assertTrue(first.get_by_id(locker.id).is_occupied)
+
+    def test_claims_are_exclusive_across_repositories(self):
+        bloq_id = "484e01be-1570-4ac1-a2a9-02aad3acc54e"
+        first, second = self.open_lockers(), self.open_lockers()
+        claimed = [
+            first.claim_unoccupied(bloq_id),
+            second.claim_unoccupied(bloq_id),
+            first.claim_unoccupied(bloq_id),
+        ]
+        self.assertEqual(len({locker.id for locker in claimed[:2]}), 2)
+        self.assertIsNone(claimed[2])
+
+    def test_concurrent_processes_keep_every_write(self):
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(
+                target=create_rents, args=(self.data_path("rents.json"), 10)
+            )
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertTrue(all(worker.exitcode == 0 for worker in workers))
+        repository = RentRepository(self.data_path("rents.json"), journal=True)
+        self.assertEqual(len(repository.get_all()), 44)
+
+
+class ShardingTestCase(DataDirTestCase):
+    bloq_id = "484e01be-1570-4ac1-a2a9-02aad3acc54e"
+
+    def setUp(self):
+        super().setUp()
+        self.lockers_dir = self.data_path("lockers")
+        self.rents_dir = self.data_path("rents")
+        self.locker_repository, self.rent_repository = self.sharded_repositories()
+        self.locker_repository.import_file(self.data_path("lockers.json"))
+        self.rent_repository.import_file(self.data_path("rents.json"))
+        self.locker_repository, self.rent_repository = self.sharded_repositories()
+
+    def sharded_repositories(self):
+        lockers = ShardedLockerRepository(self.lockers_dir)
+        return lockers, ShardedRentRepository(self.rents_dir, lockers)
+
+    def shard_files(self, directory):
+        return {
+            name: os.stat(os.path.join(directory, name)).st_mtime_ns
+            for name in os.listdir(directory)
+            if name.endswith(".json")
+        }
+
+    def test_import_splits_by_bloq(self):
+        self.assertEqual(len(self.locker_repository.shard_keys()), 3)
+        self.assertEqual(len(self.locker_repository.get_all()), 9)
+        self.assertIn(UNASSIGNED_SHARD, self.rent_repository.shard_keys())
+        self.assertEqual(len(self.rent_repository.get_all()), 4)
+        with self.assertRaises(ValueError):
+            self.locker_repository.import_file(self.data_path("lockers.json"))
+
+    def test_per_bloq_query_loads_one_shard(self):
+        lockers = self.locker_repository.get_by_bloq(self.bloq_id)
+        self.assertEqual(len(lockers), 3)
+        self.assertIsNone(self.locker_repository.shard("unknown"))
+        claimed = self.locker_repository.claim_unoccupied(self.bloq_id)
+        self.assertEqual(claimed.bloq_id, self.bloq_id)
+        # Only the bloq's shard was ever loaded.
+        loaded = [
+            key
+            for key in self.locker_repository.shard_keys()
+            if self.locker_repository._ShardedRepository__shards.get(key)
+        ]
+        self.assertEqual(loaded, [self.bloq_id])
+
+    def test_pages_load_only_their_shards(self):
+        lockers = self.locker_repository.get_all()
+        repository, _ = self.sharded_repositories()
+        shards = repository._ShardedRepository__shards
+
+        first, key = repository.get_page(2)
+        self.assertEqual(first, lockers[:2])
+        self.assertEqual(list(shards), repository.shard_keys()[:1])
+
+        pages = [first]
+        while key is not None:
+            page, key = repository.get_page(2, key)
+            pages.append(page)
+        self.assertEqual([l for page in pages for l in page], lockers)
+        # Three shards of three lockers: the page ending the first shard points
+        # at the next one, which is only loaded when that page is requested.
+        page, key = repository.get_page(3)
+        self.assertEqual(key, (repository.shard_keys()[1], "", -1))
+        self.assertEqual(repository.get_page(3, key)[0], lockers[3:6])
+        with self.assertRaises(ValueError):
+            repository.get_page(2, (lockers[0].id, 0))
+
+    def test_write_touches_only_its_shard(self):
+        before = self.shard_files(self.lockers_dir)
+        time.sleep(0.01)
+        locker = self.locker_repository.get_by_bloq(self.bloq_id)[0]
+        locker.update_status(LockerStatus.OPEN, False)
+        self.locker_repository.update(locker)
+        after = self.shard_files(self.lockers_dir)
+        changed = [name for name in after if after[name] != before[name]]
+        self.assertEqual(changed, [self.bloq_id + ".json"])
+
+    def test_rent_moves_to_the_shard_of_its_locker(self):
+        rent = self.rent_repository.get_by_locker(None)[0]
+        locker = self.locker_repository.get_by_bloq(self.bloq_id)[0]
+        rent.locker_id = locker.id
+        self.rent_repository.update(rent)
+        self.assertEqual(self.rent_repository.get_by_locker(None), [])
+        self.assertIn(rent, self.rent_repository.get_by_locker(locker.id))
+
+        _, reloaded = self.sharded_repositories()
+        self.assertEqual(reloaded.get_by_id(rent.id).locker_id, locker.id)
+        self.assertEqual(reloaded.get_by_locker(None), [])
+        self.assertEqual(len(reloaded.get_all()), 4)
+        with open(os.path.join(self.rents_dir, UNASSIGNED_SHARD + ".json")) as f:
+            self.assertEqual(json.load(f), [])
+
+    def test_routes_are_rebuilt_when_the_log_is_missing(self):
+        created = self.locker_repository.create(Locker(bloq_id="b/1"))
+        deleted = self.locker_repository.get_by_bloq(self.bloq_id)[0]
+        self.locker_repository.delete(deleted.id)
+        self.locker_repository.save_data()
+        os.remove(os.path.join(self.lockers_dir, "routes.log"))
+
+        reloaded, _ = self.sharded_repositories()
+        self.assertEqual(reloaded.get_by_id(created.id).bloq_id, "b/1")
+        self.assertIsNone(reloaded.get_by_id(deleted.id))
+        self.assertEqual(len(reloaded.get_all()), 9)
+
+
+class SQLiteRepositoryTestCase(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_file = self.data_path("bloqit.db")
+        self.locker_repository = SQLiteLockerRepository(self.db_file)
+        self.rent_repository = SQLiteRentRepository(self.db_file)
+        self.locker_repository.migrate_from_json(self.data_path("lockers.json"))
+        self.rent_repository.migrate_from_json(self.data_path("rents.json"))
+
+    def test_migration_is_idempotent(self):
+        self.assertEqual(len(self.locker_repository.get_all()), 9)
+        imported = self.locker_repository.migrate_from_json(
+            self.data_path("lockers.json")
+        )
+        self.assertEqual(imported, 0)
+        self.assertEqual(len(self.locker_repository.get_all()), 9)
+
+    def test_columns_use_data_keys_and_wal_mode(self):
+        connection = sqlite3.connect(self.db_file)
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(lockers)")]
+        self.assertEqual(columns, ["id", "bloqId", "status", "isOccupied"])
+        mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+        connection.close()
+
+    def test_create_update_and_indexed_lookups(self):
+        locker = self.locker_repository.create(Locker(bloq_id="b1"))
+        stored = self.locker_repository.get_by_id(locker.id)
+        self.assertEqual(stored.id, locker.id)
+        self.assertEqual(stored.status, "OPEN")
+        self.assertIs(stored.is_occupied, False)
+
+        stored.update_status(LockerStatus.CLOSED, True)
+        self.locker_repository.update(stored)
+        self.assertTrue(self.locker_repository.get_by_id(locker.id).is_occupied)
+        bloq_lockers = self.locker_repository.get_by_bloq("b1")
+        self.assertEqual([item.id for item in bloq_lockers], [locker.id])
+        free = self.locker_repository.get_by_occupied(False)
+        self.assertNotIn(locker.id, [item.id for item in free])
+
+        rents = self.rent_repository.get_by_status(RentStatus.DELIVERED)
+        self.assertEqual(
+            [rent.id for rent in rents], ["feb72a9a-258d-49c9-92de-f90b1f11984d"]
+        )
+        self.assertEqual(len(self.rent_repository.get_by_locker(None)), 1)
+
+    def test_claim_unoccupied_uses_the_bloq_pool(self):
+        bloq_id = "484e01be-1570-4ac1-a2a9-02aad3acc54e"
+        first = self.locker_repository.claim_unoccupied(bloq_id)
+        second = self.locker_repository.claim_unoccupied(bloq_id)
+        self.assertEqual(
+            [first.id, second.id],
+            [
+                "ea6db2f6-2da7-42ed-9619-d40d718b7bec",
+                self.locker_repository.get_by_bloq(bloq_id)[2].id,
+            ],
+        )
+        self.assertTrue(self.locker_repository.get_by_id(first.id).is_occupied)
+        self.assertIsNone(self.locker_repository.claim_unoccupied(bloq_id))
+
+        released = self.locker_repository.compare_and_set_occupied(
+            first.id, True, False, LockerStatus.OPEN
+        )
+        self.assertFalse(released.is_occupied)
+        self.assertIsNone(
+            self.locker_repository.compare_and_set_occupied(
+                first.id, True, False, LockerStatus.OPEN
+            )
+        )
+        self.assertEqual(self.locker_repository.claim_unoccupied(bloq_id).id, first.id)
+
+    def test_find_where(self):
+        bloq_id = "484e01be-1570-4ac1-a2a9-02aad3acc54e"
+        lockers = self.locker_repository.find_where(
+            {"bloq_id": bloq_id, "is_occupied": False, "status": "OPEN"}
+        )
+        self.assertEqual(
+            [l.id for l in lockers],
+            [
+                l.id
+                for l in self.locker_repository.get_by_bloq(bloq_id)
+                if not l.is_occupied and l.status == "OPEN"
+            ],
+        )
+        with self.assertRaises(KeyError):
+            self.locker_repository.find_where({"id": bloq_id})
+
+    def test_create_many(self):
+        created = self.locker_repository.create_many(
+            [Locker(bloq_id="b1"), Locker(bloq_id="b1", is_occupied=True)]
+        )
+        stored = self.locker_repository.get_by_bloq("b1")
+        self.assertEqual([l.id for l in stored], [l.id for l in created])
+        self.assertEqual([l.is_occupied for l in stored], [False, True])
+
+    def test_pages_use_rowids(self):
+        lockers = self.locker_repository.get_all()
+        first, key = self.locker_repository.get_page(5)
+        self.assertEqual([l.id for l in first], [l.id for l in lockers[:5]])
+        self.locker_repository.delete(lockers[4].id)
+        second, key = self.locker_repository.get_page(5, key)
+        self.assertEqual([l.id for l in second], [l.id for l in lockers[5:]])
+        self.assertIsNone(key)
+
+    def test_delete(self):
+        locker = self.locker_repository.get_all()[0]
+        self.assertEqual(self.locker_repository.delete(locker.id).id, locker.id)
+        self.assertIsNone(self.locker_repository.get_by_id(locker.id))
+        self.assertIsNone(self.locker_repository.delete(locker.id))
+
+
+if __name__ == "__main__":
+    unittest.main()